@@ -74,6 +74,8 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'portal_retenciones.permisos.contexto_permisos',
+                'portal_retenciones.pendientes.contexto_pendientes',
             ],
         },
     },
@@ -156,4 +158,64 @@ STATICFILES_DIRS = [
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-LOGIN_URL = 'home'
\ No newline at end of file
+LOGIN_URL = 'home'
+
+# Caché
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# Basada en archivos para que la invalidación sea visible por todos los workers de gunicorn.
+
+# 'default' guarda entradas de vida corta (dashboard, pendientes, búsquedas, circuitos):
+# al llegar a MAX_ENTRIES se descarta un tercio de los archivos. Las versiones compartidas
+# (sin expiración) van en 'versiones', aparte, para que ese descarte no las alcance.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+        },
+    },
+    'versiones': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache_versiones',
+        'OPTIONS': {
+            # -- Una por clave compartida (catálogos, permisos, clientes, circuitos): pocas y fijas
+            'MAX_ENTRIES': 100,
+        },
+    },
+}
+
+# Segundos que se reutiliza la foto de métricas del dashboard antes de recalcularla
+DASHBOARD_CACHE_TTL = 300
+
+# Cantidad de meses (incluido el actual) del gráfico "Solicitudes por mes"
+DASHBOARD_MESES = 6
+
+# Autocompletado de clientes: índice de prefijos en memoria (uno por worker),
+# segundos entre revisiones de la versión compartida y TTL de las respuestas.
+# BUSQUEDA_CLIENTES_MEMORIA es opcional: activarlo solo con un único worker, donde el
+# índice en memoria es lo más rápido. Con varios workers cada uno cargaría su propia
+# copia de todos los clientes; apagado se usa el índice FTS5 de la base y las
+# respuestas se cachean por consulta.
+BUSQUEDA_CLIENTES_MEMORIA = False
+BUSQUEDA_CLIENTES_REVISION = 5
+BUSQUEDA_CLIENTES_CACHE_TTL = 60
+
+# Catálogos de estados y niveles en memoria (uno por worker): segundos entre
+# revisiones de la versión compartida
+CATALOGOS_REVISION = 30
+
+# Segundos que se guarda en el servidor la lista de circuitos de un cliente
+CIRCUITOS_CACHE_TTL = 600
+
+# Cola de trabajos en segundo plano (comando procesar_trabajos): carpeta de los
+# archivos exportados y días que se conservan, segundos entre latidos del trabajo en
+# curso, segundos sin latido tras los que se da por colgado (holgado: en SQLite una
+# escritura larga puede retrasar los latidos) y espera base antes del primer
+# reintento (se duplica en cada intento)
+TRABAJOS_DIRECTORIO = BASE_DIR / 'exportaciones'
+TRABAJOS_RETENCION_DIAS = 7
+TRABAJOS_LATIDO = 60
+TRABAJOS_TIMEOUT = 30 * 60
+TRABAJOS_ESPERA_REINTENTO = 60
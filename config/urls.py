@@ -23,6 +23,8 @@ urlpatterns = [
     
     path('solicitud/nueva/', pages.nueva_solicitud_view, name='nueva_solicitud'),
     path('solicitudes/lista/', pages.lista_solicitudes_view, name='lista_solicitudes'),
+    path('solicitudes/cambiar-estado/', pages.cambiar_estado_masivo_view, name='cambiar_estado_masivo'),
+    path('solicitudes/exportar/', pages.exportar_solicitudes_view, name='exportar_solicitudes'),
     path('personal/', pages.personal_view, name='personal'),
     
     # -- RUTAS DE DETALLE DE SOLICITUD
@@ -35,4 +37,10 @@ urlpatterns = [
     # -- API
     path('search/clientes/', api.search_clientes, name='search_clientes'),
     path('api/get-circuitos/<int:cliente_id>/', api.get_circuitos_por_cliente, name='get_circuitos_por_cliente'),
+    path('api/circuitos/', api.get_circuitos, name='get_circuitos'),
+    path('api/ejecutivos/rebalancear/', api.rebalancear_ejecutivos, name='rebalancear_ejecutivos'),
+    path('api/solicitudes/<int:solicitud_id>/linea-tiempo/', api.linea_tiempo_solicitud, name='linea_tiempo_solicitud'),
+    path('api/trabajos/exportar/', api.encolar_exportacion, name='encolar_exportacion'),
+    path('api/trabajos/<int:trabajo_id>/', api.estado_trabajo, name='estado_trabajo'),
+    path('api/trabajos/<int:trabajo_id>/descarga/', api.descargar_trabajo, name='descargar_trabajo'),
 ]
\ No newline at end of file
@@ -9,7 +9,8 @@ from .models import (
     NivelAprobacion, 
     Comentario,
     HistorialAsignacion,
-    HistorialEstado
+    HistorialEstado,
+    Trabajo
 )
 
 # Registramos los modelos para que aparezcan en el panel de administración
@@ -22,4 +23,5 @@ admin.site.register(EstadoAtencion)
 admin.site.register(NivelAprobacion)
 admin.site.register(Comentario)
 admin.site.register(HistorialAsignacion)
-admin.site.register(HistorialEstado)
\ No newline at end of file
+admin.site.register(HistorialEstado)
+admin.site.register(Trabajo)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class PortalRetencionesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'portal_retenciones'
+
+    def ready(self):
+        # -- Registra los receptores de señales (invalidación de cachés)
+        from portal_retenciones import signals  # noqa: F401
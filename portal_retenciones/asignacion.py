@@ -0,0 +1,440 @@
+# En: portal_retenciones/asignacion.py
+
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+
+from portal_retenciones import catalogos, resumenes
+from portal_retenciones.metricas import ESTADOS_PENDIENTES, invalidar_metricas_dashboard
+from portal_retenciones.pendientes import invalidar_pendientes
+from portal_retenciones.models import (
+    CargaAnalista,
+    CargaEjecutivo,
+    ConfiguracionAsignacion,
+    EjecutivoRetencion,
+    HistorialAsignacion,
+    Solicitud,
+    SolicitudCircuito,
+)
+
+# -- Fila de ConfiguracionAsignacion con el puntero del round-robin
+CLAVE_PUNTERO = 'last_ejecutivo_id'
+
+CERO = Decimal('0')
+
+# -- Límite de parámetros por sentencia: SQL Server admite 2100
+TAMANO_LOTE = 1000
+
+
+def lotes(valores):
+    valores = list(valores)
+    for inicio in range(0, len(valores), TAMANO_LOTE):
+        yield valores[inicio:inicio + TAMANO_LOTE]
+
+
+class SinEjecutivoDisponible(Exception):
+    """No hay ejecutivos activos y disponibles para asignación."""
+
+
+def ids_estados_abiertos():
+    """Ids de los estados pendientes: las solicitudes en ellos cuentan como carga."""
+    return catalogos.ids_estados(ESTADOS_PENDIENTES)
+
+
+def renta_de_solicitud(solicitud_id):
+    """Suma de renta_mensual de los circuitos asociados a la solicitud."""
+    total = SolicitudCircuito.objects.filter(solicitud_id=solicitud_id).aggregate(
+        total=Sum('circuito__renta_mensual')
+    )['total']
+    return total or CERO
+
+
+def _sumar_fila(modelo, clave, **valores):
+    """Suma 'valores' a la fila de 'modelo' identificada por 'clave', creándola si no existe."""
+    filas = modelo.objects.filter(**clave)
+    cambios = {campo: F(campo) + valor for campo, valor in valores.items()}
+    if filas.update(**cambios):
+        return
+    try:
+        with transaction.atomic():
+            modelo.objects.create(**clave, **valores)
+    except IntegrityError:
+        # -- Otra transacción creó la fila entre el UPDATE y el INSERT
+        filas.update(**cambios)
+
+
+def sumar_carga(ejecutivo_id, solicitudes=0, renta=CERO):
+    """Suma solicitudes y renta a la carga del ejecutivo, creando la fila si no existe."""
+    if not solicitudes and not renta:
+        return
+    _sumar_fila(
+        CargaEjecutivo, {'ejecutivo_id': ejecutivo_id}, solicitudes_abiertas=solicitudes, renta_abierta=renta
+    )
+    if solicitudes:
+        invalidar_pendientes('ejecutivo', [ejecutivo_id])
+
+
+def sumar_carga_analista(analista_id, solicitudes):
+    """Suma solicitudes pendientes al contador del analista."""
+    if not solicitudes:
+        return
+    _sumar_fila(CargaAnalista, {'analista_id': analista_id}, solicitudes_abiertas=solicitudes)
+    invalidar_pendientes('analista', [analista_id])
+
+
+# -----------------------------------------------------------------
+# --- MANTENIMIENTO INCREMENTAL DE LA CARGA ---
+# -----------------------------------------------------------------
+
+def registrar_creacion(solicitud, signo=1):
+    """
+    Cuenta una solicitud nueva (o la descuenta con signo=-1 antes de eliminarla)
+    si está en un estado pendiente. Al crearla todavía no tiene circuitos.
+    """
+    if solicitud.estado_actual_id not in ids_estados_abiertos():
+        return
+    renta = renta_de_solicitud(solicitud.id) if signo < 0 else CERO
+    sumar_carga(solicitud.ejecutivo_id, signo, signo * renta)
+    sumar_carga_analista(solicitud.analista_id, signo)
+
+
+def registrar_eliminacion(solicitud):
+    registrar_creacion(solicitud, signo=-1)
+
+
+def registrar_circuitos(solicitud, renta):
+    """
+    Suma la renta de circuitos recién asociados a la solicitud. Quien crea
+    SolicitudCircuito (bulk_create no dispara señales) debe llamarla.
+    """
+    if solicitud.estado_actual_id in ids_estados_abiertos():
+        sumar_carga(solicitud.ejecutivo_id, 0, renta)
+
+
+def registrar_transicion(solicitud, estado_anterior_id, estado_nuevo_id):
+    """Al pasar de pendiente a cerrado (o al revés) la solicitud sale (o vuelve) a la carga."""
+    abiertos = ids_estados_abiertos()
+    antes, despues = estado_anterior_id in abiertos, estado_nuevo_id in abiertos
+    if antes == despues:
+        return
+    signo = 1 if despues else -1
+    sumar_carga(solicitud.ejecutivo_id, signo, signo * renta_de_solicitud(solicitud.id))
+    sumar_carga_analista(solicitud.analista_id, signo)
+
+
+def registrar_reasignacion(solicitud, ejecutivo_anterior_id, ejecutivo_nuevo_id):
+    """Mueve la carga de una solicitud pendiente de un ejecutivo a otro."""
+    if ejecutivo_anterior_id == ejecutivo_nuevo_id:
+        return
+    if solicitud.estado_actual_id not in ids_estados_abiertos():
+        return
+    renta = renta_de_solicitud(solicitud.id)
+    with transaction.atomic():
+        sumar_carga(ejecutivo_anterior_id, -1, -renta)
+        sumar_carga(ejecutivo_nuevo_id, 1, renta)
+
+
+def registrar_transiciones(solicitud_ids, estado_anterior_id, estado_nuevo_id):
+    """
+    Versión masiva de registrar_transicion para cambios hechos con UPDATE y
+    bulk_create: ajusta la carga por ejecutivo y el contador por analista con
+    tres consultas agregadas por lote.
+    """
+    abiertos = ids_estados_abiertos()
+    antes, despues = estado_anterior_id in abiertos, estado_nuevo_id in abiertos
+    if antes == despues:
+        return
+    signo = 1 if despues else -1
+
+    cargas, por_analista = {}, {}
+    for lote in lotes(solicitud_ids):
+        analistas = Solicitud.objects.filter(id__in=lote).values('analista').annotate(cantidad=Count('id'))
+        for item in analistas.order_by():
+            por_analista[item['analista']] = por_analista.get(item['analista'], 0) + item['cantidad']
+        por_ejecutivo = Solicitud.objects.filter(id__in=lote).values('ejecutivo').annotate(cantidad=Count('id'))
+        for item in por_ejecutivo.order_by():
+            cantidad, renta = cargas.get(item['ejecutivo'], (0, CERO))
+            cargas[item['ejecutivo']] = (cantidad + item['cantidad'], renta)
+        rentas = SolicitudCircuito.objects.filter(solicitud_id__in=lote).values('solicitud__ejecutivo').annotate(
+            renta=Sum('circuito__renta_mensual')
+        )
+        for item in rentas.order_by():
+            cantidad, renta = cargas[item['solicitud__ejecutivo']]
+            cargas[item['solicitud__ejecutivo']] = (cantidad, renta + (item['renta'] or CERO))
+
+    for ejecutivo_id, (cantidad, renta) in cargas.items():
+        sumar_carga(ejecutivo_id, signo * cantidad, signo * renta)
+    for analista_id, cantidad in por_analista.items():
+        sumar_carga_analista(analista_id, signo * cantidad)
+
+
+# -----------------------------------------------------------------
+# --- ELECCIÓN DEL EJECUTIVO ---
+# -----------------------------------------------------------------
+
+def _bloquear_puntero():
+    """
+    Bloquea la fila del puntero hasta el commit de la transacción en curso y
+    devuelve el id del último ejecutivo asignado. Toda decisión que lea la carga
+    de los ejecutivos pasa por aquí, así se serializan entre workers.
+    """
+    punteros = ConfiguracionAsignacion.objects.filter(clave=CLAVE_PUNTERO)
+    # -- Escribir antes de leer toma el bloqueo (de fila en SQL Server, de la base en SQLite)
+    if not punteros.update(valor=F('valor')):
+        ConfiguracionAsignacion.objects.get_or_create(clave=CLAVE_PUNTERO)
+    return punteros.select_for_update().values_list('valor', flat=True).get()
+
+
+def _candidatos(excluir=(), solo=None):
+    ejecutivos = EjecutivoRetencion.objects.filter(activo=True, disponible_asignacion=True).exclude(id__in=excluir)
+    if solo is not None:
+        ejecutivos = ejecutivos.filter(id__in=solo)
+    return list(ejecutivos.order_by('id').values(
+        'id', 'max_carga_renta', 'carga__renta_abierta', 'carga__solicitudes_abiertas'
+    ))
+
+
+def _cabe(candidato, renta):
+    tope = candidato['max_carga_renta']
+    return tope is None or (candidato['carga__renta_abierta'] or CERO) + renta <= tope
+
+
+def _uso_relativo(candidato):
+    # -- Sin tope, el uso relativo es 0; si no, la fracción del tope ya ocupada
+    tope = candidato['max_carga_renta']
+    if not tope:
+        return CERO if tope is None else Decimal('Infinity')
+    return (candidato['carga__renta_abierta'] or CERO) / tope
+
+
+def elegir_ejecutivo(renta=CERO, excluir=()):
+    """
+    Devuelve el id del siguiente ejecutivo por round-robin al que le cabe 'renta'
+    sin superar su max_carga_renta (o el de menor carga relativa si no le cabe a
+    ninguno) y avanza el puntero. Lee la carga de CargaEjecutivo, no de Solicitud.
+
+    El puntero se bloquea hasta el commit de la transacción que lo llama: dos
+    workers concurrentes esperan su turno y nunca eligen con la misma lectura.
+    """
+    with transaction.atomic():
+        ultimo_id = _bloquear_puntero()
+        candidatos = _candidatos(excluir)
+        if not candidatos:
+            raise SinEjecutivoDisponible('No hay ejecutivos activos disponibles para asignación.')
+
+        orden = [c for c in candidatos if c['id'] > ultimo_id] + [c for c in candidatos if c['id'] <= ultimo_id]
+        elegido = next((c for c in orden if _cabe(c, renta)), None)
+        if elegido is None:
+            elegido = min(orden, key=_uso_relativo)
+
+        ConfiguracionAsignacion.objects.filter(clave=CLAVE_PUNTERO).update(valor=elegido['id'])
+        return elegido['id']
+
+
+def asignar_automaticamente(solicitud, motivo='Asignación automática', excluir=()):
+    """
+    Asigna la solicitud al ejecutivo elegido, marca asignado_automaticamente,
+    registra el HistorialAsignacion (que mueve los contadores vía señales) y
+    descarta la foto del dashboard al confirmar.
+    """
+    with transaction.atomic():
+        nuevo_id = elegir_ejecutivo(renta_de_solicitud(solicitud.id), excluir=excluir)
+        anterior_id = solicitud.ejecutivo_id
+        Solicitud.objects.filter(id=solicitud.id).update(ejecutivo_id=nuevo_id, asignado_automaticamente=True)
+        solicitud.ejecutivo_id = nuevo_id
+        solicitud.asignado_automaticamente = True
+        HistorialAsignacion.objects.create(
+            solicitud=solicitud,
+            ejecutivo_anterior_id=anterior_id,
+            ejecutivo_nuevo_id=nuevo_id,
+            motivo=motivo,
+        )
+        invalidar_metricas_dashboard()
+    return nuevo_id
+
+
+# -----------------------------------------------------------------
+# --- REBALANCEO MASIVO ---
+# -----------------------------------------------------------------
+
+def planificar_rebalanceo(origenes, destinos=None):
+    """
+    Reparte las solicitudes pendientes de los ejecutivos 'origenes' entre los
+    disponibles (o solo entre 'destinos'). De mayor a menor renta, cada solicitud
+    va al destino con menos renta abierta entre los que la reciben sin superar su
+    max_carga_renta; las que no caben en ninguno quedan en 'sin_destino'.
+    """
+    pendientes = (
+        Solicitud.objects.filter(ejecutivo_id__in=origenes, estado_actual_id__in=ids_estados_abiertos())
+        .annotate(renta=Sum('solicitudcircuito__circuito__renta_mensual'))
+        .order_by()
+        .values_list('id', 'ejecutivo_id', 'renta')
+    )
+    candidatos = _candidatos(excluir=origenes, solo=destinos)
+    for candidato in candidatos:
+        candidato['carga__renta_abierta'] = candidato['carga__renta_abierta'] or CERO
+        candidato['carga__solicitudes_abiertas'] = candidato['carga__solicitudes_abiertas'] or 0
+
+    def menos_cargado(candidato):
+        # -- El tope solo descarta; entre los que caben, el de menos renta y luego menos solicitudes
+        return candidato['carga__renta_abierta'], candidato['carga__solicitudes_abiertas']
+
+    movimientos, sin_destino = [], []
+    for solicitud_id, anterior_id, renta in sorted(pendientes, key=lambda fila: (-(fila[2] or CERO), fila[0])):
+        renta = renta or CERO
+        caben = [c for c in candidatos if _cabe(c, renta)]
+        if not caben:
+            sin_destino.append(solicitud_id)
+            continue
+        destino = min(caben, key=menos_cargado)
+        destino['carga__renta_abierta'] += renta
+        destino['carga__solicitudes_abiertas'] += 1
+        movimientos.append((solicitud_id, anterior_id, destino['id'], renta))
+
+    por_destino = {
+        c['id']: {'solicitudes': 0, 'renta': CERO, 'renta_final': c['carga__renta_abierta'], 'tope': c['max_carga_renta']}
+        for c in candidatos
+    }
+    for _, _, nuevo_id, renta in movimientos:
+        por_destino[nuevo_id]['solicitudes'] += 1
+        por_destino[nuevo_id]['renta'] += renta
+
+    return {
+        'movimientos': movimientos,
+        'sin_destino': sin_destino,
+        'por_destino': {k: v for k, v in por_destino.items() if v['solicitudes']},
+    }
+
+
+def aplicar_rebalanceo(movimientos, motivo):
+    """
+    Aplica los movimientos con un UPDATE por destino y lote, un bulk_create de
+    HistorialAsignacion y contadores ajustados por par de ejecutivos (bulk_create
+    y update no disparan señales). Debe llamarse dentro de una transacción.
+    """
+    por_destino, por_par, cargas = {}, {}, {}
+    for solicitud_id, anterior_id, nuevo_id, renta in movimientos:
+        por_destino.setdefault(nuevo_id, []).append(solicitud_id)
+        por_par[anterior_id, nuevo_id] = por_par.get((anterior_id, nuevo_id), 0) + 1
+        for ejecutivo_id, signo in ((anterior_id, -1), (nuevo_id, 1)):
+            cantidad, total = cargas.get(ejecutivo_id, (0, CERO))
+            cargas[ejecutivo_id] = (cantidad + signo, total + signo * renta)
+
+    # -- El rebalanceo lo decide el personal: la solicitud deja de figurar como asignada automáticamente
+    for nuevo_id, ids in por_destino.items():
+        for lote in lotes(ids):
+            Solicitud.objects.filter(id__in=lote).update(ejecutivo_id=nuevo_id, asignado_automaticamente=False)
+
+    HistorialAsignacion.objects.bulk_create(
+        (
+            HistorialAsignacion(
+                solicitud_id=solicitud_id, ejecutivo_anterior_id=anterior_id, ejecutivo_nuevo_id=nuevo_id, motivo=motivo
+            )
+            for solicitud_id, anterior_id, nuevo_id, _ in movimientos
+        ),
+        batch_size=TAMANO_LOTE,
+    )
+
+    for (anterior_id, nuevo_id), cantidad in por_par.items():
+        resumenes.registrar_reasignacion(anterior_id, nuevo_id, cantidad)
+    for ejecutivo_id, (cantidad, renta) in cargas.items():
+        sumar_carga(ejecutivo_id, cantidad, renta)
+    invalidar_metricas_dashboard()
+
+
+def rebalancear(origenes, destinos=None, motivo='Rebalanceo de carga', simular=False):
+    """
+    Planifica y (salvo con simular=True) aplica el rebalanceo en una sola
+    transacción, con el puntero bloqueado para que ninguna asignación
+    automática concurrente lea cargas a medio mover. Devuelve el plan.
+    """
+    with transaction.atomic():
+        _bloquear_puntero()
+        plan = planificar_rebalanceo(origenes, destinos)
+        if not simular:
+            aplicar_rebalanceo(plan['movimientos'], motivo)
+    return plan
+
+
+# -----------------------------------------------------------------
+# --- RECONSTRUCCIÓN Y VERIFICACIÓN ---
+# -----------------------------------------------------------------
+
+def cargas_reales():
+    """Recalcula la carga de cada ejecutivo recorriendo sus solicitudes pendientes."""
+    pendientes = Solicitud.objects.filter(estado_actual_id__in=ids_estados_abiertos())
+    cargas = {
+        item['ejecutivo']: (item['cantidad'], CERO)
+        for item in pendientes.values('ejecutivo').annotate(cantidad=Count('id'))
+    }
+    rentas = SolicitudCircuito.objects.filter(solicitud__in=pendientes).values(
+        'solicitud__ejecutivo'
+    ).annotate(renta=Sum('circuito__renta_mensual'))
+    for item in rentas:
+        cantidad, _ = cargas[item['solicitud__ejecutivo']]
+        cargas[item['solicitud__ejecutivo']] = (cantidad, item['renta'] or CERO)
+    return cargas
+
+
+def cargas_guardadas():
+    return {
+        carga.ejecutivo_id: (carga.solicitudes_abiertas, carga.renta_abierta)
+        for carga in CargaEjecutivo.objects.all()
+    }
+
+
+def verificar_cargas():
+    """Devuelve una lista de (ejecutivo_id, guardado, real) con las diferencias."""
+    reales = cargas_reales()
+    guardadas = cargas_guardadas()
+    vacia = (0, CERO)
+    return [
+        (ejecutivo_id, guardadas.get(ejecutivo_id, vacia), reales.get(ejecutivo_id, vacia))
+        for ejecutivo_id in sorted(set(reales) | set(guardadas))
+        if guardadas.get(ejecutivo_id, vacia) != reales.get(ejecutivo_id, vacia)
+    ]
+
+
+def cargas_analista_reales():
+    """Recalcula las solicitudes pendientes de cada analista."""
+    pendientes = Solicitud.objects.filter(estado_actual_id__in=ids_estados_abiertos())
+    return dict(pendientes.values_list('analista').annotate(cantidad=Count('id')).order_by())
+
+
+def verificar_cargas_analista():
+    """Devuelve una lista de (analista_id, guardado, real) con las diferencias."""
+    reales = cargas_analista_reales()
+    guardadas = dict(CargaAnalista.objects.values_list('analista_id', 'solicitudes_abiertas'))
+    return [
+        (analista_id, guardadas.get(analista_id, 0), reales.get(analista_id, 0))
+        for analista_id in sorted(set(reales) | set(guardadas))
+        if guardadas.get(analista_id, 0) != reales.get(analista_id, 0)
+    ]
+
+
+@transaction.atomic
+def reconstruir_cargas():
+    """Vacía y vuelve a poblar CargaEjecutivo desde cero."""
+    reales = cargas_reales()
+    anteriores = list(CargaEjecutivo.objects.values_list('ejecutivo_id', flat=True))
+    CargaEjecutivo.objects.all().delete()
+    CargaEjecutivo.objects.bulk_create(
+        CargaEjecutivo(ejecutivo_id=clave, solicitudes_abiertas=cantidad, renta_abierta=renta)
+        for clave, (cantidad, renta) in reales.items()
+    )
+    invalidar_pendientes('ejecutivo', set(anteriores) | set(reales))
+    return reales
+
+
+@transaction.atomic
+def reconstruir_cargas_analista():
+    """Vacía y vuelve a poblar CargaAnalista desde cero."""
+    reales = cargas_analista_reales()
+    anteriores = list(CargaAnalista.objects.values_list('analista_id', flat=True))
+    CargaAnalista.objects.all().delete()
+    CargaAnalista.objects.bulk_create(
+        CargaAnalista(analista_id=clave, solicitudes_abiertas=cantidad) for clave, cantidad in reales.items()
+    )
+    invalidar_pendientes('analista', set(anteriores) | set(reales))
+    return reales
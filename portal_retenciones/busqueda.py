@@ -0,0 +1,224 @@
+# En: portal_retenciones/busqueda.py
+
+import heapq
+import re
+import sys
+import threading
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+
+from portal_retenciones import versiones
+from portal_retenciones.models import Cliente
+
+# -- Tabla FTS5 (external content) creada por la migración 0006 solo en SQLite
+TABLA_FTS_CLIENTES = 'portal_retenciones_cliente_fts'
+
+LIMITE_RESULTADOS = 10
+
+# -- Versión compartida (entre workers) del catálogo de clientes
+CLAVE_VERSION_CLIENTES = 'clientes:version'
+
+_fts_disponible = None
+
+
+def fts_disponible():
+    """Indica (una vez por proceso) si la base de datos tiene el índice FTS5 de clientes."""
+    global _fts_disponible
+    if _fts_disponible is None:
+        _fts_disponible = (
+            connection.vendor == 'sqlite'
+            and TABLA_FTS_CLIENTES in connection.introspection.table_names()
+        )
+    return _fts_disponible
+
+
+def _consulta_fts(texto):
+    """Convierte el texto del usuario en una consulta FTS5 de prefijos: "tel"* "per"*"""
+    tokens = re.findall(r'\w+', texto.lower())
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def _por_prefijo_ruc(prefijo, limite):
+    # -- Rango [prefijo, prefijo + U+FFFF) sobre el índice único de ruc (LIKE no lo usa en SQLite)
+    return list(
+        Cliente.objects.filter(ruc__gte=prefijo, ruc__lt=prefijo + '\uffff')
+        .order_by('ruc')
+        .values_list('id', 'razon_social', 'ruc')[:limite]
+    )
+
+
+def _por_texto_fts(texto, limite):
+    consulta = _consulta_fts(texto)
+    if not consulta:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT c.id, c.razon_social, c.ruc
+            FROM {TABLA_FTS_CLIENTES} f
+            JOIN portal_retenciones_cliente c ON c.id = f.rowid
+            WHERE {TABLA_FTS_CLIENTES} MATCH %s
+            ORDER BY bm25({TABLA_FTS_CLIENTES}, 10.0, 1.0), c.razon_social
+            LIMIT %s
+            """,
+            [consulta, limite],
+        )
+        return cursor.fetchall()
+
+
+def _por_texto_icontains(texto, limite):
+    return list(
+        Cliente.objects.filter(razon_social__icontains=texto)
+        .values_list('id', 'razon_social', 'ruc')[:limite]
+    )
+
+
+def buscar_clientes(texto, limite=LIMITE_RESULTADOS):
+    """
+    Busca clientes para el autocompletado. Devuelve tuplas (id, razon_social, ruc).
+      - Texto numérico: prefijo de RUC usando el índice único.
+      - Texto libre: índice FTS5 por prefijos de palabra, ordenado por relevancia (bm25).
+        Si la base de datos no tiene FTS5 se usa icontains.
+    """
+    texto = (texto or '').strip()
+    if not texto:
+        return []
+
+    if getattr(settings, 'BUSQUEDA_CLIENTES_MEMORIA', False):
+        return obtener_indice_clientes().buscar(texto, limite)
+
+    if texto.isdigit():
+        return _por_prefijo_ruc(texto, limite)
+
+    if fts_disponible():
+        try:
+            return _por_texto_fts(texto, limite)
+        except DatabaseError:
+            pass
+
+    return _por_texto_icontains(texto, limite)
+
+
+# -----------------------------------------------------------------
+# --- ÍNDICE EN MEMORIA (uno por worker) ---
+# -----------------------------------------------------------------
+
+def normalizar(texto):
+    """Minúsculas y sin tildes: 'Telefónica' -> 'telefonica'."""
+    texto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in texto if not unicodedata.combining(c)).lower()
+
+
+class IndiceClientes:
+    """
+    Índice de prefijos en memoria para el autocompletado de clientes.
+    Guarda las palabras normalizadas de la razón social y los RUC en listas
+    ordenadas, de modo que una búsqueda por prefijo es un bisect + recorrido.
+    """
+
+    def __init__(self, filas, version):
+        self.version = version
+        self.clientes = {}
+        self.nombres = {}
+        palabras = []
+        rucs = []
+        for cliente_id, razon_social, ruc in filas:
+            self.clientes[cliente_id] = (razon_social, ruc)
+            self.nombres[cliente_id] = normalizar(razon_social)
+            for palabra in set(re.findall(r'\w+', self.nombres[cliente_id])):
+                palabras.append((palabra, cliente_id))
+            rucs.append((ruc, cliente_id))
+
+        palabras.sort()
+        rucs.sort()
+        # -- Listas paralelas (texto, id) para no guardar una tupla por entrada
+        self.palabras = [sys.intern(palabra) for palabra, _ in palabras]
+        self.ids_palabras = array('q', (cliente_id for _, cliente_id in palabras))
+        self.rucs = [ruc for ruc, _ in rucs]
+        self.ids_rucs = array('q', (cliente_id for _, cliente_id in rucs))
+
+    @staticmethod
+    def _rango(claves, ids, prefijo):
+        inicio = bisect_left(claves, prefijo)
+        fin = bisect_left(claves, prefijo + '\uffff', inicio)
+        return ids[inicio:fin]
+
+    def buscar(self, texto, limite=LIMITE_RESULTADOS):
+        texto = normalizar(texto).strip()
+        if texto.isdigit():
+            ids = self._rango(self.rucs, self.ids_rucs, texto)[:limite]
+            return [(cliente_id, *self.clientes[cliente_id]) for cliente_id in ids]
+
+        tokens = re.findall(r'\w+', texto)
+        if not tokens:
+            return []
+
+        # -- Cada palabra de la consulta debe ser prefijo de alguna palabra del cliente
+        candidatos = None
+        for token in sorted(tokens, key=len, reverse=True):
+            encontrados = set(self._rango(self.palabras, self.ids_palabras, token))
+            candidatos = encontrados if candidatos is None else candidatos & encontrados
+            if not candidatos:
+                return []
+
+        # -- Primero los que empiezan por la primera palabra buscada, luego alfabético
+        primero = tokens[0]
+        ordenados = heapq.nsmallest(
+            limite,
+            candidatos,
+            key=lambda cliente_id: (
+                not self.nombres[cliente_id].startswith(primero),
+                self.nombres[cliente_id],
+            ),
+        )
+        return [(cliente_id, *self.clientes[cliente_id]) for cliente_id in ordenados]
+
+
+_indice = None
+_indice_revisado = 0.0
+_indice_lock = threading.Lock()
+
+
+def version_clientes():
+    return versiones.version(CLAVE_VERSION_CLIENTES)
+
+
+def obtener_indice_clientes():
+    """
+    Devuelve el índice del worker, cargándolo la primera vez. Cada
+    BUSQUEDA_CLIENTES_REVISION segundos compara su versión con la compartida
+    y se recarga si otro proceso modificó clientes.
+    """
+    global _indice, _indice_revisado
+    intervalo = getattr(settings, 'BUSQUEDA_CLIENTES_REVISION', 5)
+    ahora = time.monotonic()
+
+    if _indice is not None and ahora - _indice_revisado < intervalo:
+        return _indice
+
+    with _indice_lock:
+        version = version_clientes()
+        if _indice is None or _indice.version != version:
+            filas = Cliente.objects.values_list('id', 'razon_social', 'ruc').iterator(chunk_size=5000)
+            _indice = IndiceClientes(filas, version)
+        _indice_revisado = ahora
+        return _indice
+
+
+def invalidar_indice_clientes():
+    """Marca el catálogo de clientes como modificado (para todos los workers)."""
+    global _indice
+    _indice = None
+
+    versiones.renovar_al_confirmar(CLAVE_VERSION_CLIENTES)
+
+
+def clave_cache_busqueda(texto):
+    """Clave de la respuesta cacheada: versión del catálogo + consulta normalizada."""
+    consulta = '+'.join(re.findall(r'\w+', normalizar(texto)))
+    return f'search_clientes:{version_clientes()}:{consulta}'
@@ -0,0 +1,117 @@
+# En: portal_retenciones/catalogos.py
+
+import threading
+import time
+
+from django.conf import settings
+
+from portal_retenciones import versiones
+from portal_retenciones.models import EstadoAtencion, NivelAprobacion
+
+# -- Versión compartida (entre workers) de los catálogos de estados y niveles
+CLAVE_VERSION_CATALOGOS = 'catalogos:version'
+
+
+class Catalogos:
+    """
+    Foto en memoria de EstadoAtencion y NivelAprobacion con búsqueda por id y
+    por nombre. Las instancias se comparten entre requests: son de solo lectura.
+    """
+
+    def __init__(self, estados, niveles, version):
+        self.version = version
+        self.estados = sorted(estados, key=lambda estado: estado.id)
+        self.niveles = sorted(niveles, key=lambda nivel: (nivel.orden, nivel.id))
+        self.estados_por_id = {estado.id: estado for estado in self.estados}
+        self.estados_por_nombre = {estado.nombre_estado: estado for estado in self.estados}
+        self.niveles_por_id = {nivel.id: nivel for nivel in self.niveles}
+
+
+_catalogos = None
+_catalogos_revisado = 0.0
+_catalogos_lock = threading.Lock()
+
+
+def version_catalogos():
+    return versiones.version(CLAVE_VERSION_CATALOGOS)
+
+
+def obtener_catalogos():
+    """
+    Devuelve los catálogos del worker, cargándolos la primera vez. Cada
+    CATALOGOS_REVISION segundos compara su versión con la compartida y se
+    recarga si otro proceso modificó un estado o un nivel.
+    """
+    global _catalogos, _catalogos_revisado
+    intervalo = getattr(settings, 'CATALOGOS_REVISION', 30)
+    ahora = time.monotonic()
+
+    if _catalogos is not None and ahora - _catalogos_revisado < intervalo:
+        return _catalogos
+
+    with _catalogos_lock:
+        version = version_catalogos()
+        if _catalogos is None or _catalogos.version != version:
+            _catalogos = Catalogos(list(EstadoAtencion.objects.all()), list(NivelAprobacion.objects.all()), version)
+        _catalogos_revisado = ahora
+        return _catalogos
+
+
+def invalidar_catalogos():
+    """Marca los catálogos como modificados (para todos los workers)."""
+    global _catalogos
+    _catalogos = None
+
+    versiones.renovar_al_confirmar(CLAVE_VERSION_CATALOGOS)
+
+
+# -----------------------------------------------------------------
+# --- CONSULTAS (sin tocar la base de datos) ---
+# -----------------------------------------------------------------
+
+def estados():
+    """Todos los estados, ordenados por id."""
+    return obtener_catalogos().estados
+
+
+def estado_por_id(estado_id):
+    return obtener_catalogos().estados_por_id.get(estado_id)
+
+
+def estado_por_nombre(nombre):
+    return obtener_catalogos().estados_por_nombre.get(nombre)
+
+
+def ids_estados(nombres):
+    """Ids de los estados con esos nombres (los inexistentes se ignoran)."""
+    por_nombre = obtener_catalogos().estados_por_nombre
+    return {por_nombre[nombre].id for nombre in nombres if nombre in por_nombre}
+
+
+def adjuntar_estados(filas, *campos):
+    """
+    Asigna a cada instancia el EstadoAtencion de sus FK 'campos' desde el catálogo,
+    en lugar de un select_related (JOIN) o una consulta por fila.
+    """
+    por_id = obtener_catalogos().estados_por_id
+    for fila in filas:
+        for campo in campos:
+            estado = por_id.get(getattr(fila, f'{campo}_id'))
+            if estado is not None:
+                setattr(fila, campo, estado)
+    return filas
+
+
+def niveles():
+    """Todos los niveles de aprobación, ordenados por 'orden'."""
+    return obtener_catalogos().niveles
+
+
+def nivel_por_id(nivel_id):
+    return obtener_catalogos().niveles_por_id.get(nivel_id)
+
+
+def nivel_inicial():
+    """Nivel de aprobación con el menor 'orden' (None si el catálogo está vacío)."""
+    niveles_ordenados = niveles()
+    return niveles_ordenados[0] if niveles_ordenados else None
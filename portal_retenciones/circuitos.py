@@ -0,0 +1,140 @@
+# En: portal_retenciones/circuitos.py
+
+import hashlib
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max, Q, Sum
+
+from portal_retenciones import versiones
+from portal_retenciones.models import Circuito, Cliente
+
+# -- Una sola versión para todos los clientes: altas y bajas ya cambian el resumen de
+#    estado_circuitos; la versión cubre las ediciones y las cargas masivas
+CLAVE_VERSION_CIRCUITOS = 'circuitos:version'
+
+CAMPOS_CIRCUITO = ('id', 'nombre_circuito', 'tipo_servicio', 'renta_mensual')
+
+
+def invalidar_circuitos():
+    """
+    Invalida las respuestas cacheadas de circuitos de todos los clientes, una
+    vez confirmada la transacción en curso.
+    """
+    versiones.renovar_al_confirmar(CLAVE_VERSION_CIRCUITOS)
+
+
+def estado_circuitos(cliente_id):
+    """
+    Resume en una consulta los circuitos de un cliente: cantidad, última
+    fecha de creación e id máximo. Devuelve None si el cliente no existe.
+    El ETag combina ese resumen con la versión de caché de los circuitos.
+    """
+    resumen = Cliente.objects.filter(id=cliente_id).aggregate(
+        existe=Count('id', distinct=True),
+        total=Count('circuito'),
+        ultima=Max('circuito__fecha_creacion'),
+        max_id=Max('circuito__id'),
+    )
+    if not resumen['existe']:
+        return None
+
+    firma = ':'.join(str(valor) for valor in (
+        cliente_id,
+        resumen['total'],
+        resumen['ultima'].isoformat() if resumen['ultima'] else '',
+        resumen['max_id'],
+        versiones.version(CLAVE_VERSION_CIRCUITOS),
+    ))
+    return {
+        'etag': hashlib.md5(firma.encode()).hexdigest(),
+        'ultima_modificacion': resumen['ultima'],
+        'total': resumen['total'],
+    }
+
+
+def circuitos_de_cliente(cliente_id, etag):
+    """Lista (dicts, sin instanciar modelos) de los circuitos del cliente, cacheada por ETag."""
+    clave = f'circuitos:lista:{etag}'
+    circuitos = cache.get(clave)
+    if circuitos is None:
+        circuitos = list(
+            Circuito.objects.filter(cliente_id=cliente_id).order_by('id').values(*CAMPOS_CIRCUITO)
+        )
+        cache.set(clave, circuitos, getattr(settings, 'CIRCUITOS_CACHE_TTL', 600))
+    return circuitos
+
+
+# -----------------------------------------------------------------
+# --- CONSULTA POR LOTES (varios clientes, filtros y totales) ---
+# -----------------------------------------------------------------
+
+TAMANO_PAGINA_CIRCUITOS = 50
+TAMANO_MAXIMO_CIRCUITOS = 500
+CENTIMOS = Decimal('0.01')
+
+
+def _leer_entero(valor, defecto=None):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return defecto
+
+
+def leer_filtros_circuitos(params):
+    """
+    Normaliza los parámetros GET del endpoint de circuitos.
+    cliente_id admite varios valores (?cliente_id=1&cliente_id=2) o una lista "1,2".
+    """
+    clientes = []
+    for valor in params.getlist('cliente_id'):
+        clientes.extend(_leer_entero(parte) for parte in valor.split(','))
+    tamano = _leer_entero(params.get('tamano'), TAMANO_PAGINA_CIRCUITOS)
+    return {
+        'clientes': sorted({c for c in clientes if c}),
+        'texto': (params.get('q') or '').strip(),
+        'tipo_servicio': (params.get('tipo_servicio') or '').strip(),
+        'estado': (params.get('estado') or '').strip(),
+        'despues': _leer_entero(params.get('despues')),
+        'tamano': max(1, min(tamano, TAMANO_MAXIMO_CIRCUITOS)),
+    }
+
+
+def filtrar_circuitos(filtros):
+    circuitos = Circuito.objects.filter(cliente_id__in=filtros['clientes'])
+    if filtros['texto']:
+        circuitos = circuitos.filter(
+            Q(nombre_circuito__icontains=filtros['texto']) | Q(tipo_servicio__icontains=filtros['texto'])
+        )
+    if filtros['tipo_servicio']:
+        circuitos = circuitos.filter(tipo_servicio=filtros['tipo_servicio'])
+    if filtros['estado']:
+        circuitos = circuitos.filter(estado=filtros['estado'])
+    return circuitos
+
+
+def totales_circuitos(circuitos):
+    """Cantidad y suma de renta_mensual por tipo de servicio, calculadas en la base de datos."""
+    por_tipo = list(
+        circuitos.order_by().values('tipo_servicio').annotate(
+            cantidad=Count('id'), renta_mensual=Sum('renta_mensual')
+        ).order_by('tipo_servicio')
+    )
+    for item in por_tipo:
+        item['renta_mensual'] = (item['renta_mensual'] or Decimal('0')).quantize(CENTIMOS)
+    return {
+        'cantidad': sum(item['cantidad'] for item in por_tipo),
+        'renta_mensual': sum((item['renta_mensual'] for item in por_tipo), Decimal('0')).quantize(CENTIMOS),
+        'por_tipo_servicio': por_tipo,
+    }
+
+
+def pagina_circuitos(circuitos, despues, tamano):
+    """Página por keyset sobre id: devuelve (filas, id para pedir la siguiente o None)."""
+    if despues:
+        circuitos = circuitos.filter(id__gt=despues)
+    filas = list(circuitos.order_by('id').values('cliente_id', *CAMPOS_CIRCUITO, 'estado')[:tamano + 1])
+    if len(filas) > tamano:
+        return filas[:tamano], filas[tamano - 1]['id']
+    return filas, None
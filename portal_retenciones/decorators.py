@@ -1,24 +1,24 @@
 # En: portal_retenciones/decorators.py
 
+from functools import wraps
+
 from django.core.exceptions import PermissionDenied
-from django.contrib.auth.decorators import user_passes_test
+
+from portal_retenciones.permisos import permisos_de
 
 def permission_required(perm):
     """
     Decora vistas para asegurar que el usuario tiene un permiso específico (ej: 'portal_retenciones.can_create_solicitud').
-    Permite el acceso al superusuario.
+    Permite el acceso al superusuario. Los permisos salen de la caché de sesión (permisos.permisos_de),
+    no de la base de datos en cada vista.
     """
-    def check_permission(user):
-        # 1. Permite el acceso al superusuario
-        if user.is_superuser:
-            return True
-        
-        # 2. Verifica si el usuario tiene el permiso requerido
-        if user.has_perm(perm):
-            return True
-        
-        # 3. Si no cumple las condiciones, deniega el permiso
-        raise PermissionDenied
-    
-    # user_passes_test se encarga de redirigir al LOGIN_URL si falla
-    return user_passes_test(check_permission, login_url='/')
\ No newline at end of file
+    def decorador(vista):
+        @wraps(vista)
+        def envoltura(request, *args, **kwargs):
+            # -- Superusuario o permiso resuelto en la sesión; si no, se deniega
+            if not permisos_de(request).tiene(perm):
+                raise PermissionDenied
+            return vista(request, *args, **kwargs)
+        return envoltura
+
+    return decorador
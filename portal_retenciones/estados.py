@@ -0,0 +1,105 @@
+# En: portal_retenciones/estados.py
+
+from django.db import transaction
+
+from portal_retenciones import asignacion, catalogos, resumenes
+from portal_retenciones.metricas import invalidar_metricas_dashboard
+from portal_retenciones.models import HistorialEstado, Solicitud
+
+# -- Transiciones permitidas entre los estados del catálogo (seed_db.ESTADOS).
+#    Un estado sin salidas es final.
+TRANSICIONES = {
+    'Registrado': ['En Análisis'],
+    'En Análisis': ['Aprobado', 'Rechazado'],
+    'Aprobado': ['Baja Ejecutada'],
+    'Rechazado': [],
+    'Baja Ejecutada': [],
+}
+
+
+class TransicionInvalida(Exception):
+    """El cambio de estado pedido no está permitido (el mensaje se muestra al usuario)."""
+
+
+def transiciones_por_id():
+    """
+    La tabla TRANSICIONES traducida a ids: {estado_id: {estado_id destino, ...}}
+    y {estado_id: nombre}, a partir del catálogo en memoria.
+    """
+    nombres = {estado.id: estado.nombre_estado for estado in catalogos.estados()}
+    ids = {nombre: estado_id for estado_id, nombre in nombres.items()}
+    permitidas = {
+        estado_id: {ids[destino] for destino in TRANSICIONES.get(nombre, []) if destino in ids}
+        for estado_id, nombre in nombres.items()
+    }
+    return permitidas, nombres
+
+
+def estados_siguientes(estado_id):
+    """Estados (id, nombre) a los que puede pasar una solicitud en 'estado_id'."""
+    permitidas, nombres = transiciones_por_id()
+    return sorted(
+        ((destino, nombres[destino]) for destino in permitidas.get(estado_id, ())),
+        key=lambda estado: estado[0],
+    )
+
+
+def cambiar_estado(solicitud_ids, estado_nuevo_id, usuario_cambio):
+    """
+    Pasa todas las solicitudes a 'estado_nuevo_id' o ninguna: si alguna no admite
+    la transición (o cambió de estado mientras tanto) lanza TransicionInvalida.
+    Por cada estado de origen hace un UPDATE y un bulk_create de HistorialEstado;
+    los contadores y la carga se ajustan explícitamente (no hay señales).
+    Devuelve la cantidad de solicitudes cambiadas.
+    """
+    solicitud_ids = sorted(set(solicitud_ids))
+    permitidas, nombres = transiciones_por_id()
+    if estado_nuevo_id not in nombres:
+        raise TransicionInvalida('Estado no válido.')
+
+    with transaction.atomic():
+        por_estado = {}
+        for lote in asignacion.lotes(solicitud_ids):
+            for solicitud_id, estado_id in Solicitud.objects.filter(id__in=lote).values_list('id', 'estado_actual_id'):
+                por_estado.setdefault(estado_id, []).append(solicitud_id)
+
+        encontradas = sum(len(ids) for ids in por_estado.values())
+        if encontradas != len(solicitud_ids):
+            raise TransicionInvalida(f'{len(solicitud_ids) - encontradas} solicitudes no existen.')
+
+        invalidas = [
+            estado_id for estado_id in por_estado if estado_nuevo_id not in permitidas.get(estado_id, ())
+        ]
+        if invalidas:
+            detalle = ', '.join(
+                f'{nombres[estado_id]} ({len(por_estado[estado_id])})' for estado_id in sorted(invalidas)
+            )
+            raise TransicionInvalida(f'No se puede pasar a {nombres[estado_nuevo_id]} desde: {detalle}.')
+
+        for estado_anterior_id, ids in por_estado.items():
+            for lote in asignacion.lotes(ids):
+                # -- El filtro por estado detecta cambios concurrentes entre la lectura y el UPDATE
+                cambiadas = Solicitud.objects.filter(id__in=lote, estado_actual_id=estado_anterior_id).update(
+                    estado_actual_id=estado_nuevo_id
+                )
+                if cambiadas != len(lote):
+                    raise TransicionInvalida('Otra persona cambió alguna de las solicitudes; vuelva a intentarlo.')
+
+            HistorialEstado.objects.bulk_create(
+                (
+                    HistorialEstado(
+                        solicitud_id=solicitud_id,
+                        estado_anterior_id=estado_anterior_id,
+                        estado_nuevo_id=estado_nuevo_id,
+                        usuario_cambio=usuario_cambio,
+                    )
+                    for solicitud_id in ids
+                ),
+                batch_size=asignacion.TAMANO_LOTE,
+            )
+            resumenes.registrar_transicion(estado_anterior_id, estado_nuevo_id, len(ids))
+            asignacion.registrar_transiciones(ids, estado_anterior_id, estado_nuevo_id)
+
+        # -- Las métricas del dashboard dependen del estado actual
+        invalidar_metricas_dashboard()
+    return len(solicitud_ids)
@@ -0,0 +1,135 @@
+# En: portal_retenciones/exportacion.py
+
+import csv
+from decimal import Decimal
+
+from django.db.models import DecimalField, F, Func, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from openpyxl import Workbook
+
+from portal_retenciones import catalogos
+from portal_retenciones.filtros import filtrar_solicitudes
+from portal_retenciones.models import Solicitud, SolicitudCircuito
+
+# -- Filas leídas por viaje a la base de datos: la memoria no depende del total exportado
+TAMANO_LOTE_EXPORTACION = 2000
+
+FORMATOS = ('csv', 'xlsx')
+
+CENTIMOS = Decimal('0.01')
+
+COLUMNAS = [
+    'ID',
+    'Fecha creación',
+    'Fecha solicitud baja',
+    'RUC',
+    'Razón social',
+    'Ejecutivo',
+    'Analista',
+    'Estado',
+    'Circuitos',
+    'Renta mensual total',
+]
+
+
+def _por_solicitud(expresion, output_field):
+    # -- Subconsulta correlacionada sobre el índice (solicitud, circuito) de SolicitudCircuito,
+    #    sin GROUP BY sobre todas las columnas exportadas
+    valores = (
+        SolicitudCircuito.objects.filter(solicitud_id=OuterRef('pk'))
+        .order_by()
+        .annotate(valor=expresion)
+        .values('valor')
+    )
+    return Subquery(valores, output_field=output_field)
+
+
+def solicitudes_exportacion(filtros):
+    """
+    Solicitudes filtradas como en la lista, con cantidad de circuitos y renta total
+    calculadas en la base de datos. Devuelve tuplas (values_list), no instancias.
+    """
+    solicitudes = filtrar_solicitudes(Solicitud.objects.all(), filtros)
+    return solicitudes.annotate(
+        total_circuitos=Coalesce(
+            _por_solicitud(Func(F('id'), function='COUNT'), IntegerField()), Value(0)
+        ),
+        renta_total=Coalesce(
+            _por_solicitud(Func(F('circuito__renta_mensual'), function='SUM'), DecimalField(max_digits=14, decimal_places=2)),
+            Value(0),
+            output_field=DecimalField(max_digits=14, decimal_places=2),
+        ),
+    ).order_by('-fecha_creacion', '-id').values_list(
+        'id',
+        'fecha_creacion',
+        'fecha_solicitud_baja',
+        'cliente__ruc',
+        'cliente__razon_social',
+        'ejecutivo__nombre',
+        'analista__nombre',
+        'estado_actual_id',
+        'total_circuitos',
+        'renta_total',
+    )
+
+
+def filas_exportacion(filtros):
+    """
+    Genera las filas a exportar (sin encabezado) leyendo la consulta por lotes
+    con iterator(): nunca hay más de TAMANO_LOTE_EXPORTACION filas en memoria.
+    """
+    estados = catalogos.obtener_catalogos().estados_por_id
+    for (solicitud_id, creacion, baja, ruc, razon_social, ejecutivo, analista,
+         estado_id, circuitos, renta) in solicitudes_exportacion(filtros).iterator(chunk_size=TAMANO_LOTE_EXPORTACION):
+        estado = estados.get(estado_id)
+        yield [
+            solicitud_id,
+            # -- Hora local sin zona: openpyxl no admite datetimes con tzinfo
+            timezone.localtime(creacion).replace(tzinfo=None),
+            baja,
+            ruc,
+            razon_social,
+            ejecutivo,
+            analista,
+            estado.nombre_estado if estado else '',
+            circuitos,
+            # -- Algunos motores devuelven la suma con más decimales de los que guarda renta_mensual
+            Decimal(renta).quantize(CENTIMOS),
+        ]
+
+
+class _Eco:
+    """Objeto tipo archivo para csv.writer: devuelve la línea en lugar de guardarla."""
+
+    def write(self, valor):
+        return valor
+
+
+def lineas_csv(filas):
+    """
+    Convierte las filas en líneas CSV, una por una (para StreamingHttpResponse o
+    un archivo). Empieza con BOM para que Excel reconozca los acentos en UTF-8.
+    """
+    escritor = csv.writer(_Eco())
+    yield '\ufeff' + escritor.writerow(COLUMNAS)
+    for fila in filas:
+        fila[1] = fila[1].strftime('%Y-%m-%d %H:%M')
+        yield escritor.writerow(fila)
+
+
+def escribir_xlsx(filas, destino):
+    """
+    Escribe las filas en un libro openpyxl en modo write_only, que vuelca cada
+    fila al disco en vez de mantener la hoja en memoria. 'destino' es una ruta
+    o un archivo binario.
+    """
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet('Solicitudes')
+    hoja.append(COLUMNAS)
+    cantidad = 0
+    for fila in filas:
+        hoja.append(fila)
+        cantidad += 1
+    libro.save(destino)
+    return cantidad
@@ -0,0 +1,91 @@
+# En: portal_retenciones/filtros.py
+
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+# -- Campos de fecha por los que se puede filtrar la lista de solicitudes
+CAMPOS_FECHA = {
+    'baja': 'fecha_solicitud_baja',
+    'creacion': 'fecha_creacion',
+}
+
+# -- Parámetros GET que NO son filtros (paginación)
+PARAMETROS_PAGINACION = ('despues', 'antes')
+
+
+def _leer_fecha(valor):
+    try:
+        return datetime.strptime(valor, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return None
+
+
+def _leer_id(valor):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def leer_filtros(params):
+    """
+    Normaliza los filtros de la lista de solicitudes a partir de request.GET.
+    Los valores inválidos se ignoran (equivalen a "sin filtro").
+    """
+    campo_fecha = params.get('campo_fecha')
+    return {
+        'campo_fecha': campo_fecha if campo_fecha in CAMPOS_FECHA else 'baja',
+        'fecha_desde': _leer_fecha(params.get('fecha_desde')),
+        'fecha_hasta': _leer_fecha(params.get('fecha_hasta')),
+        'estado': _leer_id(params.get('estado')),
+        'ejecutivo': _leer_id(params.get('ejecutivo')),
+        'cliente': (params.get('cliente') or '').strip(),
+    }
+
+
+def filtrar_solicitudes(queryset, filtros):
+    """Aplica en la base de datos los filtros devueltos por leer_filtros()."""
+    campo = CAMPOS_FECHA[filtros['campo_fecha']]
+    desde = filtros['fecha_desde']
+    hasta = filtros['fecha_hasta']
+
+    if campo == 'fecha_creacion':
+        # -- DateTimeField: rango semiabierto [desde 00:00, hasta+1 00:00) para usar el índice
+        if desde:
+            queryset = queryset.filter(
+                fecha_creacion__gte=timezone.make_aware(datetime.combine(desde, time.min))
+            )
+        if hasta:
+            queryset = queryset.filter(
+                fecha_creacion__lt=timezone.make_aware(datetime.combine(hasta + timedelta(days=1), time.min))
+            )
+    else:
+        if desde:
+            queryset = queryset.filter(fecha_solicitud_baja__gte=desde)
+        if hasta:
+            queryset = queryset.filter(fecha_solicitud_baja__lte=hasta)
+
+    if filtros['estado']:
+        queryset = queryset.filter(estado_actual_id=filtros['estado'])
+
+    if filtros['ejecutivo']:
+        queryset = queryset.filter(ejecutivo_id=filtros['ejecutivo'])
+
+    cliente = filtros['cliente']
+    if cliente:
+        # -- Un texto numérico se interpreta como prefijo de RUC; si no, como razón social
+        if cliente.isdigit():
+            queryset = queryset.filter(cliente__ruc__startswith=cliente)
+        else:
+            queryset = queryset.filter(cliente__razon_social__icontains=cliente)
+
+    return queryset
+
+
+def querystring_filtros(params):
+    """Devuelve los parámetros GET actuales sin los de paginación (para armar enlaces)."""
+    params = params.copy()
+    for clave in PARAMETROS_PAGINACION:
+        params.pop(clave, None)
+    return params.urlencode()
@@ -0,0 +1,137 @@
+# En: portal_retenciones/linea_tiempo.py
+
+import base64
+import binascii
+from datetime import datetime
+
+from django.db.models import F, Func, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from portal_retenciones import catalogos
+from portal_retenciones.models import Comentario, HistorialAsignacion, HistorialEstado
+
+TAMANO_PAGINA_LINEA = 20
+TAMANO_MAXIMO_LINEA = 100
+
+# -- Fuentes de la línea de tiempo: (tipo, modelo, campo de fecha). La posición
+#    desempata eventos con la misma fecha en el orden (fecha DESC, tipo, id DESC).
+FUENTES = [
+    ('comentario', Comentario, 'fecha_comentario'),
+    ('estado', HistorialEstado, 'fecha_cambio'),
+    ('asignacion', HistorialAsignacion, 'fecha_cambio'),
+]
+RANGO = {tipo: posicion for posicion, (tipo, _, _) in enumerate(FUENTES)}
+
+
+def codificar_cursor_evento(evento):
+    """Token opaco con la posición (fecha, tipo, id) del último evento entregado."""
+    valor = f"{evento['fecha'].isoformat()}|{evento['tipo']}|{evento['id']}"
+    return base64.urlsafe_b64encode(valor.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor_evento(cursor):
+    """Devuelve la tupla (fecha, tipo, id) de un cursor, o None si no es válido."""
+    if not cursor:
+        return None
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        fecha, tipo, pk = base64.urlsafe_b64decode(cursor + relleno).decode().split('|')
+        if tipo not in RANGO:
+            return None
+        return datetime.fromisoformat(fecha), tipo, int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+def _despues_de(tipo, campo, cursor):
+    """
+    Filtro de las filas de 'tipo' que van después del cursor en el orden
+    (fecha DESC, rango ASC, id DESC). "fecha <= x" permite el rango sobre el
+    índice (solicitud, fecha, id) de cada tabla.
+    """
+    fecha, tipo_cursor, pk = cursor
+    if RANGO[tipo] > RANGO[tipo_cursor]:
+        return Q(**{f'{campo}__lte': fecha})
+    if RANGO[tipo] < RANGO[tipo_cursor]:
+        return Q(**{f'{campo}__lt': fecha})
+    return Q(**{f'{campo}__lte': fecha}) & (Q(**{f'{campo}__lt': fecha}) | Q(id__lt=pk))
+
+
+def _eventos(tipo, solicitud_id, cursor, limite):
+    """Hasta 'limite' eventos de un tipo, en una consulta que recorre el índice."""
+    _, modelo, campo = FUENTES[RANGO[tipo]]
+    filas = modelo.objects.filter(solicitud_id=solicitud_id)
+    if cursor:
+        filas = filas.filter(_despues_de(tipo, campo, cursor))
+    filas = filas.order_by(f'-{campo}', '-id')
+
+    if tipo == 'comentario':
+        filas = filas.values('id', 'usuario', 'comentario', fecha=F(campo))
+    elif tipo == 'estado':
+        filas = filas.values('id', 'estado_anterior_id', 'estado_nuevo_id', fecha=F(campo), usuario=F('usuario_cambio'))
+    else:
+        # -- Los nombres de los ejecutivos vienen en la misma consulta (JOIN), no uno por fila
+        filas = filas.values(
+            'id', 'motivo', 'ejecutivo_anterior__nombre', 'ejecutivo_nuevo__nombre', fecha=F(campo)
+        )
+
+    eventos = [{'tipo': tipo, **fila} for fila in filas[:limite]]
+    if tipo == 'asignacion':
+        for evento in eventos:
+            evento['ejecutivo_anterior'] = evento.pop('ejecutivo_anterior__nombre')
+            evento['ejecutivo_nuevo'] = evento.pop('ejecutivo_nuevo__nombre')
+    elif tipo == 'estado':
+        # -- Nombres de estado desde el catálogo en memoria
+        for evento in eventos:
+            anterior = catalogos.estado_por_id(evento.pop('estado_anterior_id'))
+            nuevo = catalogos.estado_por_id(evento.pop('estado_nuevo_id'))
+            evento['estado_anterior'] = anterior.nombre_estado if anterior else None
+            evento['estado_nuevo'] = nuevo.nombre_estado if nuevo else None
+    return eventos
+
+
+def _orden(evento):
+    return (-evento['fecha'].timestamp(), RANGO[evento['tipo']], -evento['id'])
+
+
+def pagina_linea_tiempo(solicitud_id, cursor=None, tamano=TAMANO_PAGINA_LINEA):
+    """
+    Una página de la línea de tiempo de la solicitud (comentarios, cambios de
+    estado y reasignaciones mezclados, del más reciente al más antiguo).
+    Cada fuente aporta como mucho tamano + 1 filas desde el cursor, así que el
+    costo no depende de cuántos eventos acumule la solicitud.
+    Devuelve (eventos, cursor de la siguiente página o None).
+    """
+    eventos = []
+    for tipo in RANGO:
+        eventos.extend(_eventos(tipo, solicitud_id, cursor, tamano + 1))
+    eventos.sort(key=_orden)
+
+    if len(eventos) > tamano:
+        eventos = eventos[:tamano]
+        return eventos, codificar_cursor_evento(eventos[-1])
+    return eventos, None
+
+
+def _contar(modelo):
+    # -- COUNT(*) sin GROUP BY: la subconsulta siempre devuelve una fila
+    por_solicitud = (
+        modelo.objects.filter(solicitud_id=OuterRef('pk'))
+        .order_by()
+        .annotate(total=Func(F('id'), function='COUNT'))
+        .values('total')
+    )
+    return Coalesce(Subquery(por_solicitud, output_field=IntegerField()), Value(0))
+
+
+def con_totales_linea_tiempo(solicitudes):
+    """
+    Agrega al queryset de Solicitud los totales de comentarios, cambios de
+    estado y reasignaciones como subconsultas COUNT sobre los índices, en la
+    misma consulta que trae la solicitud (sin cargar las filas).
+    """
+    return solicitudes.annotate(
+        total_comentarios=_contar(Comentario),
+        total_cambios_estado=_contar(HistorialEstado),
+        total_reasignaciones=_contar(HistorialAsignacion),
+    )
@@ -0,0 +1,153 @@
+# En: portal_retenciones/management/commands/benchmark_migracion.py
+
+import multiprocessing
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from io import StringIO
+from pathlib import Path
+
+import django
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.utils import load_backend
+
+from portal_retenciones.management.commands.migrar_con_pandas import Command as MigrarConPandas
+from portal_retenciones.management.commands.migrar_con_pandas import TAMANO_BLOQUE, memoria_pico_mb
+from portal_retenciones.origen import datos_sinteticos, escribir_origen_sqlite
+
+TAMANOS = [10000, 100000, 1000000]
+
+# -- Cachés del proceso que mide: sus invalidaciones no deben llegar a la caché del portal
+CACHES_MEDICION = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'versiones': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+}
+
+
+def medir_en_proceso(base, argumentos):
+    """
+    Corre migrar_con_pandas contra la base SQLite 'base' dentro de un proceso nuevo
+    (spawn): ru_maxrss es entonces el pico de esta corrida, sin el generador de datos
+    ni las corridas anteriores. Devuelve un dict serializable con los resultados.
+    """
+    from django.test.utils import override_settings
+
+    # -- Proceso recién creado: la conexión aún no está abierta
+    connections[DEFAULT_DB_ALIAS].settings_dict['NAME'] = base
+    comando = MigrarConPandas(stdout=StringIO(), stderr=StringIO())
+    with override_settings(CACHES=CACHES_MEDICION):
+        inicio = time.perf_counter()
+        call_command(comando, *argumentos)
+        total = time.perf_counter() - inicio
+    connections[DEFAULT_DB_ALIAS].close()
+    filas = sum(comando.filas.values())
+    return {
+        'total': total,
+        'filas': filas,
+        'filas_por_segundo': filas / total if total else 0,
+        'memoria_pico_mb': memoria_pico_mb(),
+        'tiempos': comando.tiempos,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide migrar_con_pandas contra orígenes sintéticos de 10k/100k/1M circuitos: filas por segundo, '
+        'memoria pico y tiempo por fase. Cada corrida se mide en un proceso nuevo, sobre una base '
+        'SQLite temporal recién migrada y con commits reales; la base de datos del portal no se toca.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tamanos', type=int, nargs='+', default=TAMANOS,
+            help='Cantidades de circuitos a medir (por defecto 10000 100000 1000000).',
+        )
+        parser.add_argument('--workers', type=int, default=1, help='Se pasa a migrar_con_pandas --workers.')
+        parser.add_argument('--chunksize', type=int, default=TAMANO_BLOQUE, help='Se pasa a migrar_con_pandas --chunksize.')
+        parser.add_argument(
+            '--incremental', action='store_true',
+            help='Mide también una sincronización incremental sin cambios después de la carga completa.',
+        )
+        parser.add_argument(
+            '--directorio', default=str(Path(tempfile.gettempdir()) / 'benchmark_migracion'),
+            help='Dónde se guardan (y reutilizan) los orígenes sintéticos y la base temporal.',
+        )
+
+    @contextmanager
+    def base_temporal(self, ruta):
+        """
+        Durante el bloque, el alias 'default' apunta a la base SQLite 'ruta' en este
+        hilo. La conexión del portal queda intacta y se restaura al final.
+        """
+        original = connections[DEFAULT_DB_ALIAS]
+        if original.vendor != 'sqlite':
+            raise CommandError('El benchmark usa una base SQLite temporal; la base por defecto debe ser SQLite.')
+        ajustes = {**original.settings_dict, 'NAME': str(ruta)}
+        temporal = load_backend(ajustes['ENGINE']).DatabaseWrapper(ajustes, DEFAULT_DB_ALIAS)
+        connections[DEFAULT_DB_ALIAS] = temporal
+        try:
+            yield
+        finally:
+            temporal.close()
+            connections[DEFAULT_DB_ALIAS] = original
+
+    def handle(self, *args, **kwargs):
+        directorio = Path(kwargs['directorio'])
+        directorio.mkdir(parents=True, exist_ok=True)
+
+        # -- Esquema migrado una vez; cada tamaño parte de una copia vacía
+        plantilla = directorio / 'destino_plantilla.sqlite3'
+        plantilla.unlink(missing_ok=True)
+        with self.base_temporal(plantilla):
+            call_command('migrate', verbosity=0, stdout=StringIO())
+        destino = directorio / 'destino.sqlite3'
+
+        resultados = []
+        for tamano in sorted(kwargs['tamanos']):
+            origen = directorio / f'origen_{tamano}.sqlite3'
+            if not origen.exists():
+                self.stdout.write(f'Generando origen sintético de {tamano} circuitos...')
+                escribir_origen_sqlite(origen, *datos_sinteticos(max(1, tamano // 10), tamano, huerfanos=0.01))
+
+            opciones = ['--origen', str(origen), '--workers', str(kwargs['workers']), '--chunksize', str(kwargs['chunksize'])]
+            corridas = [('completa', opciones)]
+            if kwargs['incremental']:
+                corridas.append(('incremental', opciones + ['--incremental']))
+
+            self.stdout.write(f'--- {tamano} circuitos ---')
+            shutil.copyfile(plantilla, destino)
+            for modo, argumentos in corridas:
+                resultado = self.medir(destino, argumentos)
+                resultado.update(circuitos=tamano, modo=modo)
+                resultados.append(resultado)
+                self.escribir_detalle(resultado)
+
+        plantilla.unlink()
+        destino.unlink(missing_ok=True)
+
+        self.stdout.write(self.style.SUCCESS('--- Resumen ---'))
+        self.stdout.write(f"{'circuitos':>10} {'modo':>12} {'total (s)':>10} {'filas/s':>10} {'RSS pico (MB)':>14}")
+        for resultado in resultados:
+            self.stdout.write(
+                f"{resultado['circuitos']:>10} {resultado['modo']:>12} {resultado['total']:>10.2f} "
+                f"{resultado['filas_por_segundo']:>10.0f} {resultado['memoria_pico_mb']:>14.1f}"
+            )
+
+    def medir(self, base, argumentos):
+        # -- Un proceso por corrida; hereda DJANGO_SETTINGS_MODULE (incluido --settings) y
+        #    configura Django antes de recibir la tarea, que importa los modelos
+        contexto = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=1, mp_context=contexto, initializer=django.setup) as proceso:
+            return proceso.submit(medir_en_proceso, str(base), argumentos).result()
+
+    def escribir_detalle(self, resultado):
+        self.stdout.write(
+            f"  {resultado['modo']}: {resultado['filas']} filas en {resultado['total']:.2f} s "
+            f"({resultado['filas_por_segundo']:.0f} filas/s, RSS pico {resultado['memoria_pico_mb']:.1f} MB)"
+        )
+        for fase, segundos in resultado['tiempos'].items():
+            self.stdout.write(f'    {fase}: {segundos:.2f}')
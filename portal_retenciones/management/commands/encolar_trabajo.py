@@ -0,0 +1,32 @@
+# En: portal_retenciones/management/commands/encolar_trabajo.py
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from portal_retenciones.trabajos import TAREAS, TrabajoInvalido, encolar
+
+
+class Command(BaseCommand):
+    help = (
+        'Encola un trabajo para el worker (procesar_trabajos), ej. la sincronización nocturna desde cron: '
+        'encolar_trabajo migrar_con_pandas --parametros \'{"incremental": true}\''
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('tipo', choices=sorted(TAREAS), help='Tipo de trabajo.')
+        parser.add_argument('--parametros', default='{}', help='Parámetros de la tarea en JSON.')
+        parser.add_argument('--max-intentos', type=int, default=3)
+
+    def handle(self, *args, **options):
+        try:
+            parametros = json.loads(options['parametros'])
+        except ValueError as e:
+            raise CommandError(f'--parametros no es un JSON válido: {e}')
+        if not isinstance(parametros, dict):
+            raise CommandError('--parametros debe ser un objeto JSON.')
+        try:
+            trabajo = encolar(options['tipo'], parametros, max_intentos=options['max_intentos'])
+        except TrabajoInvalido as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f'Trabajo #{trabajo.id} ({trabajo.tipo}) encolado.'))
@@ -0,0 +1,57 @@
+# En: portal_retenciones/management/commands/exportar_solicitudes.py
+
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from portal_retenciones.exportacion import FORMATOS, escribir_xlsx, filas_exportacion, lineas_csv
+from portal_retenciones.filtros import CAMPOS_FECHA, leer_filtros
+
+
+class Command(BaseCommand):
+    help = (
+        'Exporta las solicitudes (cliente, ejecutivo, analista, estado, circuitos y renta total) '
+        'a CSV o Excel con los mismos filtros de la lista, leyendo por lotes (memoria constante).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('salida', help='Archivo de salida (.csv o .xlsx).')
+        parser.add_argument('--formato', choices=FORMATOS, help='Por defecto se toma de la extensión de la salida.')
+        parser.add_argument('--estado', type=int, help='Id del estado.')
+        parser.add_argument('--ejecutivo', type=int, help='Id del ejecutivo.')
+        parser.add_argument('--cliente', help='Prefijo de RUC o parte de la razón social.')
+        parser.add_argument('--campo-fecha', choices=sorted(CAMPOS_FECHA), default='baja')
+        parser.add_argument('--desde', help='Fecha inicial (AAAA-MM-DD).')
+        parser.add_argument('--hasta', help='Fecha final (AAAA-MM-DD).')
+
+    def handle(self, *args, **options):
+        salida = options['salida']
+        formato = options['formato'] or os.path.splitext(salida)[1].lstrip('.').lower()
+        if formato not in FORMATOS:
+            raise CommandError(f'Formato no soportado: "{formato}". Use --formato {" o ".join(FORMATOS)}.')
+
+        # -- Mismos parámetros (y la misma validación) que el GET de la lista de solicitudes
+        filtros = leer_filtros({
+            'campo_fecha': options['campo_fecha'],
+            'fecha_desde': options['desde'],
+            'fecha_hasta': options['hasta'],
+            'estado': options['estado'],
+            'ejecutivo': options['ejecutivo'],
+            'cliente': options['cliente'],
+        })
+
+        inicio = time.perf_counter()
+        if formato == 'csv':
+            cantidad = -1
+            with open(salida, 'w', encoding='utf-8', newline='') as archivo:
+                for linea in lineas_csv(filas_exportacion(filtros)):
+                    archivo.write(linea)
+                    cantidad += 1
+        else:
+            cantidad = escribir_xlsx(filas_exportacion(filtros), salida)
+        segundos = time.perf_counter() - inicio
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{cantidad} solicitudes exportadas a {salida} en {segundos:.2f} s.'
+        ))
@@ -0,0 +1,48 @@
+# En: portal_retenciones/management/commands/generar_origen_sintetico.py
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from portal_retenciones.origen import datos_sinteticos, escribir_origen_parquet, escribir_origen_sqlite
+
+
+class Command(BaseCommand):
+    help = (
+        'Genera un origen sintético con las tablas CLIENTES y CIRCUITOS de SQL Server '
+        '(archivo SQLite o directorio Parquet) para usar con migrar_con_pandas --origen.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('salida', help='Archivo .sqlite3 a crear, o directorio si --formato parquet.')
+        parser.add_argument('--circuitos', type=int, default=100000, help='Cantidad de circuitos (por defecto 100000).')
+        parser.add_argument(
+            '--clientes', type=int, help='Cantidad de clientes (por defecto un cliente cada 10 circuitos).'
+        )
+        parser.add_argument(
+            '--huerfanos', type=float, default=0.0,
+            help='Fracción de circuitos con un cliente_id inexistente (por defecto 0).',
+        )
+        parser.add_argument('--semilla', type=int, default=0, help='Semilla del generador (por defecto 0).')
+        parser.add_argument('--formato', choices=['sqlite', 'parquet'], default='sqlite')
+
+    def handle(self, *args, **kwargs):
+        circuitos = kwargs['circuitos']
+        clientes = kwargs['clientes'] or max(1, circuitos // 10)
+        inicio = time.perf_counter()
+
+        df_clientes, df_circuitos = datos_sinteticos(
+            clientes, circuitos, semilla=kwargs['semilla'], huerfanos=kwargs['huerfanos']
+        )
+        try:
+            if kwargs['formato'] == 'parquet':
+                destino = escribir_origen_parquet(kwargs['salida'], df_clientes, df_circuitos)
+            else:
+                destino = escribir_origen_sqlite(kwargs['salida'], df_clientes, df_circuitos)
+        except ValueError as e:
+            raise CommandError(str(e)) from e
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Origen sintético creado en {destino}: {clientes} clientes y {circuitos} circuitos '
+            f'({time.perf_counter() - inicio:.1f} s).'
+        ))
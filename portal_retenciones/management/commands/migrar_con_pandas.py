@@ -1,8 +1,23 @@
 import pandas as pd
+import queue
+import resource
+import threading
+import time
 import urllib
-from sqlalchemy import create_engine
-from django.core.management.base import BaseCommand
-from portal_retenciones.models import Cliente, Circuito, Solicitud
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import create_engine, text
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, F, IntegerField, Max
+from django.db.models.functions import Cast
+from django.utils import timezone
+from portal_retenciones.origen import crear_motor_origen
+from portal_retenciones.models import (
+    Cliente, Circuito, CircuitoStaging, ClaveOrigenStaging, ClienteStaging, MarcaSincronizacion
+)
+from portal_retenciones.busqueda import invalidar_indice_clientes
+from portal_retenciones.circuitos import invalidar_circuitos
+from portal_retenciones.signals import carga_masiva
 import os
 from dotenv import load_dotenv
 
@@ -18,6 +33,7 @@ QUERY_CLIENTES = "SELECT ruc, razon_social, fecha_registro, estado FROM RETENCIO
 
 QUERY_CIRCUITOS = """
     SELECT
+        c.circuito_id AS id_origen,
         c.nombre_circuito,
         c.tipo_servicio,
         c.estado,
@@ -26,81 +42,746 @@ QUERY_CIRCUITOS = """
         p.ruc
     FROM
         RETENCION.CIRCUITOS c
-    INNER JOIN
+    LEFT JOIN
         RETENCION.CLIENTES p ON c.cliente_id = p.cliente_id
 """
 
+# -- Columnas de la marca incremental. RETENCION.CLIENTES y CIRCUITOS no tienen fecha de
+#    modificación ni rowversion: el modo incremental solo trae filas nuevas y los cambios en
+#    filas ya migradas los aplica la migración completa (que no borra datos). Si el origen
+#    agrega esa columna, basta con apuntar estas constantes a ella.
+COLUMNA_MARCA_CLIENTES = 'fecha_registro'
+COLUMNA_MARCA_CIRCUITOS = 'fecha_creacion'
+
+# -- Modo incremental: solo las filas con fecha >= marca de la última corrida.
+#    Con >= se releen las filas de la fecha límite; el upsert es idempotente.
+QUERY_CLIENTES_DESDE = QUERY_CLIENTES + f" WHERE {COLUMNA_MARCA_CLIENTES} >= :desde"
+QUERY_CIRCUITOS_DESDE = QUERY_CIRCUITOS + f" WHERE c.{COLUMNA_MARCA_CIRCUITOS} >= :desde"
+
+# -- Extracción en paralelo: CIRCUITOS se reparte en rangos de cliente_id
+QUERY_RANGO_CIRCUITOS = "SELECT MIN(cliente_id) AS minimo, MAX(cliente_id) AS maximo FROM RETENCION.CIRCUITOS"
+QUERY_CIRCUITOS_RANGO = QUERY_CIRCUITOS + " WHERE c.cliente_id BETWEEN :desde_id AND :hasta_id"
+QUERY_CIRCUITOS_SIN_CLIENTE = QUERY_CIRCUITOS + " WHERE c.cliente_id IS NULL"
+
+# -- Solo las claves, para detectar filas que desaparecieron del origen. Un circuito
+#    huérfano (sin cliente en el origen) no se migra, así que cuenta como ausente.
+QUERY_CLAVES_CLIENTES = "SELECT ruc FROM RETENCION.CLIENTES"
+QUERY_CLAVES_CIRCUITOS = """
+    SELECT c.circuito_id AS id_origen
+    FROM RETENCION.CIRCUITOS c
+    INNER JOIN RETENCION.CLIENTES p ON c.cliente_id = p.cliente_id
+"""
+
+# -- Claves de MarcaSincronizacion (una por tabla de origen)
+MARCA_CLIENTES = 'CLIENTES'
+MARCA_CIRCUITOS = 'CIRCUITOS'
+
+ESTADO_INACTIVO = 'Inactivo'
+
+# -- Filas por bloque leídas del servidor (y escritas en SQLite) en cada iteración
+TAMANO_BLOQUE = 5000
+
+# -- Filas por sentencia en bulk_create / bulk_update
+TAMANO_LOTE = 1000
+
+# -- Conexiones simultáneas al origen durante la extracción
+WORKERS = 1
+
+CAMPOS_CLIENTE_ACTUALIZABLES = ['razon_social', 'estado']
+CAMPOS_CIRCUITO_ACTUALIZABLES = ['cliente_id', 'nombre_circuito', 'tipo_servicio', 'estado', 'renta_mensual']
+
+
+def leer_por_bloques(engine, query, chunksize, params=None):
+    """
+    Lee la consulta en DataFrames de 'chunksize' filas con un cursor del lado
+    del servidor (stream_results), de modo que nunca se carga la tabla completa.
+    """
+    with engine.connect().execution_options(stream_results=True) as conexion:
+        for bloque in pd.read_sql(text(query), conexion, params=params, chunksize=chunksize):
+            yield bloque
+
+
+def particiones_circuitos(engine, partes):
+    """
+    Reparte RETENCION.CIRCUITOS en 'partes' rangos contiguos de cliente_id.
+    Devuelve la lista de (query, params); los circuitos sin cliente_id van aparte.
+    """
+    if partes <= 1:
+        return [(QUERY_CIRCUITOS, None)]
+
+    rango = pd.read_sql(text(QUERY_RANGO_CIRCUITOS), engine).iloc[0]
+    if pd.isna(rango['minimo']):
+        return [(QUERY_CIRCUITOS, None)]
+
+    minimo, maximo = int(rango['minimo']), int(rango['maximo'])
+    paso = max(1, -(-(maximo - minimo + 1) // partes))
+    particiones = [
+        (QUERY_CIRCUITOS_RANGO, {'desde_id': desde, 'hasta_id': min(desde + paso - 1, maximo)})
+        for desde in range(minimo, maximo + 1, paso)
+    ]
+    particiones.append((QUERY_CIRCUITOS_SIN_CLIENTE, None))
+    return particiones
+
+
+def extraer_en_paralelo(engine, tareas, chunksize, workers, tiempos):
+    """
+    Ejecuta las tareas (nombre, query, params) en un pool de 'workers' hilos y entrega
+    los bloques (nombre, DataFrame) a medida que llegan, para un único escritor.
+    La cola es acotada: si el escritor se atrasa, los lectores esperan (memoria estable).
+    En 'tiempos' deja los segundos que tardó cada tarea.
+    """
+    cola = queue.Queue(maxsize=workers * 2)
+    cancelado = threading.Event()
+    fin = object()
+
+    def encolar(item):
+        while not cancelado.is_set():
+            try:
+                cola.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def extraer(nombre, query, params):
+        inicio = time.perf_counter()
+        try:
+            for bloque in leer_por_bloques(engine, query, chunksize, params):
+                if not encolar((nombre, bloque)):
+                    return
+        except Exception as e:
+            encolar((fin, e))
+            return
+        finally:
+            tiempos[nombre] = time.perf_counter() - inicio
+        encolar((fin, None))
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='extraccion') as pool:
+        for tarea in tareas:
+            pool.submit(extraer, *tarea)
+        try:
+            pendientes = len(tareas)
+            while pendientes:
+                nombre, bloque = cola.get()
+                if nombre is fin:
+                    if bloque is not None:
+                        raise bloque
+                    pendientes -= 1
+                    continue
+                yield nombre, bloque
+        finally:
+            # -- Si el escritor falla o deja de leer, los lectores abandonan
+            cancelado.set()
+
+
+def sin_nulos(df):
+    """Reemplaza NaN/NaT por None para que el ORM guarde NULL."""
+    return df.astype(object).where(df.notna(), None)
+
+
+def normalizar_clientes(df):
+    """RUC como texto sin espacios, sin vacíos ni duplicados (gana la última fila)."""
+    df = df[df['ruc'].notna()].copy()
+    df['ruc'] = df['ruc'].astype(str).str.strip()
+    df['razon_social'] = df['razon_social'].astype(str).str.strip()
+    df = df[df['ruc'] != '']
+    return df.drop_duplicates(subset='ruc', keep='last')
+
+
+def filas_cambiadas(df, campos):
+    """Filas ya existentes (con 'id') en las que algún campo difiere de su columna '<campo>_actual'."""
+    cambio = pd.Series(False, index=df.index)
+    for campo in campos:
+        nuevo, actual = df[campo], df[f'{campo}_actual']
+        cambio |= ~((nuevo == actual) | (nuevo.isna() & actual.isna()))
+    return df[df['id'].notna() & cambio]
+
+
+def upsert_clientes(df):
+    """
+    Inserta los RUC nuevos y actualiza los que cambiaron, con una sola consulta
+    para comparar contra los existentes. Devuelve (creados, actualizados).
+    """
+    df = normalizar_clientes(df)
+    if df.empty:
+        return 0, 0
+
+    existentes = Cliente.objects.filter(ruc__in=df['ruc'].tolist()).values_list(
+        'ruc', 'id', *CAMPOS_CLIENTE_ACTUALIZABLES
+    )
+    existentes = pd.DataFrame(
+        list(existentes),
+        columns=['ruc', 'id', *(f'{campo}_actual' for campo in CAMPOS_CLIENTE_ACTUALIZABLES)],
+    )
+    df = df.merge(existentes, on='ruc', how='left')
+    cambiados = sin_nulos(filas_cambiadas(df, CAMPOS_CLIENTE_ACTUALIZABLES))
+    df = sin_nulos(df)
+
+    nuevos = df[df['id'].isna()]
+    Cliente.objects.bulk_create(
+        (
+            Cliente(ruc=fila.ruc, razon_social=fila.razon_social, estado=fila.estado, fecha_registro=fila.fecha_registro)
+            for fila in nuevos.itertuples(index=False)
+        ),
+        batch_size=TAMANO_LOTE,
+    )
+
+    Cliente.objects.bulk_update(
+        [
+            Cliente(id=int(fila.id), razon_social=fila.razon_social, estado=fila.estado)
+            for fila in cambiados.itertuples(index=False)
+        ],
+        CAMPOS_CLIENTE_ACTUALIZABLES,
+        batch_size=TAMANO_LOTE,
+    )
+    return len(nuevos), len(cambiados)
+
+
+def mapa_ruc_a_id():
+    """Mapa ruc -> cliente_id como DataFrame, obtenido con un único values_list."""
+    return pd.DataFrame(list(Cliente.objects.values_list('ruc', 'id')), columns=['ruc', 'cliente_id'])
+
+
+def circuitos_con_cliente(df, mapa):
+    """
+    Asigna cliente_id a cada circuito con un merge por RUC (sin recorrer fila a fila).
+    Devuelve (circuitos con cliente, cantidad de circuitos sin padre).
+    """
+    leidos = len(df)
+    df = df[df['ruc'].notna()].copy()
+    df['ruc'] = df['ruc'].astype(str).str.strip()
+    df = df.merge(mapa, on='ruc', how='inner').astype({'cliente_id': 'int64'})
+    return df, leidos - len(df)
+
+
+def upsert_circuitos(df):
+    """
+    Inserta o actualiza circuitos identificados por id_origen (circuito_id en SQL Server),
+    comparando contra los existentes con una sola consulta. Devuelve (creados, actualizados).
+    """
+    if df.empty:
+        return 0, 0
+
+    df = df.drop_duplicates(subset='id_origen', keep='last').astype({'id_origen': 'int64'})
+    df['renta_mensual'] = pd.to_numeric(df['renta_mensual'], errors='coerce').round(2)
+    existentes = Circuito.objects.filter(id_origen__in=df['id_origen'].tolist()).values_list(
+        'id_origen', 'id', *CAMPOS_CIRCUITO_ACTUALIZABLES
+    )
+    existentes = pd.DataFrame(
+        list(existentes),
+        columns=['id_origen', 'id', *(f'{campo}_actual' for campo in CAMPOS_CIRCUITO_ACTUALIZABLES)],
+    )
+    existentes['renta_mensual_actual'] = existentes['renta_mensual_actual'].astype(float)
+    df = df.merge(existentes, on='id_origen', how='left')
+    cambiados = sin_nulos(filas_cambiadas(df, CAMPOS_CIRCUITO_ACTUALIZABLES))
+    df = sin_nulos(df)
+
+    def circuito(fila, **extra):
+        return Circuito(
+            cliente_id=fila.cliente_id,
+            nombre_circuito=fila.nombre_circuito,
+            tipo_servicio=fila.tipo_servicio,
+            estado=fila.estado,
+            renta_mensual=fila.renta_mensual,
+            **extra
+        )
+
+    nuevos = df[df['id'].isna()]
+    Circuito.objects.bulk_create(
+        (
+            circuito(fila, id_origen=fila.id_origen, fecha_creacion=fila.fecha_creacion)
+            for fila in nuevos.itertuples(index=False)
+        ),
+        batch_size=TAMANO_LOTE,
+    )
+
+    Circuito.objects.bulk_update(
+        [circuito(fila, id=int(fila.id)) for fila in cambiados.itertuples(index=False)],
+        CAMPOS_CIRCUITO_ACTUALIZABLES,
+        batch_size=TAMANO_LOTE,
+    )
+    return len(nuevos), len(cambiados)
+
+
+def fecha_maxima(df, columna, actual=None):
+    """Mayor fecha de 'columna' en el bloque, o 'actual' si es mayor (datetime con zona)."""
+    maxima = pd.to_datetime(df[columna], errors='coerce').max()
+    if pd.isna(maxima):
+        return actual
+    maxima = maxima.to_pydatetime()
+    if timezone.is_naive(maxima):
+        maxima = timezone.make_aware(maxima)
+    return maxima if actual is None else max(actual, maxima)
+
+
+def leer_marca(tabla):
+    """Marca guardada para la tabla, sin zona horaria como las fechas del origen (o None)."""
+    marca = MarcaSincronizacion.objects.filter(tabla=tabla).values_list('ultima_fecha', flat=True).first()
+    return timezone.make_naive(marca) if marca else None
+
+
+def guardar_marca(tabla, fecha):
+    if fecha is not None:
+        MarcaSincronizacion.objects.update_or_create(tabla=tabla, defaults={'ultima_fecha': fecha})
+
+
+def cargar_claves(engine, query, columna, tabla, chunksize):
+    """
+    Copia por bloques todas las claves de una tabla de origen a ClaveOrigenStaging
+    (como texto), para compararlas en SQL sin cargarlas en memoria.
+    """
+    ClaveOrigenStaging.objects.filter(tabla=tabla).delete()
+    for bloque in leer_por_bloques(engine, query, chunksize):
+        claves = bloque[columna].dropna()
+        if pd.api.types.is_numeric_dtype(claves):
+            claves = claves.astype('int64')
+        ClaveOrigenStaging.objects.bulk_create(
+            (ClaveOrigenStaging(tabla=tabla, clave=clave) for clave in claves.astype(str).str.strip()),
+            batch_size=TAMANO_LOTE,
+        )
+
+
+def claves_origen(tabla, entero=False):
+    """Subconsulta con las claves cargadas de la tabla (convertidas a entero si la columna local lo es)."""
+    claves = ClaveOrigenStaging.objects.filter(tabla=tabla)
+    if entero:
+        return claves.values(valor=Cast('clave', IntegerField()))
+    return claves.values(valor=F('clave'))
+
+
+def desactivar_ausentes(queryset, columna, claves):
+    """
+    Marca como inactivas, con un solo UPDATE ... NOT IN (subconsulta), las filas locales
+    cuya clave no está en 'claves' (staging del origen). No se eliminan porque pueden
+    estar referenciadas por solicitudes. Devuelve la cantidad desactivada.
+    """
+    return (
+        queryset.exclude(estado=ESTADO_INACTIVO)
+        .exclude(**{f'{columna}__in': claves})
+        .update(estado=ESTADO_INACTIVO)
+    )
+
+
+# -----------------------------------------------------------------
+# --- MIGRACIÓN COMPLETA VÍA TABLAS STAGING ---
+# -----------------------------------------------------------------
+
+def fechas_con_zona(serie):
+    """Convierte la columna a datetime con zona horaria (el origen guarda fechas sin zona)."""
+    fechas = pd.to_datetime(serie, errors='coerce')
+    if fechas.dt.tz is None:
+        fechas = fechas.dt.tz_localize(timezone.get_current_timezone())
+    return fechas
+
+
+def vaciar_staging():
+    CircuitoStaging.objects.all().delete()
+    ClienteStaging.objects.all().delete()
+
+
+def cargar_clientes_staging(df):
+    """Copia un bloque de RETENCION.CLIENTES tal cual (solo recorta espacios del RUC)."""
+    df = df.copy()
+    df['ruc'] = df['ruc'].astype(str).str.strip().where(df['ruc'].notna(), '')
+    df['fecha_registro'] = fechas_con_zona(df['fecha_registro'])
+    ClienteStaging.objects.bulk_create(
+        (
+            ClienteStaging(ruc=fila.ruc, razon_social=fila.razon_social, fecha_registro=fila.fecha_registro, estado=fila.estado)
+            for fila in sin_nulos(df).itertuples(index=False)
+        ),
+        batch_size=TAMANO_LOTE,
+    )
+
+
+def cargar_circuitos_staging(df):
+    """Copia un bloque de RETENCION.CIRCUITOS con el RUC de su cliente (NULL si es huérfano)."""
+    df = df.copy()
+    df['ruc'] = df['ruc'].astype(str).str.strip().where(df['ruc'].notna(), None)
+    df['fecha_creacion'] = fechas_con_zona(df['fecha_creacion'])
+    CircuitoStaging.objects.bulk_create(
+        (
+            CircuitoStaging(
+                id_origen=fila.id_origen,
+                ruc=fila.ruc,
+                nombre_circuito=fila.nombre_circuito,
+                tipo_servicio=fila.tipo_servicio,
+                estado=fila.estado,
+                renta_mensual=fila.renta_mensual,
+                fecha_creacion=fila.fecha_creacion
+            )
+            for fila in sin_nulos(df).itertuples(index=False)
+        ),
+        batch_size=TAMANO_LOTE,
+    )
+
+
+def circuitos_huerfanos_staging():
+    """Circuitos en staging cuyo RUC no corresponde a ningún cliente en staging."""
+    return CircuitoStaging.objects.exclude(ruc__in=ClienteStaging.objects.values('ruc'))
+
+
+def validar_staging(clientes_leidos, circuitos_leidos):
+    """
+    Revisa las tablas staging antes de aplicarlas. Devuelve la lista de errores
+    (vacía si se puede continuar); los circuitos huérfanos solo se omiten.
+    """
+    errores = []
+    clientes = ClienteStaging.objects.count()
+    circuitos = CircuitoStaging.objects.count()
+    if clientes != clientes_leidos:
+        errores.append(f'Se leyeron {clientes_leidos} clientes pero staging tiene {clientes}.')
+    if circuitos != circuitos_leidos:
+        errores.append(f'Se leyeron {circuitos_leidos} circuitos pero staging tiene {circuitos}.')
+
+    vacios = ClienteStaging.objects.filter(ruc='').count()
+    if vacios:
+        errores.append(f'{vacios} clientes sin RUC.')
+
+    duplicados = list(
+        ClienteStaging.objects.values('ruc').annotate(filas=Count('id')).filter(filas__gt=1)
+        .order_by('ruc').values_list('ruc', flat=True)[:10]
+    )
+    if duplicados:
+        errores.append(f"RUC duplicados en el origen: {', '.join(duplicados)}")
+
+    circuitos_duplicados = (
+        CircuitoStaging.objects.values('id_origen').annotate(filas=Count('id')).filter(filas__gt=1).count()
+    )
+    if circuitos_duplicados:
+        errores.append(f'{circuitos_duplicados} circuito_id duplicados en el origen.')
+    return errores
+
+
+def aplicar_staging():
+    """
+    Actualiza Cliente y Circuito con el contenido de staging sin borrar nada: actualiza
+    las filas que cambiaron, inserta las nuevas (INSERT ... SELECT) y desactiva las que
+    ya no están en el origen, porque las solicitudes las siguen referenciando.
+    Debe ejecutarse dentro de una transacción: los lectores ven los datos anteriores
+    hasta el commit. Devuelve {'clientes': {...}, 'circuitos': {...}} con creados,
+    actualizados y desactivados.
+    """
+    ahora = connection.ops.adapt_datetimefield_value(timezone.now())
+    cliente, circuito = Cliente._meta.db_table, Circuito._meta.db_table
+    cliente_staging, circuito_staging = ClienteStaging._meta.db_table, CircuitoStaging._meta.db_table
+    clientes, circuitos = {}, {}
+    with connection.cursor() as cursor:
+        # -- La validación garantiza un RUC y un id_origen únicos en staging: cada subconsulta da una fila
+        cursor.execute(
+            f"""
+            UPDATE {cliente} SET
+                razon_social = (SELECT COALESCE(s.razon_social, '') FROM {cliente_staging} s WHERE s.ruc = {cliente}.ruc),
+                estado = (SELECT COALESCE(s.estado, 'Activo') FROM {cliente_staging} s WHERE s.ruc = {cliente}.ruc)
+            WHERE EXISTS (
+                SELECT 1 FROM {cliente_staging} s
+                WHERE s.ruc = {cliente}.ruc
+                  AND (COALESCE(s.razon_social, '') <> {cliente}.razon_social
+                       OR COALESCE(s.estado, 'Activo') <> {cliente}.estado)
+            )
+            """
+        )
+        clientes['actualizados'] = cursor.rowcount
+        cursor.execute(
+            f"""
+            INSERT INTO {cliente} (ruc, razon_social, fecha_registro, estado)
+            SELECT s.ruc, COALESCE(s.razon_social, ''), COALESCE(s.fecha_registro, %s), COALESCE(s.estado, 'Activo')
+            FROM {cliente_staging} s
+            WHERE NOT EXISTS (SELECT 1 FROM {cliente} c WHERE c.ruc = s.ruc)
+            """,
+            [ahora],
+        )
+        clientes['creados'] = cursor.rowcount
+
+        # -- Solo circuitos cuyo RUC tiene cliente; los huérfanos se omiten
+        cursor.execute(
+            f"""
+            UPDATE {circuito} SET
+                cliente_id = (
+                    SELECT c.id FROM {circuito_staging} s INNER JOIN {cliente} c ON c.ruc = s.ruc
+                    WHERE s.id_origen = {circuito}.id_origen
+                ),
+                nombre_circuito = (SELECT s.nombre_circuito FROM {circuito_staging} s WHERE s.id_origen = {circuito}.id_origen),
+                tipo_servicio = (SELECT s.tipo_servicio FROM {circuito_staging} s WHERE s.id_origen = {circuito}.id_origen),
+                estado = (SELECT COALESCE(s.estado, 'Activo') FROM {circuito_staging} s WHERE s.id_origen = {circuito}.id_origen),
+                renta_mensual = (SELECT s.renta_mensual FROM {circuito_staging} s WHERE s.id_origen = {circuito}.id_origen)
+            WHERE EXISTS (
+                SELECT 1 FROM {circuito_staging} s INNER JOIN {cliente} c ON c.ruc = s.ruc
+                WHERE s.id_origen = {circuito}.id_origen
+                  AND (c.id <> {circuito}.cliente_id
+                       OR s.nombre_circuito <> {circuito}.nombre_circuito
+                       OR COALESCE(s.tipo_servicio, '') <> COALESCE({circuito}.tipo_servicio, '')
+                       OR COALESCE(s.estado, 'Activo') <> {circuito}.estado
+                       OR s.renta_mensual <> {circuito}.renta_mensual)
+            )
+            """
+        )
+        circuitos['actualizados'] = cursor.rowcount
+        cursor.execute(
+            f"""
+            INSERT INTO {circuito}
+                (cliente_id, nombre_circuito, tipo_servicio, estado, renta_mensual, fecha_creacion, id_origen)
+            SELECT c.id, s.nombre_circuito, s.tipo_servicio, COALESCE(s.estado, 'Activo'), s.renta_mensual,
+                   COALESCE(s.fecha_creacion, %s), s.id_origen
+            FROM {circuito_staging} s
+            INNER JOIN {cliente} c ON c.ruc = s.ruc
+            WHERE NOT EXISTS (SELECT 1 FROM {circuito} x WHERE x.id_origen = s.id_origen)
+            """,
+            [ahora],
+        )
+        circuitos['creados'] = cursor.rowcount
+
+    # -- Ausentes del origen (y circuitos sin id_origen, que no se pueden emparejar). Los
+    #    circuitos que quedaron huérfanos en el origen no se actualizan: también se desactivan
+    clientes['desactivados'] = desactivar_ausentes(
+        Cliente.objects.all(), 'ruc', ClienteStaging.objects.values('ruc')
+    )
+    circuitos['desactivados'] = desactivar_ausentes(
+        Circuito.objects.all(),
+        'id_origen',
+        CircuitoStaging.objects.filter(ruc__in=ClienteStaging.objects.values('ruc')).values('id_origen'),
+    )
+
+    marcas = ClienteStaging.objects.aggregate(maxima=Max('fecha_registro'))
+    guardar_marca(MARCA_CLIENTES, marcas['maxima'])
+    marcas = CircuitoStaging.objects.aggregate(maxima=Max('fecha_creacion'))
+    guardar_marca(MARCA_CIRCUITOS, marcas['maxima'])
+    return {'clientes': clientes, 'circuitos': circuitos}
+
+
+def memoria_pico_mb():
+    """Memoria residente máxima del proceso (ru_maxrss está en KB en Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
 class Command(BaseCommand):
     help = 'Migra Clientes y Circuitos de SQL Server a SQLite via Pandas, mapeando por RUC.'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunksize',
+            type=int,
+            default=TAMANO_BLOQUE,
+            help=f'Filas por bloque leídas de SQL Server (por defecto {TAMANO_BLOQUE}).',
+        )
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help=(
+                'Trae solo las filas nuevas desde la última corrida (por fecha de creación: el origen '
+                'no registra modificaciones) y desactiva las que desaparecieron de SQL Server.'
+            ),
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=WORKERS,
+            help=(
+                'Conexiones simultáneas para leer de SQL Server en la migración completa: '
+                f'clientes y rangos de circuitos por cliente_id (por defecto {WORKERS}).'
+            ),
+        )
+        parser.add_argument(
+            '--origen',
+            help=(
+                'Origen alternativo a SQL Server (DB_HOST/DB_NAME del .env): URL de SQLAlchemy, '
+                'archivo SQLite con CLIENTES y CIRCUITOS, o directorio con clientes.parquet y circuitos.parquet.'
+            ),
+        )
+
     def handle(self, *args, **kwargs):
-        self.stdout.write(self.style.SUCCESS('--- Iniciando migración completa (Clientes y Circuitos) ---'))
+        chunksize = kwargs['chunksize']
+        incremental = kwargs['incremental']
+        workers = max(1, kwargs['workers'])
+        # -- Resultados de la corrida (los lee benchmark_migracion)
+        self.tiempos = {}
+        self.filas = {}
+        if incremental:
+            self.stdout.write(self.style.SUCCESS('--- Iniciando sincronización incremental (Clientes y Circuitos) ---'))
+        else:
+            self.stdout.write(self.style.SUCCESS('--- Iniciando migración completa (Clientes y Circuitos) ---'))
 
         try:
-            self.stdout.write(self.style.WARNING('Borrando datos transaccionales antiguos de SQLite...'))
-            Solicitud.objects.all().delete()
-            Circuito.objects.all().delete()
-            Cliente.objects.all().delete()
-            self.stdout.write(self.style.WARNING('Datos antiguos borrados (Solicitud, Circuito, Cliente).'))
-
-            driver_safe = urllib.parse.quote_plus(SQL_DRIVER)
-            connection_url = f"mssql+pyodbc://{SQL_USER}:{urllib.parse.quote_plus(SQL_PASSWORD)}@{SQL_SERVER}/{SQL_DATABASE}?driver={driver_safe}"
-            self.stdout.write(f'Conectando a {SQL_SERVER}...')
-            engine = create_engine(connection_url)
-
-            self.stdout.write('--- Paso 1: Migrando Clientes ---')
-            df_clientes = pd.read_sql(QUERY_CLIENTES, engine)
-            self.stdout.write(f'Se encontraron {len(df_clientes)} clientes en SQL Server.')
-
-            ruc_a_nuevo_id_map = {}
-
-            for index, row in df_clientes.iterrows():
-                cliente, created = Cliente.objects.get_or_create(
-                    ruc=row['ruc'],
-                    defaults={
-                        'razon_social': row['razon_social'],
-                        'estado': row['estado'],
-                        'fecha_registro': row['fecha_registro']
-                    }
+            if incremental and Circuito.objects.filter(id_origen__isnull=True).exists():
+                raise CommandError(
+                    'Hay circuitos sin id_origen. Ejecute una migración completa antes de usar --incremental.'
                 )
-                ruc_a_nuevo_id_map[cliente.ruc] = cliente.id
-            
-            self.stdout.write(self.style.SUCCESS(f'Clientes creados en SQLite: {len(ruc_a_nuevo_id_map)}'))
-
-            self.stdout.write('--- Paso 2: Migrando Circuitos ---')
-            df_circuitos = pd.read_sql(QUERY_CIRCUITOS, engine)
-            self.stdout.write(f'Se encontraron {len(df_circuitos)} circuitos en SQL Server.')
-
-            circuitos_creados = 0
-            circuitos_sin_padre = 0
-            
-            circuitos_a_crear = []
-
-            for index, row in df_circuitos.iterrows():
-                nuevo_cliente_id = ruc_a_nuevo_id_map.get(row['ruc'])
-
-                if nuevo_cliente_id:
-                    circuitos_a_crear.append(
-                        Circuito(
-                            cliente_id=nuevo_cliente_id,
-                            nombre_circuito=row['nombre_circuito'],
-                            tipo_servicio=row['tipo_servicio'],
-                            estado=row['estado'],
-                            renta_mensual=row['renta_mensual'],
-                            fecha_creacion=row['fecha_creacion']
-                        )
-                    )
-                    circuitos_creados += 1
+
+            if kwargs['origen']:
+                self.stdout.write(f"Origen: {kwargs['origen']}")
+                engine = crear_motor_origen(kwargs['origen'], workers)
+            else:
+                driver_safe = urllib.parse.quote_plus(SQL_DRIVER)
+                connection_url = f"mssql+pyodbc://{SQL_USER}:{urllib.parse.quote_plus(SQL_PASSWORD)}@{SQL_SERVER}/{SQL_DATABASE}?driver={driver_safe}"
+                self.stdout.write(f'Conectando a {SQL_SERVER}...')
+                engine = create_engine(connection_url, pool_size=workers, max_overflow=0)
+
+            # -- Sin invalidaciones por fila: se invalida todo una sola vez al final
+            with carga_masiva():
+                if incremental:
+                    # -- Datos y marcas se confirman juntos: si algo falla, la próxima corrida repite el delta
+                    with transaction.atomic():
+                        self.sincronizar(engine, chunksize)
                 else:
-                    circuitos_sin_padre += 1
+                    self.migrar_todo(engine, chunksize, workers)
 
-            self.stdout.write(f'Insertando {len(circuitos_a_crear)} circuitos en SQLite (esto es rápido)...')
-            Circuito.objects.bulk_create(circuitos_a_crear)
+            # -- Los workers recargan su índice de búsqueda de clientes y las listas de circuitos
+            invalidar_indice_clientes()
+            invalidar_circuitos()
 
-            self.stdout.write(self.style.SUCCESS(f'--- ¡Migración completada! ---'))
-            self.stdout.write(f'Total Clientes migrados: {len(ruc_a_nuevo_id_map)}')
-            self.stdout.write(f'Total Circuitos migrados: {circuitos_creados}')
-            self.stdout.write(self.style.WARNING(f'Circuitos sin padre (omitidos): {circuitos_sin_padre}'))
+            self.stdout.write('Tiempos por fase (s):')
+            for fase, segundos in self.tiempos.items():
+                self.stdout.write(f'  {fase}: {segundos:.2f}')
+            self.stdout.write(f'Memoria pico del proceso: {memoria_pico_mb():.1f} MB')
 
+        except CommandError:
+            raise
         except Exception as e:
-            self.stderr.write(self.style.ERROR(f'Error durante la migración: {e}'))
\ No newline at end of file
+            raise CommandError(f'Error durante la migración: {e}') from e
+
+    def migrar_todo(self, engine, chunksize, workers):
+        # -- Las tablas vivas no se tocan hasta aplicar staging al final
+        self.stdout.write(
+            f'--- Paso 1: Cargando tablas staging (bloques de {chunksize}, {workers} conexiones) ---'
+        )
+        tiempos, tiempos_extraccion = self.tiempos, {}
+        inicio = time.perf_counter()
+        vaciar_staging()
+
+        tareas = [('clientes', QUERY_CLIENTES, None)] + [
+            (f'circuitos[{numero}]', query, params)
+            for numero, (query, params) in enumerate(particiones_circuitos(engine, workers), start=1)
+        ]
+        leidos = {'clientes': 0, 'circuitos': 0}
+        escritura = 0.0
+        for nombre, df in extraer_en_paralelo(engine, tareas, chunksize, workers, tiempos_extraccion):
+            inicio_bloque = time.perf_counter()
+            # -- Un commit por bloque en lugar de uno por lote de bulk_create
+            with transaction.atomic():
+                if nombre == 'clientes':
+                    cargar_clientes_staging(df)
+                    leidos['clientes'] += len(df)
+                else:
+                    cargar_circuitos_staging(df)
+                    leidos['circuitos'] += len(df)
+            escritura += time.perf_counter() - inicio_bloque
+            self.stdout.write(f"  ... {leidos['clientes']} clientes y {leidos['circuitos']} circuitos leídos")
+        clientes_leidos, circuitos_leidos = leidos['clientes'], leidos['circuitos']
+        self.filas = leidos
+        tiempos['extracción y carga'] = time.perf_counter() - inicio
+        tiempos['escritura en staging'] = escritura
+        for tarea, segundos in sorted(tiempos_extraccion.items()):
+            tiempos[f'lectura {tarea}'] = segundos
+        self.stdout.write(f'Se encontraron {clientes_leidos} clientes en SQL Server.')
+        self.stdout.write(f'Se encontraron {circuitos_leidos} circuitos en SQL Server.')
+
+        self.stdout.write('--- Paso 2: Validando tablas staging ---')
+        inicio = time.perf_counter()
+        errores = validar_staging(clientes_leidos, circuitos_leidos)
+        if errores:
+            for error in errores:
+                self.stderr.write(self.style.ERROR(f'  {error}'))
+            raise CommandError('La validación falló; los datos actuales no se modificaron.')
+        circuitos_sin_padre = circuitos_huerfanos_staging().count()
+        tiempos['validación'] = time.perf_counter() - inicio
+
+        self.stdout.write('--- Paso 3: Aplicando staging a Cliente y Circuito ---')
+        inicio = time.perf_counter()
+        with transaction.atomic():
+            cambios = aplicar_staging()
+        vaciar_staging()
+        tiempos['aplicación'] = time.perf_counter() - inicio
+
+        self.stdout.write(self.style.SUCCESS('--- ¡Migración completada! ---'))
+        for nombre, conteo in (('Clientes', cambios['clientes']), ('Circuitos', cambios['circuitos'])):
+            self.stdout.write(
+                f"{nombre}: {conteo['creados']} nuevos, {conteo['actualizados']} actualizados, "
+                f"{conteo['desactivados']} desactivados"
+            )
+        self.stdout.write(self.style.WARNING(f'Circuitos sin padre (omitidos): {circuitos_sin_padre}'))
+
+    def sincronizar(self, engine, chunksize):
+        desde_clientes = leer_marca(MARCA_CLIENTES)
+        desde_circuitos = leer_marca(MARCA_CIRCUITOS)
+        self.stdout.write(f'Marcas: clientes desde {desde_clientes}, circuitos desde {desde_circuitos}')
+
+        # -- Sin marca previa se lee la tabla completa (el upsert no duplica)
+        inicio = time.perf_counter()
+        if desde_clientes is None:
+            clientes = self.paso_clientes(engine, QUERY_CLIENTES, chunksize)
+        else:
+            clientes = self.paso_clientes(engine, QUERY_CLIENTES_DESDE, chunksize, {'desde': desde_clientes})
+        self.tiempos['clientes'] = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        if desde_circuitos is None:
+            circuitos = self.paso_circuitos(engine, QUERY_CIRCUITOS, chunksize)
+        else:
+            circuitos = self.paso_circuitos(engine, QUERY_CIRCUITOS_DESDE, chunksize, {'desde': desde_circuitos})
+        self.tiempos['circuitos'] = time.perf_counter() - inicio
+        self.filas = {'clientes': clientes['leidos'], 'circuitos': circuitos['leidos']}
+
+        self.stdout.write('--- Paso 3: Desactivando filas que ya no existen en SQL Server ---')
+        inicio = time.perf_counter()
+        cargar_claves(engine, QUERY_CLAVES_CLIENTES, 'ruc', MARCA_CLIENTES, chunksize)
+        cargar_claves(engine, QUERY_CLAVES_CIRCUITOS, 'id_origen', MARCA_CIRCUITOS, chunksize)
+        clientes_inactivos = desactivar_ausentes(Cliente.objects.all(), 'ruc', claves_origen(MARCA_CLIENTES))
+        circuitos_inactivos = desactivar_ausentes(
+            Circuito.objects.all(), 'id_origen', claves_origen(MARCA_CIRCUITOS, entero=True)
+        )
+        ClaveOrigenStaging.objects.all().delete()
+        self.tiempos['desactivación'] = time.perf_counter() - inicio
+
+        self.stdout.write(self.style.SUCCESS('--- ¡Sincronización completada! ---'))
+        self.stdout.write(
+            f"Clientes: {clientes['creados']} nuevos, {clientes['actualizados']} actualizados, "
+            f"{clientes_inactivos} desactivados"
+        )
+        self.stdout.write(
+            f"Circuitos: {circuitos['creados']} nuevos, {circuitos['actualizados']} actualizados, "
+            f"{circuitos_inactivos} desactivados"
+        )
+        self.stdout.write(self.style.WARNING(f"Circuitos sin padre (omitidos): {circuitos['sin_padre']}"))
+
+    def paso_clientes(self, engine, query, chunksize, params=None):
+        self.stdout.write(f'--- Paso 1: Migrando Clientes (bloques de {chunksize}) ---')
+        resultado = {'leidos': 0, 'creados': 0, 'actualizados': 0}
+        marca = None
+
+        for df_clientes in leer_por_bloques(engine, query, chunksize, params):
+            resultado['leidos'] += len(df_clientes)
+            marca = fecha_maxima(df_clientes, COLUMNA_MARCA_CLIENTES, marca)
+            creados, actualizados = upsert_clientes(df_clientes)
+            resultado['creados'] += creados
+            resultado['actualizados'] += actualizados
+            self.stdout.write(f"  ... {resultado['leidos']} clientes leídos")
+
+        guardar_marca(MARCA_CLIENTES, marca)
+        resultado['total'] = Cliente.objects.count()
+
+        self.stdout.write(f"Se encontraron {resultado['leidos']} clientes en SQL Server.")
+        self.stdout.write(self.style.SUCCESS(
+            f"Clientes creados en SQLite: {resultado['creados']} (actualizados: {resultado['actualizados']})"
+        ))
+        return resultado
+
+    def paso_circuitos(self, engine, query, chunksize, params=None):
+        self.stdout.write(f'--- Paso 2: Migrando Circuitos (bloques de {chunksize}) ---')
+        ruc_a_nuevo_id_map = mapa_ruc_a_id()
+        resultado = {'leidos': 0, 'creados': 0, 'actualizados': 0, 'sin_padre': 0}
+        marca = None
+
+        for df_circuitos in leer_por_bloques(engine, query, chunksize, params):
+            resultado['leidos'] += len(df_circuitos)
+            marca = fecha_maxima(df_circuitos, COLUMNA_MARCA_CIRCUITOS, marca)
+            df_circuitos, sin_padre = circuitos_con_cliente(df_circuitos, ruc_a_nuevo_id_map)
+            resultado['sin_padre'] += sin_padre
+
+            # -- Cada bloque se escribe apenas llega; solo un bloque vive en memoria
+            creados, actualizados = upsert_circuitos(df_circuitos)
+            resultado['creados'] += creados
+            resultado['actualizados'] += actualizados
+            self.stdout.write(f"  ... {resultado['leidos']} circuitos leídos, {resultado['creados']} insertados")
+
+        guardar_marca(MARCA_CIRCUITOS, marca)
+        self.stdout.write(f"Se encontraron {resultado['leidos']} circuitos en SQL Server.")
+        return resultado
@@ -0,0 +1,83 @@
+# En: portal_retenciones/management/commands/procesar_trabajos.py
+
+import os
+import signal
+import socket
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from portal_retenciones.trabajos import ejecutar, limpiar_exportaciones, recuperar_colgados, tomar_siguiente
+
+# -- Cada cuántas vueltas sin trabajo se buscan trabajos colgados y exportaciones vencidas
+VUELTAS_REVISION = 60
+
+
+class Command(BaseCommand):
+    help = (
+        'Worker de la cola de trabajos en segundo plano (tabla Trabajo): exportaciones, '
+        'rebalanceos y sincronizaciones, fuera de los workers de gunicorn. Pueden correr varios a la vez.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--una-vez', action='store_true',
+            help='Procesa los trabajos disponibles y termina (útil desde cron).',
+        )
+        parser.add_argument(
+            '--intervalo', type=float, default=5,
+            help='Segundos de espera cuando la cola está vacía (por defecto 5).',
+        )
+        parser.add_argument('--max-trabajos', type=int, help='Termina después de procesar esta cantidad.')
+
+    def handle(self, *args, **options):
+        worker = f'{socket.gethostname()}:{os.getpid()}'
+        self.detener = False
+        # -- SIGTERM (systemd, supervisor): termina el trabajo en curso y sale
+        anteriores = {senal: signal.signal(senal, self.pedir_detencion) for senal in (signal.SIGTERM, signal.SIGINT)}
+        try:
+            self.procesar(worker, options)
+        finally:
+            for senal, manejador in anteriores.items():
+                signal.signal(senal, manejador)
+
+    def procesar(self, worker, options):
+        recuperados = recuperar_colgados()
+        if recuperados:
+            self.stdout.write(self.style.WARNING(f'{recuperados} trabajos colgados devueltos a la cola.'))
+        borrados = limpiar_exportaciones()
+        if borrados:
+            self.stdout.write(f'{borrados} archivos exportados vencidos borrados.')
+        self.stdout.write(f'Worker {worker} iniciado.')
+
+        procesados = vueltas = 0
+        while not self.detener:
+            # -- Conexiones caídas o vencidas (CONN_MAX_AGE) se reabren entre trabajos
+            close_old_connections()
+            trabajo = tomar_siguiente(worker)
+            if trabajo is None:
+                if options['una_vez']:
+                    break
+                vueltas += 1
+                if vueltas % VUELTAS_REVISION == 0:
+                    recuperar_colgados()
+                    limpiar_exportaciones()
+                time.sleep(options['intervalo'])
+                continue
+
+            inicio = time.perf_counter()
+            estado = ejecutar(trabajo)
+            procesados += 1
+            estilo = self.style.SUCCESS if estado == trabajo.COMPLETADO else self.style.WARNING
+            self.stdout.write(estilo(
+                f'Trabajo #{trabajo.id} {trabajo.tipo}: {estado} en {time.perf_counter() - inicio:.2f} s '
+                f'(intento {trabajo.intentos} de {trabajo.max_intentos}).'
+            ))
+            if options['max_trabajos'] and procesados >= options['max_trabajos']:
+                break
+
+        self.stdout.write(f'Worker {worker} detenido: {procesados} trabajos procesados.')
+
+    def pedir_detencion(self, *args):
+        self.detener = True
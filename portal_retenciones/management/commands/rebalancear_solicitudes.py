@@ -0,0 +1,66 @@
+# En: portal_retenciones/management/commands/rebalancear_solicitudes.py
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from portal_retenciones.asignacion import rebalancear
+from portal_retenciones.models import EjecutivoRetencion
+
+
+class Command(BaseCommand):
+    help = (
+        'Reparte las solicitudes pendientes de uno o más ejecutivos (ej. de licencia) entre los '
+        'ejecutivos disponibles, respetando max_carga_renta, en una sola transacción.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('ejecutivos', type=int, nargs='+', help='Ids de los ejecutivos a descargar.')
+        parser.add_argument(
+            '--destinos', type=int, nargs='+',
+            help='Ids de los ejecutivos que reciben (por defecto todos los activos y disponibles).',
+        )
+        parser.add_argument(
+            '--simular', action='store_true',
+            help='Solo muestra el reparto que se haría (dry-run), sin modificar nada.',
+        )
+        parser.add_argument(
+            '--no-disponibles', action='store_true',
+            help='Marca además a los ejecutivos de origen como no disponibles para asignación.',
+        )
+        parser.add_argument('--motivo', default='Rebalanceo de carga', help='Motivo registrado en el historial.')
+
+    def handle(self, *args, **options):
+        origenes = options['ejecutivos']
+        existentes = set(EjecutivoRetencion.objects.filter(id__in=origenes).values_list('id', flat=True))
+        faltantes = sorted(set(origenes) - existentes)
+        if faltantes:
+            raise CommandError(f'Ejecutivos inexistentes: {faltantes}')
+
+        inicio = time.perf_counter()
+        with transaction.atomic():
+            if options['no_disponibles'] and not options['simular']:
+                EjecutivoRetencion.objects.filter(id__in=origenes).update(disponible_asignacion=False)
+            plan = rebalancear(
+                origenes, options['destinos'], motivo=options['motivo'], simular=options['simular']
+            )
+        segundos = time.perf_counter() - inicio
+
+        nombres = dict(EjecutivoRetencion.objects.filter(id__in=plan['por_destino']).values_list('id', 'nombre'))
+        self.stdout.write(f"{'destino':<30} {'solicitudes':>11} {'renta':>14} {'renta final':>14} {'tope':>14}")
+        for ejecutivo_id, fila in plan['por_destino'].items():
+            self.stdout.write(
+                f"{nombres[ejecutivo_id][:30]:<30} {fila['solicitudes']:>11} {fila['renta']:>14.2f} "
+                f"{fila['renta_final']:>14.2f} {fila['tope'] if fila['tope'] is not None else '-':>14}"
+            )
+        if plan['sin_destino']:
+            self.stdout.write(self.style.WARNING(
+                f"{len(plan['sin_destino'])} solicitudes no caben en ningún destino y se quedan: "
+                f"{plan['sin_destino'][:20]}"
+            ))
+
+        accion = 'se reasignarían' if options['simular'] else 'reasignadas'
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(plan['movimientos'])} solicitudes {accion} en {segundos:.2f} s."
+        ))
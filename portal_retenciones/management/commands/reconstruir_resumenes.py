@@ -0,0 +1,59 @@
+# En: portal_retenciones/management/commands/reconstruir_resumenes.py
+
+from django.core.management.base import BaseCommand, CommandError
+
+from portal_retenciones.asignacion import (
+    reconstruir_cargas,
+    reconstruir_cargas_analista,
+    verificar_cargas,
+    verificar_cargas_analista,
+)
+from portal_retenciones.metricas import invalidar_metricas_dashboard
+from portal_retenciones.resumenes import reconstruir_resumenes, verificar_resumenes
+
+
+class Command(BaseCommand):
+    help = (
+        'Reconstruye desde cero las tablas resumen del dashboard, la carga de los ejecutivos '
+        'y los pendientes de los analistas, '
+        'o verifica si se desviaron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verificar',
+            action='store_true',
+            help='Solo compara los contadores guardados con los reales, sin modificar nada.',
+        )
+
+    def handle(self, *args, **options):
+        if options['verificar']:
+            diferencias = verificar_resumenes() + [
+                ('carga', ejecutivo_id, guardado, real) for ejecutivo_id, guardado, real in verificar_cargas()
+            ] + [
+                ('carga_analista', analista_id, guardado, real)
+                for analista_id, guardado, real in verificar_cargas_analista()
+            ]
+            if not diferencias:
+                self.stdout.write(self.style.SUCCESS('Las tablas resumen coinciden con la tabla Solicitud.'))
+                return
+
+            for tabla, clave, guardado, real in diferencias:
+                self.stdout.write(
+                    self.style.WARNING(f'[{tabla}] {clave}: guardado={guardado} real={real}')
+                )
+            raise CommandError(
+                f'Se encontraron {len(diferencias)} diferencias. '
+                'Ejecute el comando sin --verificar para reconstruir.'
+            )
+
+        self.stdout.write('--- Reconstruyendo tablas resumen ---')
+        reales = reconstruir_resumenes()
+        cargas = reconstruir_cargas()
+        cargas_analista = reconstruir_cargas_analista()
+        invalidar_metricas_dashboard()
+        self.stdout.write(self.style.SUCCESS(
+            f"Resumen reconstruido: {len(reales['estado'])} estados, "
+            f"{len(reales['mes'])} meses, {len(reales['ejecutivo'])} ejecutivos, "
+            f"{len(cargas)} cargas de ejecutivo, {len(cargas_analista)} de analista."
+        ))
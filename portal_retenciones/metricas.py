@@ -0,0 +1,103 @@
+# En: portal_retenciones/metricas.py
+
+from datetime import date
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from portal_retenciones import catalogos
+from portal_retenciones.models import Cliente, ResumenEjecutivo, ResumenEstado, ResumenMensual
+from portal_retenciones.resumenes import clave_mes
+
+# -- Estados considerados pendientes / cerrados para las métricas
+ESTADOS_PENDIENTES = ['Registrado', 'En Análisis']
+ESTADOS_CERRADOS = ['Aprobado', 'Rechazado', 'Baja Ejecutada']
+
+CLAVE_CACHE_DASHBOARD = 'dashboard:metricas'
+
+
+def calcular_metricas_dashboard():
+    """
+    Arma las métricas y series del dashboard leyendo las tablas resumen
+    (O(grupos)), sin recorrer la tabla Solicitud.
+    """
+
+    # === MÉTRICAS PRINCIPALES (derivadas de los contadores por estado) ===
+    por_estado = list(ResumenEstado.objects.filter(cantidad__gt=0).order_by('-cantidad'))
+    # -- Nombres desde el catálogo en memoria, sin JOIN con EstadoAtencion
+    nombres = {estado.id: estado.nombre_estado for estado in catalogos.estados()}
+    total_solicitudes = sum(r.cantidad for r in por_estado)
+    solicitudes_pendientes = sum(
+        r.cantidad for r in por_estado if nombres.get(r.estado_id) in ESTADOS_PENDIENTES
+    )
+    solicitudes_cerradas = sum(
+        r.cantidad for r in por_estado if nombres.get(r.estado_id) in ESTADOS_CERRADOS
+    )
+    porcentaje_cierre = (
+        round((solicitudes_cerradas / total_solicitudes * 100), 1) if total_solicitudes > 0 else 0
+    )
+
+    # === GRÁFICO 2: Solicitudes por Mes (ventana configurable) ===
+    meses_labels, meses_valores = serie_mensual(getattr(settings, 'DASHBOARD_MESES', 6))
+
+    # === GRÁFICO 3: Top 5 Ejecutivos con más solicitudes ===
+    top_ejecutivos = ResumenEjecutivo.objects.filter(
+        cantidad__gt=0
+    ).select_related('ejecutivo').order_by('-cantidad')[:5]
+
+    return {
+        'total_clientes': Cliente.objects.count(),
+        'total_solicitudes': total_solicitudes,
+        'solicitudes_pendientes': solicitudes_pendientes,
+        'solicitudes_resueltas': total_solicitudes - solicitudes_pendientes,
+        'porcentaje_cierre': porcentaje_cierre,
+
+        'estados_labels': [nombres.get(r.estado_id, str(r.estado_id)) for r in por_estado],
+        'estados_valores': [r.cantidad for r in por_estado],
+
+        'meses': getattr(settings, 'DASHBOARD_MESES', 6),
+        'meses_labels': meses_labels,
+        'meses_valores': meses_valores,
+
+        'ejecutivos_labels': [r.ejecutivo.nombre for r in top_ejecutivos],
+        'ejecutivos_valores': [r.cantidad for r in top_ejecutivos],
+    }
+
+
+def _restar_meses(mes, cantidad):
+    indice = mes.year * 12 + (mes.month - 1) - cantidad
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+def serie_mensual(meses):
+    """
+    Devuelve (etiquetas 'AAAA-MM', cantidades) de los últimos 'meses' meses,
+    incluido el actual, completando con 0 los meses sin solicitudes.
+    """
+    mes_actual = clave_mes(timezone.now())
+    mes_inicio = _restar_meses(mes_actual, meses - 1)
+
+    guardados = dict(
+        ResumenMensual.objects.filter(mes__gte=mes_inicio).values_list('mes', 'cantidad')
+    )
+    todos = [_restar_meses(mes_actual, atras) for atras in range(meses - 1, -1, -1)]
+    return [mes.strftime('%Y-%m') for mes in todos], [guardados.get(mes, 0) for mes in todos]
+
+
+def obtener_metricas_dashboard():
+    """
+    Devuelve la foto de métricas guardada en caché; solo se recalcula cuando
+    expira el TTL o cuando se invalida explícitamente.
+    """
+    metricas = cache.get(CLAVE_CACHE_DASHBOARD)
+    if metricas is None:
+        metricas = calcular_metricas_dashboard()
+        cache.set(CLAVE_CACHE_DASHBOARD, metricas, getattr(settings, 'DASHBOARD_CACHE_TTL', 300))
+    return metricas
+
+
+def invalidar_metricas_dashboard():
+    """Descarta la foto del dashboard cuando se confirme la transacción en curso."""
+    transaction.on_commit(lambda: cache.delete(CLAVE_CACHE_DASHBOARD))
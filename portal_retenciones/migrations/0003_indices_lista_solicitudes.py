@@ -0,0 +1,35 @@
+# Generated by Django 5.0.6 on 2026-10-18 08:39
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal_retenciones', '0002_configuracionasignacion'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='solicitud',
+            index=models.Index(fields=['-fecha_creacion', '-id'], name='solicitud_fcreacion_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='solicitud',
+            index=models.Index(fields=['estado_actual', '-fecha_creacion', '-id'], name='solicitud_estado_fc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='solicitud',
+            index=models.Index(fields=['ejecutivo', '-fecha_creacion', '-id'], name='solicitud_ejecutivo_fc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='solicitud',
+            index=models.Index(fields=['cliente', '-fecha_creacion', '-id'], name='solicitud_cliente_fc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='solicitud',
+            index=models.Index(fields=['fecha_solicitud_baja', 'id'], name='solicitud_fbaja_id_idx'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.0.6 on 2026-10-18 08:42
+
+from collections import Counter
+from datetime import timezone as dt_timezone
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def poblar_resumenes(apps, schema_editor):
+    # -- Carga inicial de los contadores a partir de las solicitudes existentes
+    Solicitud = apps.get_model('portal_retenciones', 'Solicitud')
+    ResumenEstado = apps.get_model('portal_retenciones', 'ResumenEstado')
+    ResumenMensual = apps.get_model('portal_retenciones', 'ResumenMensual')
+    ResumenEjecutivo = apps.get_model('portal_retenciones', 'ResumenEjecutivo')
+
+    por_estado, por_mes, por_ejecutivo = Counter(), Counter(), Counter()
+    filas = Solicitud.objects.values_list('estado_actual_id', 'ejecutivo_id', 'fecha_creacion')
+    for estado_id, ejecutivo_id, fecha in filas.iterator():
+        por_estado[estado_id] += 1
+        por_ejecutivo[ejecutivo_id] += 1
+        por_mes[fecha.astimezone(dt_timezone.utc).strftime('%Y-%m')] += 1
+
+    ResumenEstado.objects.bulk_create(
+        ResumenEstado(estado_id=k, cantidad=v) for k, v in por_estado.items()
+    )
+    ResumenMensual.objects.bulk_create(
+        ResumenMensual(mes=k, cantidad=v) for k, v in por_mes.items()
+    )
+    ResumenEjecutivo.objects.bulk_create(
+        ResumenEjecutivo(ejecutivo_id=k, cantidad=v) for k, v in por_ejecutivo.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal_retenciones', '0003_indices_lista_solicitudes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenEjecutivo',
+            fields=[
+                ('ejecutivo', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='portal_retenciones.ejecutivoretencion')),
+                ('cantidad', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ResumenEstado',
+            fields=[
+                ('estado', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='portal_retenciones.estadoatencion')),
+                ('cantidad', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ResumenMensual',
+            fields=[
+                ('mes', models.CharField(max_length=7, primary_key=True, serialize=False)),
+                ('cantidad', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(poblar_resumenes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.6 on 2026-10-18 08:42
+
+from django.db import migrations, models
+
+
+def meses_a_fecha(apps, schema_editor):
+    # -- 'AAAA-MM' -> 'AAAA-MM-01' para que el valor sea una fecha válida
+    ResumenMensual = apps.get_model('portal_retenciones', 'ResumenMensual')
+    for mes in list(ResumenMensual.objects.values_list('mes', flat=True)):
+        if len(mes) == 7:
+            ResumenMensual.objects.filter(mes=mes).update(mes=f'{mes}-01')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal_retenciones', '0004_tablas_resumen'),
+    ]
+
+    operations = [
+        migrations.RunPython(meses_a_fecha, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='resumenmensual',
+            name='mes',
+            field=models.DateField(primary_key=True, serialize=False),
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.0.6 on 2026-10-18 09:10
+
+from django.db import migrations
+
+# -- Índice FTS5 (external content) sobre Cliente, sincronizado por triggers.
+#    Solo aplica a SQLite; en otros motores la búsqueda usa icontains.
+TRIGGERS_FTS_CLIENTES = [
+    """
+    CREATE TRIGGER IF NOT EXISTS portal_retenciones_cliente_fts_ai
+    AFTER INSERT ON portal_retenciones_cliente BEGIN
+        INSERT INTO portal_retenciones_cliente_fts(rowid, razon_social, ruc)
+        VALUES (new.id, new.razon_social, new.ruc);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS portal_retenciones_cliente_fts_ad
+    AFTER DELETE ON portal_retenciones_cliente BEGIN
+        INSERT INTO portal_retenciones_cliente_fts(portal_retenciones_cliente_fts, rowid, razon_social, ruc)
+        VALUES ('delete', old.id, old.razon_social, old.ruc);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS portal_retenciones_cliente_fts_au
+    AFTER UPDATE OF razon_social, ruc ON portal_retenciones_cliente BEGIN
+        INSERT INTO portal_retenciones_cliente_fts(portal_retenciones_cliente_fts, rowid, razon_social, ruc)
+        VALUES ('delete', old.id, old.razon_social, old.ruc);
+        INSERT INTO portal_retenciones_cliente_fts(rowid, razon_social, ruc)
+        VALUES (new.id, new.razon_social, new.ruc);
+    END
+    """,
+]
+
+
+def crear_indice_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS portal_retenciones_cliente_fts USING fts5(
+            razon_social,
+            ruc,
+            content='portal_retenciones_cliente',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3 4'
+        )
+        """
+    )
+    for trigger in TRIGGERS_FTS_CLIENTES:
+        schema_editor.execute(trigger)
+    # -- Indexa los clientes que ya existen
+    schema_editor.execute(
+        "INSERT INTO portal_retenciones_cliente_fts(portal_retenciones_cliente_fts) VALUES ('rebuild')"
+    )
+
+
+def eliminar_indice_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sufijo in ('ai', 'ad', 'au'):
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS portal_retenciones_cliente_fts_{sufijo}')
+    schema_editor.execute('DROP TABLE IF EXISTS portal_retenciones_cliente_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal_retenciones', '0005_resumen_mensual_fecha'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice_fts, eliminar_indice_fts),
+    ]
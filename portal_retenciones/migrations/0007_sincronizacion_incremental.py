@@ -0,0 +1,26 @@
+# Generated by Django 5.0.6 on 2026-10-18 08:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal_retenciones', '0006_indice_busqueda_clientes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarcaSincronizacion',
+            fields=[
+                ('tabla', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('ultima_fecha', models.DateTimeField(blank=True, null=True)),
+                ('fecha_sincronizacion', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='circuito',
+            name='id_origen',
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.0.6 on 2026-10-18 08:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal_retenciones', '0007_sincronizacion_incremental'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CircuitoStaging',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('id_origen', models.IntegerField()),
+                ('ruc', models.CharField(blank=True, db_index=True, max_length=100, null=True)),
+                ('nombre_circuito', models.CharField(max_length=100)),
+                ('tipo_servicio', models.CharField(blank=True, max_length=10, null=True)),
+                ('estado', models.CharField(blank=True, max_length=20, null=True)),
+                ('renta_mensual', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('fecha_creacion', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ClienteStaging',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ruc', models.CharField(db_index=True, max_length=100)),
+                ('razon_social', models.CharField(blank=True, max_length=100, null=True)),
+                ('fecha_registro', models.DateTimeField(blank=True, null=True)),
+                ('estado', models.CharField(blank=True, max_length=20, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.0.6 on 2026-10-18 09:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+# -- Copia de metricas.ESTADOS_PENDIENTES al momento de esta migración
+ESTADOS_PENDIENTES = ['Registrado', 'En Análisis']
+
+
+def poblar_cargas(apps, schema_editor):
+    # -- Carga inicial a partir de las solicitudes pendientes existentes
+    Solicitud = apps.get_model('portal_retenciones', 'Solicitud')
+    SolicitudCircuito = apps.get_model('portal_retenciones', 'SolicitudCircuito')
+    CargaEjecutivo = apps.get_model('portal_retenciones', 'CargaEjecutivo')
+
+    pendientes = Solicitud.objects.filter(estado_actual__nombre_estado__in=ESTADOS_PENDIENTES)
+    cantidades = dict(pendientes.values_list('ejecutivo').annotate(n=Count('id')))
+    rentas = dict(
+        SolicitudCircuito.objects.filter(solicitud__in=pendientes)
+        .values_list('solicitud__ejecutivo')
+        .annotate(renta=Sum('circuito__renta_mensual'))
+    )
+    CargaEjecutivo.objects.bulk_create(
+        CargaEjecutivo(ejecutivo_id=k, solicitudes_abiertas=v, renta_abierta=rentas.get(k) or 0)
+        for k, v in cantidades.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal_retenciones', '0008_tablas_staging'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CargaEjecutivo',
+            fields=[
+                ('ejecutivo', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='carga', serialize=False, to='portal_retenciones.ejecutivoretencion')),
+                ('solicitudes_abiertas', models.IntegerField(default=0)),
+                ('renta_abierta', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+        ),
+        migrations.RunPython(poblar_cargas, migrations.RunPython.noop),
+    ]
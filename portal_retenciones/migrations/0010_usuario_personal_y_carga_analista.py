@@ -0,0 +1,76 @@
+# Generated by Django 5.0.6 on 2026-10-18 09:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+# -- Copia de metricas.ESTADOS_PENDIENTES al momento de esta migración
+ESTADOS_PENDIENTES = ['Registrado', 'En Análisis']
+
+
+def vincular_usuarios(apps, schema_editor):
+    # -- Vincula cada ejecutivo / analista con la única cuenta cuyo email o username es su
+    #    email o, si no hay, cuyo username es la parte local del email (tcadillo@win.pe ->
+    #    tcadillo). Sin coincidencia única queda sin usuario y se vincula desde el admin
+    User = apps.get_model('auth', 'User')
+    por_email, por_username = {}, {}
+    for usuario_id, email, username in User.objects.values_list('id', 'email', 'username'):
+        if email:
+            por_email.setdefault(email.lower(), set()).add(usuario_id)
+        por_username.setdefault(username.lower(), set()).add(usuario_id)
+
+    for nombre in ('EjecutivoRetencion', 'AnalistaRetencion'):
+        modelo = apps.get_model('portal_retenciones', nombre)
+        for persona in modelo.objects.filter(usuario__isnull=True):
+            email = persona.email.lower()
+            candidatos = por_email.get(email, set()) | por_username.get(email, set())
+            if not candidatos:
+                candidatos = por_username.get(email.split('@')[0], set())
+            if len(candidatos) == 1:
+                usuario_id = next(iter(candidatos))
+                if not modelo.objects.filter(usuario_id=usuario_id).exists():
+                    persona.usuario_id = usuario_id
+                    persona.save(update_fields=['usuario'])
+
+
+def poblar_cargas_analista(apps, schema_editor):
+    # -- Contador inicial a partir de las solicitudes pendientes existentes
+    Solicitud = apps.get_model('portal_retenciones', 'Solicitud')
+    CargaAnalista = apps.get_model('portal_retenciones', 'CargaAnalista')
+
+    pendientes = Solicitud.objects.filter(estado_actual__nombre_estado__in=ESTADOS_PENDIENTES)
+    cantidades = dict(pendientes.values_list('analista').annotate(n=Count('id')).order_by())
+    CargaAnalista.objects.bulk_create(
+        CargaAnalista(analista_id=k, solicitudes_abiertas=v) for k, v in cantidades.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal_retenciones', '0009_carga_ejecutivo'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CargaAnalista',
+            fields=[
+                ('analista', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='carga', serialize=False, to='portal_retenciones.analistaretencion')),
+                ('solicitudes_abiertas', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='analistaretencion',
+            name='usuario',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='analista_retencion', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='ejecutivoretencion',
+            name='usuario',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ejecutivo_retencion', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(vincular_usuarios, migrations.RunPython.noop),
+        migrations.RunPython(poblar_cargas_analista, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.0.6 on 2026-10-18 09:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal_retenciones', '0010_usuario_personal_y_carga_analista'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comentario',
+            index=models.Index(fields=['solicitud', '-fecha_comentario', '-id'], name='comentario_sol_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='historialasignacion',
+            index=models.Index(fields=['solicitud', '-fecha_cambio', '-id'], name='hasignacion_sol_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='historialestado',
+            index=models.Index(fields=['solicitud', '-fecha_cambio', '-id'], name='hestado_sol_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-18 09:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal_retenciones', '0012_trabajo'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='circuitostaging',
+            name='id_origen',
+            field=models.IntegerField(db_index=True),
+        ),
+    ]
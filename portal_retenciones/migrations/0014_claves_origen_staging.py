@@ -0,0 +1,24 @@
+# Generated by Django 5.0.6 on 2026-10-18 09:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal_retenciones', '0013_indice_staging_id_origen'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClaveOrigenStaging',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tabla', models.CharField(max_length=50)),
+                ('clave', models.CharField(max_length=100)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['tabla', 'clave'], name='clave_origen_tabla_idx')],
+            },
+        ),
+    ]
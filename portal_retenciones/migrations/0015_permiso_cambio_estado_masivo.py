@@ -0,0 +1,17 @@
+# Generated by Django 5.0.6 on 2026-10-18 09:39
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal_retenciones', '0014_claves_origen_staging'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='solicitud',
+            options={'permissions': [('can_view_menu', 'Puede ver el menú de inicio (requerido para login)'), ('can_create_solicitud', 'Puede acceder al formulario de Nueva Solicitud'), ('can_view_solicitud_list', 'Puede acceder a la lista de Solicitudes'), ('can_view_personal', 'Puede acceder a la lista de Personal Activo'), ('can_manage_personnel', 'Puede gestionar la asignación de personal a roles'), ('can_change_estado_masivo', 'Puede cambiar de estado varias solicitudes a la vez')]},
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-18 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal_retenciones', '0015_permiso_cambio_estado_masivo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trabajo',
+            name='fecha_latido',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
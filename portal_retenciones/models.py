@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 # -- Modelo: Cliente
 class Cliente(models.Model):
@@ -19,6 +20,8 @@ class Circuito(models.Model):
     estado = models.CharField(max_length=20, default='Activo')
     renta_mensual = models.DecimalField(max_digits=12, decimal_places=2, null=False)
     fecha_creacion = models.DateTimeField(auto_now_add=True)
+    # -- circuito_id en SQL Server (clave para la sincronización incremental)
+    id_origen = models.IntegerField(null=True, blank=True, db_index=True)
 
     def __str__(self):
         return f"{self.nombre_circuito} ({self.cliente.razon_social})"
@@ -30,6 +33,10 @@ class EjecutivoRetencion(models.Model):
     activo = models.BooleanField(default=True)
     max_carga_renta = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
     disponible_asignacion = models.BooleanField(default=True)
+    # -- Cuenta de usuario del ejecutivo (para su menú y contador de pendientes)
+    usuario = models.OneToOneField(
+        User, on_delete=models.SET_NULL, null=True, blank=True, related_name='ejecutivo_retencion'
+    )
 
     def __str__(self):
         return self.nombre
@@ -39,6 +46,10 @@ class AnalistaRetencion(models.Model):
     nombre = models.CharField(max_length=100, null=False)
     email = models.EmailField(max_length=100, null=False, unique=True)
     activo = models.BooleanField(default=True)
+    # -- Cuenta de usuario del analista (para su menú y contador de pendientes)
+    usuario = models.OneToOneField(
+        User, on_delete=models.SET_NULL, null=True, blank=True, related_name='analista_retencion'
+    )
 
     def __str__(self):
         return self.nombre
@@ -97,6 +108,16 @@ class Solicitud(models.Model):
             ("can_view_solicitud_list", "Puede acceder a la lista de Solicitudes"),
             ("can_view_personal", "Puede acceder a la lista de Personal Activo"),
             ("can_manage_personnel", "Puede gestionar la asignación de personal a roles"),
+            ("can_change_estado_masivo", "Puede cambiar de estado varias solicitudes a la vez"),
+        ]
+        # -- Índices compuestos para la paginación keyset (fecha_creacion DESC, id DESC)
+        #    y para los filtros de la lista de solicitudes
+        indexes = [
+            models.Index(fields=['-fecha_creacion', '-id'], name='solicitud_fcreacion_id_idx'),
+            models.Index(fields=['estado_actual', '-fecha_creacion', '-id'], name='solicitud_estado_fc_idx'),
+            models.Index(fields=['ejecutivo', '-fecha_creacion', '-id'], name='solicitud_ejecutivo_fc_idx'),
+            models.Index(fields=['cliente', '-fecha_creacion', '-id'], name='solicitud_cliente_fc_idx'),
+            models.Index(fields=['fecha_solicitud_baja', 'id'], name='solicitud_fbaja_id_idx'),
         ]
 
     def __str__(self):
@@ -109,6 +130,12 @@ class Comentario(models.Model):
     comentario = models.TextField(null=False)
     fecha_comentario = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # -- Línea de tiempo de la solicitud: (solicitud, fecha DESC, id DESC)
+        indexes = [
+            models.Index(fields=['solicitud', '-fecha_comentario', '-id'], name='comentario_sol_fecha_idx'),
+        ]
+
 # -- Modelo: HistorialAsignacion
 class HistorialAsignacion(models.Model):
     solicitud = models.ForeignKey(Solicitud, on_delete=models.CASCADE, null=False)
@@ -117,6 +144,11 @@ class HistorialAsignacion(models.Model):
     fecha_cambio = models.DateTimeField(auto_now_add=True)
     motivo = models.TextField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['solicitud', '-fecha_cambio', '-id'], name='hasignacion_sol_fecha_idx'),
+        ]
+
 # -- Modelo: HistorialEstado
 class HistorialEstado(models.Model):
     solicitud = models.ForeignKey(Solicitud, on_delete=models.CASCADE, null=False)
@@ -125,6 +157,11 @@ class HistorialEstado(models.Model):
     fecha_cambio = models.DateTimeField(auto_now_add=True)
     usuario_cambio = models.CharField(max_length=100, null=False) 
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['solicitud', '-fecha_cambio', '-id'], name='hestado_sol_fecha_idx'),
+        ]
+
 # -- Modelo: SolicitudCircuito (Tabla intermedia)
 class SolicitudCircuito(models.Model):
     solicitud = models.ForeignKey(Solicitud, on_delete=models.CASCADE)
@@ -132,4 +169,146 @@ class SolicitudCircuito(models.Model):
     fecha_asociacion = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        unique_together = ('solicitud', 'circuito')
\ No newline at end of file
+        unique_together = ('solicitud', 'circuito')
+
+# -----------------------------------------------------------------
+# --- TABLAS RESUMEN (contadores mantenidos para el dashboard) ---
+# -----------------------------------------------------------------
+
+# -- Modelo: ResumenEstado (solicitudes por estado actual)
+class ResumenEstado(models.Model):
+    estado = models.OneToOneField(EstadoAtencion, on_delete=models.CASCADE, primary_key=True)
+    cantidad = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.estado_id}: {self.cantidad}"
+
+# -- Modelo: ResumenMensual (solicitudes creadas por mes, clave = primer día del mes)
+class ResumenMensual(models.Model):
+    mes = models.DateField(primary_key=True)
+    cantidad = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.mes}: {self.cantidad}"
+
+# -- Modelo: ResumenEjecutivo (solicitudes asignadas por ejecutivo)
+class ResumenEjecutivo(models.Model):
+    ejecutivo = models.OneToOneField(EjecutivoRetencion, on_delete=models.CASCADE, primary_key=True)
+    cantidad = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.ejecutivo_id}: {self.cantidad}"
+
+# -- Modelo: CargaEjecutivo (solicitudes pendientes y su renta, para la asignación automática)
+class CargaEjecutivo(models.Model):
+    ejecutivo = models.OneToOneField(
+        EjecutivoRetencion, on_delete=models.CASCADE, primary_key=True, related_name='carga'
+    )
+    solicitudes_abiertas = models.IntegerField(default=0)
+    # -- Suma de renta_mensual de los circuitos de sus solicitudes pendientes
+    renta_abierta = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.ejecutivo_id}: {self.solicitudes_abiertas} / {self.renta_abierta}"
+
+# -- Modelo: CargaAnalista (solicitudes pendientes por analista)
+class CargaAnalista(models.Model):
+    analista = models.OneToOneField(
+        AnalistaRetencion, on_delete=models.CASCADE, primary_key=True, related_name='carga'
+    )
+    solicitudes_abiertas = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.analista_id}: {self.solicitudes_abiertas}"
+
+# -- Modelo: Trabajo (cola de tareas en segundo plano, procesada por 'procesar_trabajos')
+class Trabajo(models.Model):
+    PENDIENTE = 'pendiente'
+    EN_CURSO = 'en_curso'
+    COMPLETADO = 'completado'
+    FALLIDO = 'fallido'
+    ESTADOS = [
+        (PENDIENTE, 'Pendiente'),
+        (EN_CURSO, 'En curso'),
+        (COMPLETADO, 'Completado'),
+        (FALLIDO, 'Fallido'),
+    ]
+
+    tipo = models.CharField(max_length=50)
+    parametros = models.JSONField(default=dict, blank=True)
+    estado = models.CharField(max_length=20, choices=ESTADOS, default=PENDIENTE)
+    progreso = models.PositiveSmallIntegerField(default=0)
+    mensaje = models.TextField(blank=True, default='')
+    resultado = models.JSONField(null=True, blank=True)
+    intentos = models.PositiveSmallIntegerField(default=0)
+    max_intentos = models.PositiveSmallIntegerField(default=3)
+    # -- Un reintento no se toma antes de esta fecha (espera creciente entre intentos)
+    disponible_desde = models.DateTimeField(default=timezone.now)
+    worker = models.CharField(max_length=100, blank=True, default='')
+    creado_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='trabajos')
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_inicio = models.DateTimeField(null=True, blank=True)
+    fecha_fin = models.DateTimeField(null=True, blank=True)
+    # -- Lo renueva el worker mientras la tarea corre; sin latidos recientes se da por colgado
+    fecha_latido = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        # -- El worker busca el siguiente pendiente disponible en orden de llegada
+        indexes = [
+            models.Index(fields=['estado', 'disponible_desde', 'id'], name='trabajo_estado_disp_idx'),
+        ]
+
+    def __str__(self):
+        return f"Trabajo #{self.id} {self.tipo} ({self.estado})"
+
+# -----------------------------------------------------------------
+# --- SINCRONIZACIÓN CON SQL SERVER ---
+# -----------------------------------------------------------------
+
+# -- Modelo: MarcaSincronizacion (high-water mark por tabla de origen)
+class MarcaSincronizacion(models.Model):
+    tabla = models.CharField(max_length=50, primary_key=True)
+    # -- Mayor fecha de origen ya sincronizada; la próxima corrida lee desde aquí
+    ultima_fecha = models.DateTimeField(null=True, blank=True)
+    fecha_sincronizacion = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.tabla}: {self.ultima_fecha}"
+
+# -- Modelo: ClienteStaging (copia cruda de RETENCION.CLIENTES antes de aplicarla)
+class ClienteStaging(models.Model):
+    ruc = models.CharField(max_length=100, db_index=True)
+    razon_social = models.CharField(max_length=100, null=True, blank=True)
+    fecha_registro = models.DateTimeField(null=True, blank=True)
+    estado = models.CharField(max_length=20, null=True, blank=True)
+
+    def __str__(self):
+        return self.ruc
+
+# -- Modelo: CircuitoStaging (copia cruda de RETENCION.CIRCUITOS, con el RUC de su cliente)
+class CircuitoStaging(models.Model):
+    # -- Indexado: al aplicar staging cada circuito local se busca por id_origen
+    id_origen = models.IntegerField(db_index=True)
+    # -- NULL si el circuito no tiene cliente en el origen (huérfano)
+    ruc = models.CharField(max_length=100, null=True, blank=True, db_index=True)
+    nombre_circuito = models.CharField(max_length=100)
+    tipo_servicio = models.CharField(max_length=10, null=True, blank=True)
+    estado = models.CharField(max_length=20, null=True, blank=True)
+    renta_mensual = models.DecimalField(max_digits=12, decimal_places=2)
+    fecha_creacion = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.id_origen} ({self.ruc})"
+
+# -- Modelo: ClaveOrigenStaging (claves de una tabla de origen, para desactivar en SQL las que desaparecieron)
+class ClaveOrigenStaging(models.Model):
+    tabla = models.CharField(max_length=50)
+    clave = models.CharField(max_length=100)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['tabla', 'clave'], name='clave_origen_tabla_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.tabla}: {self.clave}"
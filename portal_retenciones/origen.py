@@ -0,0 +1,169 @@
+# En: portal_retenciones/origen.py
+
+import sqlite3
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import QueuePool
+
+# -- Esquema y tablas de SQL Server que lee migrar_con_pandas
+ESQUEMA = 'RETENCION'
+
+DDL_ORIGEN = """
+    CREATE TABLE CLIENTES (
+        cliente_id INTEGER PRIMARY KEY,
+        ruc TEXT,
+        razon_social TEXT,
+        fecha_registro TIMESTAMP,
+        estado TEXT
+    );
+    CREATE TABLE CIRCUITOS (
+        circuito_id INTEGER PRIMARY KEY,
+        cliente_id INTEGER,
+        nombre_circuito TEXT,
+        tipo_servicio TEXT,
+        estado TEXT,
+        renta_mensual NUMERIC,
+        fecha_creacion TIMESTAMP
+    );
+    CREATE INDEX circuitos_cliente_idx ON CIRCUITOS (cliente_id);
+"""
+
+ARCHIVOS_PARQUET = {'CLIENTES': 'clientes.parquet', 'CIRCUITOS': 'circuitos.parquet'}
+
+TIPOS_SERVICIO = ['DATOS', 'INTERNET', 'VOZ', 'MPLS', 'FIBRA']
+
+
+def motor_sqlite(ruta, workers=1):
+    """
+    Motor SQLAlchemy que adjunta un archivo SQLite como esquema RETENCION, de modo
+    que las consultas escritas para SQL Server (RETENCION.CLIENTES) funcionan sin cambios.
+    Igual que con SQL Server, el pool tiene 'workers' conexiones compartidas entre hilos.
+    """
+    ruta = str(Path(ruta).resolve()).replace("'", "''")
+    motor = create_engine(
+        'sqlite://',
+        poolclass=QueuePool,
+        pool_size=workers,
+        max_overflow=0,
+        connect_args={'check_same_thread': False},
+    )
+
+    @event.listens_for(motor, 'connect')
+    def adjuntar(conexion, registro):
+        conexion.execute(f"ATTACH DATABASE '{ruta}' AS {ESQUEMA}")
+
+    return motor
+
+
+def parquet_a_sqlite(directorio):
+    """
+    Convierte clientes.parquet y circuitos.parquet del directorio en un origen.sqlite3
+    al lado (se reutiliza si es más reciente que los Parquet). Requiere pyarrow.
+    """
+    directorio = Path(directorio)
+    parquets = [directorio / nombre for nombre in ARCHIVOS_PARQUET.values()]
+    faltantes = [str(ruta) for ruta in parquets if not ruta.exists()]
+    if faltantes:
+        raise ValueError(f"Faltan archivos Parquet: {', '.join(faltantes)}")
+
+    destino = directorio / 'origen.sqlite3'
+    if destino.exists() and destino.stat().st_mtime >= max(ruta.stat().st_mtime for ruta in parquets):
+        return destino
+
+    destino.unlink(missing_ok=True)
+    with sqlite3.connect(destino) as conexion:
+        conexion.executescript(DDL_ORIGEN)
+        for tabla, nombre in ARCHIVOS_PARQUET.items():
+            try:
+                df = pd.read_parquet(directorio / nombre)
+            except ImportError as e:
+                raise ValueError('Leer Parquet requiere instalar pyarrow.') from e
+            df.to_sql(tabla, conexion, if_exists='append', index=False, chunksize=10000)
+    return destino
+
+
+def crear_motor_origen(origen, workers=1):
+    """
+    Motor para el origen indicado:
+      - URL de SQLAlchemy (mssql+pyodbc://...): se usa tal cual, con un pool de 'workers'.
+      - Archivo SQLite con tablas CLIENTES y CIRCUITOS: se adjunta como RETENCION.
+      - Directorio con clientes.parquet y circuitos.parquet: se convierte a SQLite.
+    """
+    if '://' in origen:
+        if origen.startswith('sqlite'):
+            return create_engine(origen)
+        return create_engine(origen, pool_size=workers, max_overflow=0)
+
+    ruta = Path(origen)
+    if ruta.is_dir():
+        return motor_sqlite(parquet_a_sqlite(ruta), workers)
+    if ruta.is_file():
+        return motor_sqlite(ruta, workers)
+    raise ValueError(f'Origen no encontrado: {origen}')
+
+
+# -----------------------------------------------------------------
+# --- DATOS SINTÉTICOS ---
+# -----------------------------------------------------------------
+
+def datos_sinteticos(clientes, circuitos, semilla=0, huerfanos=0.0):
+    """
+    DataFrames (clientes, circuitos) con la forma de RETENCION.CLIENTES/CIRCUITOS.
+    'huerfanos' es la fracción de circuitos cuyo cliente_id no existe.
+    """
+    azar = np.random.default_rng(semilla)
+
+    def fechas(cantidad, dias):
+        # -- Mismo formato de texto que devuelve SQL Server ('YYYY-MM-DD HH:MM:SS')
+        dias = pd.to_timedelta(azar.integers(0, dias, cantidad), unit='D')
+        return (pd.Timestamp('2020-01-01') + dias).strftime('%Y-%m-%d %H:%M:%S')
+
+    ids_clientes = np.arange(1, clientes + 1)
+    df_clientes = pd.DataFrame({
+        'cliente_id': ids_clientes,
+        'ruc': (20000000000 + ids_clientes).astype(str),
+        'razon_social': [f'Cliente Sintético {i}' for i in ids_clientes],
+        'fecha_registro': fechas(clientes, 4 * 365),
+        'estado': np.where(azar.random(clientes) < 0.95, 'Activo', 'Inactivo'),
+    })
+
+    ids_circuitos = np.arange(1, circuitos + 1)
+    cliente_de_circuito = azar.integers(1, clientes + 1, circuitos)
+    # -- Un cliente_id inexistente pero contiguo, para no sesgar las particiones por rango
+    cliente_de_circuito[azar.random(circuitos) < huerfanos] = clientes + 1
+    df_circuitos = pd.DataFrame({
+        'circuito_id': ids_circuitos,
+        'cliente_id': cliente_de_circuito,
+        'nombre_circuito': [f'CIR-{i}' for i in ids_circuitos],
+        'tipo_servicio': azar.choice(TIPOS_SERVICIO, circuitos),
+        'estado': np.where(azar.random(circuitos) < 0.9, 'Activo', 'Inactivo'),
+        'renta_mensual': azar.uniform(50, 5000, circuitos).round(2),
+        'fecha_creacion': fechas(circuitos, 5 * 365),
+    })
+    return df_clientes, df_circuitos
+
+
+def escribir_origen_sqlite(ruta, df_clientes, df_circuitos):
+    """Crea (reemplazando) un archivo SQLite con el esquema del origen y los datos dados."""
+    ruta = Path(ruta)
+    ruta.unlink(missing_ok=True)
+    with sqlite3.connect(ruta) as conexion:
+        conexion.executescript(DDL_ORIGEN)
+        df_clientes.to_sql('CLIENTES', conexion, if_exists='append', index=False, chunksize=10000)
+        df_circuitos.to_sql('CIRCUITOS', conexion, if_exists='append', index=False, chunksize=10000)
+    return ruta
+
+
+def escribir_origen_parquet(directorio, df_clientes, df_circuitos):
+    """Escribe clientes.parquet y circuitos.parquet en el directorio. Requiere pyarrow."""
+    directorio = Path(directorio)
+    directorio.mkdir(parents=True, exist_ok=True)
+    try:
+        df_clientes.to_parquet(directorio / ARCHIVOS_PARQUET['CLIENTES'], index=False)
+        df_circuitos.to_parquet(directorio / ARCHIVOS_PARQUET['CIRCUITOS'], index=False)
+    except ImportError as e:
+        raise ValueError('Escribir Parquet requiere instalar pyarrow.') from e
+    return directorio
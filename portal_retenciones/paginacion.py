@@ -0,0 +1,73 @@
+# En: portal_retenciones/paginacion.py
+
+import base64
+import binascii
+from datetime import datetime
+
+from django.db.models import Q
+
+TAMANO_PAGINA = 25
+
+
+def codificar_cursor(fecha, pk):
+    """Codifica la posición (fecha, id) de una fila como un token opaco para la URL."""
+    valor = f"{fecha.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(valor.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Devuelve la tupla (fecha, id) de un cursor, o None si no es válido."""
+    if not cursor:
+        return None
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        fecha, pk = base64.urlsafe_b64decode(cursor + relleno).decode().split('|')
+        return datetime.fromisoformat(fecha), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+class PaginaKeyset:
+    """Una página de resultados con los cursores para navegar hacia adelante y atrás."""
+
+    def __init__(self, filas, campo, hay_siguiente, hay_anterior):
+        self.filas = filas
+        self.hay_siguiente = hay_siguiente and bool(filas)
+        self.hay_anterior = hay_anterior and bool(filas)
+        self.cursor_siguiente = (
+            codificar_cursor(getattr(filas[-1], campo), filas[-1].pk) if self.hay_siguiente else None
+        )
+        self.cursor_anterior = (
+            codificar_cursor(getattr(filas[0], campo), filas[0].pk) if self.hay_anterior else None
+        )
+
+
+def paginar_keyset(queryset, campo, despues=None, antes=None, tamano=TAMANO_PAGINA):
+    """
+    Paginación por búsqueda (seek) sobre el orden (campo DESC, id DESC).
+    En lugar de OFFSET, cada página parte de la última fila vista, por lo que
+    la página N cuesta lo mismo que la primera si existe un índice (campo, id).
+    """
+    if antes:
+        # -- Página anterior: se recorre el índice en sentido ascendente y se invierte
+        fecha, pk = antes
+        queryset = queryset.filter(
+            Q(**{f'{campo}__gte': fecha}),
+            Q(**{f'{campo}__gt': fecha}) | Q(id__gt=pk),
+        ).order_by(campo, 'id')
+        filas = list(queryset[:tamano + 1])
+        hay_anterior = len(filas) > tamano
+        filas = filas[:tamano][::-1]
+        return PaginaKeyset(filas, campo, hay_siguiente=True, hay_anterior=hay_anterior)
+
+    if despues:
+        # -- "campo <= x" permite el rango sobre el índice; el OR desempata por id
+        fecha, pk = despues
+        queryset = queryset.filter(
+            Q(**{f'{campo}__lte': fecha}),
+            Q(**{f'{campo}__lt': fecha}) | Q(id__lt=pk),
+        )
+
+    filas = list(queryset.order_by(f'-{campo}', '-id')[:tamano + 1])
+    hay_siguiente = len(filas) > tamano
+    return PaginaKeyset(filas[:tamano], campo, hay_siguiente=hay_siguiente, hay_anterior=despues is not None)
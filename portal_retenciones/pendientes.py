@@ -0,0 +1,60 @@
+# En: portal_retenciones/pendientes.py
+
+from django.core.cache import cache
+from django.db import transaction
+
+from portal_retenciones.models import CargaAnalista, CargaEjecutivo
+from portal_retenciones.permisos import permisos_de
+
+# -- Contador de solicitudes pendientes por persona: 'pendientes:ejecutivo:7'
+CLAVE_PENDIENTES = 'pendientes:{rol}:{id}'
+
+# -- Tope de vida en caché: acota cualquier lectura que se cuele entre el commit y el borrado
+PENDIENTES_TIMEOUT = 600
+
+MODELOS = {
+    'ejecutivo': (CargaEjecutivo, 'ejecutivo_id'),
+    'analista': (CargaAnalista, 'analista_id'),
+}
+
+
+def clave_pendientes(rol, persona_id):
+    return CLAVE_PENDIENTES.format(rol=rol, id=persona_id)
+
+
+def pendientes_de(rol, persona_id):
+    """
+    Solicitudes pendientes del ejecutivo o analista, leídas de la caché. Si no
+    están, se leen de CargaEjecutivo / CargaAnalista (sin contar Solicitud).
+    """
+    clave = clave_pendientes(rol, persona_id)
+    cantidad = cache.get(clave)
+    if cantidad is None:
+        modelo, campo = MODELOS[rol]
+        cantidad = modelo.objects.filter(**{campo: persona_id}).values_list(
+            'solicitudes_abiertas', flat=True
+        ).first() or 0
+        cache.set(clave, cantidad, PENDIENTES_TIMEOUT)
+    return cantidad
+
+
+def invalidar_pendientes(rol, persona_ids):
+    """Borra de la caché los contadores de esas personas tras el commit."""
+    claves = [clave_pendientes(rol, persona_id) for persona_id in persona_ids]
+    if claves:
+        transaction.on_commit(lambda: cache.delete_many(claves))
+
+
+def pendientes_usuario(request):
+    """Pendientes del usuario del request como ejecutivo y como analista (None si no lo es)."""
+    permisos = permisos_de(request)
+    return {
+        'ejecutivo': pendientes_de('ejecutivo', permisos.ejecutivo_id) if permisos.ejecutivo_id else None,
+        'analista': pendientes_de('analista', permisos.analista_id) if permisos.analista_id else None,
+    }
+
+
+def contexto_pendientes(request):
+    """Context processor: 'pendientes' para el aviso del menú lateral (solo caché y sesión)."""
+    por_rol = pendientes_usuario(request)
+    return {'pendientes': sum(cantidad or 0 for cantidad in por_rol.values())}
@@ -0,0 +1,107 @@
+# En: portal_retenciones/permisos.py
+
+from portal_retenciones import versiones
+from portal_retenciones.models import AnalistaRetencion, EjecutivoRetencion
+
+# -- Versión compartida (entre workers) de grupos y permisos; al cambiar, cada sesión recarga
+CLAVE_VERSION_PERMISOS = 'permisos:version'
+
+# -- Clave en request.session con los permisos y grupos ya resueltos
+CLAVE_SESION = 'permisos'
+
+APP = 'portal_retenciones'
+
+
+class PermisosUsuario:
+    """
+    Permisos ('app.codename') y grupos de un usuario, resueltos una vez por sesión,
+    junto con el ejecutivo y el analista vinculados a su cuenta (si los hay).
+    En plantillas: {% if permisos.can_view_menu %} (la app por defecto es portal_retenciones).
+    """
+
+    def __init__(self, permisos=(), grupos=(), superusuario=False, ejecutivo_id=None, analista_id=None):
+        self.permisos = frozenset(permisos)
+        self.grupos = tuple(grupos)
+        self.superusuario = superusuario
+        self.ejecutivo_id = ejecutivo_id
+        self.analista_id = analista_id
+
+    def tiene(self, permiso):
+        return self.superusuario or permiso in self.permisos
+
+    def en_grupo(self, nombre):
+        return nombre in self.grupos
+
+    @property
+    def grupo_principal(self):
+        return self.grupos[0] if self.grupos else None
+
+    def __getitem__(self, permiso):
+        return self.tiene(permiso if '.' in permiso else f'{APP}.{permiso}')
+
+
+def version_permisos():
+    return versiones.version(CLAVE_VERSION_PERMISOS)
+
+
+def cargar_permisos(usuario):
+    """
+    Consulta a la base de datos los permisos (propios y de grupos), los grupos
+    del usuario y los ids de EjecutivoRetencion / AnalistaRetencion vinculados.
+    """
+    return {
+        'permisos': sorted(usuario.get_all_permissions()),
+        'grupos': list(usuario.groups.order_by('id').values_list('name', flat=True)),
+        'ejecutivo_id': EjecutivoRetencion.objects.filter(usuario=usuario).values_list('id', flat=True).first(),
+        'analista_id': AnalistaRetencion.objects.filter(usuario=usuario).values_list('id', flat=True).first(),
+    }
+
+
+def permisos_de(request):
+    """
+    Permisos del usuario del request: se calculan una vez por request y se guardan
+    en la sesión junto con la versión compartida, así las páginas siguientes no
+    consultan grupos ni permisos hasta que alguno cambie.
+    """
+    if hasattr(request, '_permisos'):
+        return request._permisos
+
+    usuario = request.user
+    if not usuario.is_authenticated or not usuario.is_active:
+        request._permisos = PermisosUsuario()
+        return request._permisos
+
+    version = version_permisos()
+    datos = request.session.get(CLAVE_SESION)
+    if (
+        not datos
+        or datos.get('usuario') != usuario.pk
+        or datos.get('version') != version
+        or 'ejecutivo_id' not in datos
+    ):
+        datos = {'usuario': usuario.pk, 'version': version, **cargar_permisos(usuario)}
+        request.session[CLAVE_SESION] = datos
+
+    # -- is_superuser se lee del usuario ya cargado por la sesión: no necesita invalidación
+    request._permisos = PermisosUsuario(
+        datos['permisos'], datos['grupos'], usuario.is_superuser, datos['ejecutivo_id'], datos['analista_id']
+    )
+    return request._permisos
+
+
+def invalidar_permisos():
+    """
+    Marca grupos, permisos o vínculos de personal como modificados (todas las
+    sesiones recargan en su próximo request).
+    """
+    versiones.renovar_al_confirmar(CLAVE_VERSION_PERMISOS)
+
+
+def contexto_permisos(request):
+    """Context processor: 'permisos' y 'rol' para las plantillas, sin consultas extra."""
+    permisos = permisos_de(request)
+    if permisos.superusuario:
+        rol = 'Administrador'
+    else:
+        rol = permisos.grupo_principal or 'Estándar'
+    return {'permisos': permisos, 'rol': rol}
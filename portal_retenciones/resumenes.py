@@ -0,0 +1,141 @@
+# En: portal_retenciones/resumenes.py
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DateField, F
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from portal_retenciones.models import (
+    ResumenEjecutivo,
+    ResumenEstado,
+    ResumenMensual,
+    Solicitud,
+)
+
+
+def clave_mes(fecha):
+    """Primer día del mes de 'fecha', en la zona horaria activa (igual que TruncMonth)."""
+    return timezone.localtime(fecha).date().replace(day=1)
+
+
+def conteos_mensuales(desde=None):
+    """
+    Solicitudes creadas por mes, agrupadas con TruncMonth (portable entre SQLite y
+    SQL Server). Con 'desde' se filtra por rango sobre fecha_creacion, que usa el índice.
+    """
+    solicitudes = Solicitud.objects.all()
+    if desde is not None:
+        solicitudes = solicitudes.filter(fecha_creacion__gte=desde)
+    por_mes = solicitudes.annotate(
+        mes=TruncMonth('fecha_creacion', output_field=DateField())
+    ).values('mes').annotate(cantidad=Count('id')).order_by('mes')
+    return {item['mes']: item['cantidad'] for item in por_mes}
+
+
+def _sumar(modelo, delta, **clave):
+    """Suma 'delta' al contador identificado por 'clave', creando la fila si no existe."""
+    if not delta:
+        return
+    if modelo.objects.filter(**clave).update(cantidad=F('cantidad') + delta):
+        return
+    try:
+        with transaction.atomic():
+            modelo.objects.create(cantidad=delta, **clave)
+    except IntegrityError:
+        # -- Otra transacción creó la fila entre el UPDATE y el INSERT
+        modelo.objects.filter(**clave).update(cantidad=F('cantidad') + delta)
+
+
+# -----------------------------------------------------------------
+# --- MANTENIMIENTO INCREMENTAL ---
+# -----------------------------------------------------------------
+
+def registrar_creacion(solicitud, signo=1):
+    """Cuenta una solicitud nueva (o la descuenta con signo=-1 al eliminarla)."""
+    with transaction.atomic():
+        _sumar(ResumenEstado, signo, estado_id=solicitud.estado_actual_id)
+        _sumar(ResumenMensual, signo, mes=clave_mes(solicitud.fecha_creacion))
+        _sumar(ResumenEjecutivo, signo, ejecutivo_id=solicitud.ejecutivo_id)
+
+
+def registrar_eliminacion(solicitud):
+    registrar_creacion(solicitud, signo=-1)
+
+
+def registrar_transicion(estado_anterior_id, estado_nuevo_id, cantidad=1):
+    """Mueve 'cantidad' solicitudes de un estado a otro."""
+    if estado_anterior_id == estado_nuevo_id:
+        return
+    with transaction.atomic():
+        _sumar(ResumenEstado, -cantidad, estado_id=estado_anterior_id)
+        _sumar(ResumenEstado, cantidad, estado_id=estado_nuevo_id)
+
+
+def registrar_reasignacion(ejecutivo_anterior_id, ejecutivo_nuevo_id, cantidad=1):
+    """Mueve 'cantidad' solicitudes de un ejecutivo a otro."""
+    if ejecutivo_anterior_id == ejecutivo_nuevo_id:
+        return
+    with transaction.atomic():
+        _sumar(ResumenEjecutivo, -cantidad, ejecutivo_id=ejecutivo_anterior_id)
+        _sumar(ResumenEjecutivo, cantidad, ejecutivo_id=ejecutivo_nuevo_id)
+
+
+# -----------------------------------------------------------------
+# --- RECONSTRUCCIÓN Y VERIFICACIÓN ---
+# -----------------------------------------------------------------
+
+def conteos_reales():
+    """Recalcula los contadores recorriendo la tabla Solicitud (operación O(filas))."""
+    por_estado = Solicitud.objects.values('estado_actual').annotate(cantidad=Count('id'))
+    por_ejecutivo = Solicitud.objects.values('ejecutivo').annotate(cantidad=Count('id'))
+
+    return {
+        'estado': {item['estado_actual']: item['cantidad'] for item in por_estado},
+        'mes': conteos_mensuales(),
+        'ejecutivo': {item['ejecutivo']: item['cantidad'] for item in por_ejecutivo},
+    }
+
+
+def conteos_guardados():
+    return {
+        'estado': dict(ResumenEstado.objects.values_list('estado_id', 'cantidad')),
+        'mes': dict(ResumenMensual.objects.values_list('mes', 'cantidad')),
+        'ejecutivo': dict(ResumenEjecutivo.objects.values_list('ejecutivo_id', 'cantidad')),
+    }
+
+
+def verificar_resumenes():
+    """
+    Compara los contadores guardados con los reales.
+    Devuelve una lista de (tabla, clave, guardado, real) con las diferencias.
+    """
+    reales = conteos_reales()
+    guardados = conteos_guardados()
+    diferencias = []
+    for tabla, real in reales.items():
+        guardado = guardados[tabla]
+        for clave in sorted(set(real) | set(guardado), key=str):
+            if real.get(clave, 0) != guardado.get(clave, 0):
+                diferencias.append((tabla, clave, guardado.get(clave, 0), real.get(clave, 0)))
+    return diferencias
+
+
+@transaction.atomic
+def reconstruir_resumenes():
+    """Vacía y vuelve a poblar las tablas resumen desde cero."""
+    reales = conteos_reales()
+
+    ResumenEstado.objects.all().delete()
+    ResumenMensual.objects.all().delete()
+    ResumenEjecutivo.objects.all().delete()
+
+    ResumenEstado.objects.bulk_create(
+        ResumenEstado(estado_id=clave, cantidad=cantidad) for clave, cantidad in reales['estado'].items()
+    )
+    ResumenMensual.objects.bulk_create(
+        ResumenMensual(mes=clave, cantidad=cantidad) for clave, cantidad in reales['mes'].items()
+    )
+    ResumenEjecutivo.objects.bulk_create(
+        ResumenEjecutivo(ejecutivo_id=clave, cantidad=cantidad) for clave, cantidad in reales['ejecutivo'].items()
+    )
+    return reales
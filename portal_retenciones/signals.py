@@ -0,0 +1,132 @@
+# En: portal_retenciones/signals.py
+
+from contextlib import contextmanager
+
+from django.contrib.auth.models import Group, Permission, User
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from portal_retenciones import asignacion, resumenes
+from portal_retenciones.busqueda import invalidar_indice_clientes
+from portal_retenciones.catalogos import invalidar_catalogos
+from portal_retenciones.circuitos import invalidar_circuitos
+from portal_retenciones.metricas import invalidar_metricas_dashboard
+from portal_retenciones.permisos import invalidar_permisos
+from portal_retenciones.models import (
+    AnalistaRetencion,
+    Circuito,
+    Cliente,
+    EjecutivoRetencion,
+    EstadoAtencion,
+    HistorialAsignacion,
+    HistorialEstado,
+    NivelAprobacion,
+    Solicitud,
+)
+
+
+# -- Una solicitud nueva o eliminada cambia las tablas resumen y las métricas del dashboard
+@receiver(post_save, sender=Solicitud)
+def solicitud_guardada(sender, instance, created, **kwargs):
+    if created:
+        resumenes.registrar_creacion(instance)
+        asignacion.registrar_creacion(instance)
+        invalidar_metricas_dashboard()
+
+
+# -- Antes del borrado en cascada, para poder sumar la renta de sus circuitos
+@receiver(pre_delete, sender=Solicitud)
+def solicitud_por_eliminar(sender, instance, **kwargs):
+    asignacion.registrar_eliminacion(instance)
+
+
+@receiver(post_delete, sender=Solicitud)
+def solicitud_eliminada(sender, instance, **kwargs):
+    resumenes.registrar_eliminacion(instance)
+    invalidar_metricas_dashboard()
+
+
+# -- Cada transición registrada en el historial mueve el contador de estados
+# -- (y la carga del ejecutivo si la solicitud se cierra o se reabre)
+@receiver(post_save, sender=HistorialEstado)
+def historial_estado_registrado(sender, instance, created, **kwargs):
+    if created:
+        resumenes.registrar_transicion(instance.estado_anterior_id, instance.estado_nuevo_id)
+        asignacion.registrar_transicion(instance.solicitud, instance.estado_anterior_id, instance.estado_nuevo_id)
+
+
+# -- Cada reasignación registrada mueve el contador y la carga de los ejecutivos
+@receiver(post_save, sender=HistorialAsignacion)
+def historial_asignacion_registrado(sender, instance, created, **kwargs):
+    if created:
+        resumenes.registrar_reasignacion(instance.ejecutivo_anterior_id, instance.ejecutivo_nuevo_id)
+        asignacion.registrar_reasignacion(
+            instance.solicitud, instance.ejecutivo_anterior_id, instance.ejecutivo_nuevo_id
+        )
+
+
+# -- Un cliente nuevo, modificado o eliminado invalida el índice de búsqueda en memoria
+@receiver(post_save, sender=Cliente)
+@receiver(post_delete, sender=Cliente)
+def cliente_modificado(sender, **kwargs):
+    invalidar_indice_clientes()
+
+
+# -- Un estado o nivel de aprobación modificado recarga los catálogos en memoria de los workers
+@receiver(post_save, sender=EstadoAtencion)
+@receiver(post_delete, sender=EstadoAtencion)
+@receiver(post_save, sender=NivelAprobacion)
+@receiver(post_delete, sender=NivelAprobacion)
+def catalogo_modificado(sender, **kwargs):
+    invalidar_catalogos()
+
+
+# -- Un circuito modificado invalida las listas cacheadas (y los ETag) de circuitos
+@receiver(post_save, sender=Circuito)
+@receiver(post_delete, sender=Circuito)
+def circuito_modificado(sender, **kwargs):
+    invalidar_circuitos()
+
+
+# -- Cambios de grupos o permisos: cada sesión vuelve a resolver los suyos
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=Group.permissions.through)
+def permisos_modificados(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidar_permisos()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=Permission)
+def grupo_o_permiso_modificado(sender, **kwargs):
+    invalidar_permisos()
+
+
+# -- La sesión guarda el ejecutivo / analista vinculado a la cuenta: un cambio de vínculo la recarga
+@receiver(post_save, sender=EjecutivoRetencion)
+@receiver(post_delete, sender=EjecutivoRetencion)
+@receiver(post_save, sender=AnalistaRetencion)
+@receiver(post_delete, sender=AnalistaRetencion)
+def personal_modificado(sender, **kwargs):
+    invalidar_permisos()
+
+
+@contextmanager
+def carga_masiva():
+    """
+    Desconecta las invalidaciones fila a fila de Cliente y Circuito durante una
+    carga masiva (así un delete() no recorre cada circuito). Quien la usa debe
+    llamar a invalidar_indice_clientes() e invalidar_circuitos() al terminar.
+    """
+    receptores = [(cliente_modificado, Cliente), (circuito_modificado, Circuito)]
+    for receptor, modelo in receptores:
+        post_save.disconnect(receptor, sender=modelo)
+        post_delete.disconnect(receptor, sender=modelo)
+    try:
+        yield
+    finally:
+        for receptor, modelo in receptores:
+            post_save.connect(receptor, sender=modelo)
+            post_delete.connect(receptor, sender=modelo)
@@ -0,0 +1,135 @@
+# En: portal_retenciones/solicitudes.py
+
+from datetime import date
+from decimal import Decimal
+
+from django.db import transaction
+
+from portal_retenciones import catalogos
+from portal_retenciones.asignacion import TAMANO_LOTE, elegir_ejecutivo, lotes, registrar_circuitos
+from portal_retenciones.models import (
+    AnalistaRetencion,
+    Circuito,
+    Cliente,
+    HistorialAsignacion,
+    HistorialEstado,
+    Solicitud,
+    SolicitudCircuito,
+)
+
+# -- Estado con el que nace toda solicitud
+ESTADO_INICIAL = 'Registrado'
+
+
+class SolicitudInvalida(Exception):
+    """Los datos enviados no permiten crear la solicitud (el mensaje se muestra al usuario)."""
+
+
+def nombre_usuario(usuario):
+    return f"{usuario.first_name} {usuario.last_name}".strip() or usuario.username
+
+
+def leer_solicitud(post):
+    """Normaliza el POST del formulario de nueva solicitud."""
+    try:
+        cliente_id = int(post.get('cliente_id') or '')
+    except ValueError:
+        raise SolicitudInvalida('Debe seleccionar un cliente de la búsqueda.')
+    try:
+        circuitos = sorted({int(valor) for valor in post.getlist('circuitos_seleccionados')})
+    except ValueError:
+        raise SolicitudInvalida('La selección de circuitos no es válida.')
+    if not circuitos:
+        raise SolicitudInvalida('Debe seleccionar al menos un circuito.')
+    try:
+        fecha_baja = date.fromisoformat(post.get('fecha_solicitud_baja') or '')
+    except ValueError:
+        raise SolicitudInvalida('La fecha de solicitud de baja no es válida.')
+
+    return {
+        'cliente_id': cliente_id,
+        'circuitos': circuitos,
+        'descripcion': (post.get('observaciones') or '').strip() or None,
+        'fecha_solicitud_baja': fecha_baja,
+    }
+
+
+def rentas_de_circuitos(cliente_id, circuito_ids):
+    """
+    {circuito_id: renta_mensual} de los circuitos que pertenecen al cliente,
+    en una consulta por cada TAMANO_LOTE ids (una sola en la práctica).
+    """
+    rentas = {}
+    for lote in lotes(circuito_ids):
+        rentas.update(
+            Circuito.objects.filter(cliente_id=cliente_id, id__in=lote).values_list('id', 'renta_mensual')
+        )
+    return rentas
+
+
+def siguiente_analista():
+    """Analista activo siguiente (por id) al de la última solicitud creada."""
+    ultimo_id = Solicitud.objects.order_by('-id').values_list('analista_id', flat=True).first() or 0
+    analistas = AnalistaRetencion.objects.filter(activo=True).order_by('id').values_list('id', flat=True)
+    analista_id = analistas.filter(id__gt=ultimo_id).first() or analistas.first()
+    if analista_id is None:
+        raise SolicitudInvalida('No hay analistas activos para atender la solicitud.')
+    return analista_id
+
+
+def crear_solicitud(datos, usuario):
+    """
+    Crea la solicitud en una sola transacción: valida los circuitos, elige el
+    ejecutivo por turno y carga, inserta todas las filas de SolicitudCircuito con
+    un bulk_create y registra el historial inicial de estado y de asignación.
+    El número de consultas no depende de cuántos circuitos se seleccionen.
+    """
+    with transaction.atomic():
+        if not Cliente.objects.filter(id=datos['cliente_id']).exists():
+            raise SolicitudInvalida('El cliente seleccionado no existe.')
+
+        rentas = rentas_de_circuitos(datos['cliente_id'], datos['circuitos'])
+        ajenos = [circuito_id for circuito_id in datos['circuitos'] if circuito_id not in rentas]
+        if ajenos:
+            raise SolicitudInvalida(f'Circuitos que no pertenecen al cliente: {ajenos[:10]}')
+
+        estado = catalogos.estado_por_nombre(ESTADO_INICIAL)
+        nivel = catalogos.nivel_inicial()
+        if estado is None or nivel is None:
+            raise SolicitudInvalida('Faltan los catálogos de estados o niveles de aprobación.')
+
+        renta = sum(rentas.values(), Decimal('0'))
+        ejecutivo_id = elegir_ejecutivo(renta)
+
+        solicitud = Solicitud.objects.create(
+            cliente_id=datos['cliente_id'],
+            ejecutivo_id=ejecutivo_id,
+            analista_id=siguiente_analista(),
+            estado_actual=estado,
+            nivel_aprobacion=nivel,
+            descripcion=datos['descripcion'],
+            fecha_solicitud_baja=datos['fecha_solicitud_baja'],
+            asignado_automaticamente=True,
+            usuario_creador=usuario,
+        )
+        # -- bulk_create no dispara señales: la renta se suma a la carga explícitamente
+        SolicitudCircuito.objects.bulk_create(
+            (SolicitudCircuito(solicitud=solicitud, circuito_id=circuito_id) for circuito_id in datos['circuitos']),
+            batch_size=TAMANO_LOTE,
+        )
+        registrar_circuitos(solicitud, renta)
+
+        # -- Historial inicial: mismo estado y ejecutivo a ambos lados, no mueve contadores
+        HistorialEstado.objects.create(
+            solicitud=solicitud,
+            estado_anterior=estado,
+            estado_nuevo=estado,
+            usuario_cambio=nombre_usuario(usuario),
+        )
+        HistorialAsignacion.objects.create(
+            solicitud=solicitud,
+            ejecutivo_anterior_id=ejecutivo_id,
+            ejecutivo_nuevo_id=ejecutivo_id,
+            motivo='Asignación automática al crear la solicitud',
+        )
+    return solicitud
@@ -1,3 +1,1343 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth.models import Group, Permission, User
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from openpyxl import load_workbook
+
+from portal_retenciones.asignacion import (
+    SinEjecutivoDisponible,
+    asignar_automaticamente,
+    elegir_ejecutivo,
+    rebalancear,
+    reconstruir_cargas,
+    reconstruir_cargas_analista,
+    registrar_circuitos,
+    verificar_cargas,
+    verificar_cargas_analista,
+)
+from portal_retenciones.models import (
+    AnalistaRetencion,
+    CargaAnalista,
+    CargaEjecutivo,
+    Circuito,
+    ClaveOrigenStaging,
+    Cliente,
+    ClienteStaging,
+    Comentario,
+    EjecutivoRetencion,
+    EstadoAtencion,
+    HistorialAsignacion,
+    HistorialEstado,
+    MarcaSincronizacion,
+    NivelAprobacion,
+    Solicitud,
+    SolicitudCircuito,
+    Trabajo,
+)
+from portal_retenciones import catalogos
+from portal_retenciones.busqueda import IndiceClientes, clave_cache_busqueda, invalidar_indice_clientes
+from portal_retenciones.catalogos import invalidar_catalogos
+from portal_retenciones.estados import cambiar_estado
+from portal_retenciones.metricas import serie_mensual
+from portal_retenciones.origen import DDL_ORIGEN
+from portal_retenciones.paginacion import decodificar_cursor, paginar_keyset
+from portal_retenciones.permisos import CLAVE_VERSION_PERMISOS, invalidar_permisos
+from portal_retenciones.resumenes import (
+    conteos_guardados,
+    conteos_reales,
+    reconstruir_resumenes,
+    verificar_resumenes,
+)
+from portal_retenciones.trabajos import (
+    TAREAS,
+    TrabajoInvalido,
+    ejecutar,
+    encolar,
+    latiendo,
+    limpiar_exportaciones,
+    recuperar_colgados,
+    renovar_latido,
+    tomar_siguiente,
+)
+from portal_retenciones.versiones import ALIAS_VERSIONES
+
+
+# -- Cachés en memoria: las pruebas no deben leer ni vaciar la caché en disco del proyecto
+CACHES_PRUEBAS = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'pruebas'},
+    'versiones': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'pruebas-versiones'},
+}
+
+
+# -- Datos base compartidos por las pruebas
+@override_settings(CACHES=CACHES_PRUEBAS)
+class PortalTestCase(TestCase):
+
+    PERMISOS = [
+        'can_view_menu',
+        'can_create_solicitud',
+        'can_view_solicitud_list',
+        'can_view_personal',
+        'can_change_estado_masivo',
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.estados = {
+            nombre: EstadoAtencion.objects.create(nombre_estado=nombre)
+            for nombre in ['Registrado', 'En Análisis', 'Aprobado', 'Rechazado', 'Baja Ejecutada']
+        }
+        cls.nivel = NivelAprobacion.objects.create(nombre_nivel='Nivel 1 - Ejecutivo', orden=1)
+        cls.ejecutivo = EjecutivoRetencion.objects.create(nombre='Ejecutivo Uno', email='ej1@test.pe')
+        cls.otro_ejecutivo = EjecutivoRetencion.objects.create(nombre='Ejecutivo Dos', email='ej2@test.pe')
+        cls.analista = AnalistaRetencion.objects.create(nombre='Analista Uno', email='an1@test.pe')
+        cls.cliente = Cliente.objects.create(ruc='20100000001', razon_social='Telefónica del Perú')
+        cls.otro_cliente = Cliente.objects.create(ruc='20500000002', razon_social='Minera Andina')
+
+        cls.usuario = User.objects.create_user('ejecutivo', password='clave-segura-123')
+        cls.usuario.user_permissions.set(
+            Permission.objects.filter(codename__in=cls.PERMISOS)
+        )
+
+    def setUp(self):
+        for alias in CACHES_PRUEBAS:
+            caches[alias].clear()
+        invalidar_indice_clientes()
+        invalidar_catalogos()
+        self.client.force_login(self.usuario)
+
+    def crear_solicitud(self, cliente=None, ejecutivo=None, estado='Registrado', **kwargs):
+        return Solicitud.objects.create(
+            cliente=cliente or self.cliente,
+            ejecutivo=ejecutivo or self.ejecutivo,
+            analista=self.analista,
+            estado_actual=self.estados[estado],
+            nivel_aprobacion=self.nivel,
+            usuario_creador=self.usuario,
+            **kwargs
+        )
+
+    def asociar(self, solicitud, *rentas):
+        # -- Circuitos nuevos asociados con bulk_create, como en el flujo real
+        circuitos = [
+            Circuito.objects.create(cliente=solicitud.cliente, nombre_circuito=f'CIR-{i}', renta_mensual=renta)
+            for i, renta in enumerate(rentas)
+        ]
+        SolicitudCircuito.objects.bulk_create(
+            SolicitudCircuito(solicitud=solicitud, circuito=circuito) for circuito in circuitos
+        )
+        registrar_circuitos(solicitud, sum((Decimal(renta) for renta in rentas), Decimal('0')))
+
+    def carga(self, ejecutivo):
+        carga = CargaEjecutivo.objects.get(ejecutivo=ejecutivo)
+        return carga.solicitudes_abiertas, carga.renta_abierta
+
+
+class ListaSolicitudesTests(PortalTestCase):
+
+    def test_paginacion_keyset_recorre_todas_las_filas_sin_repetir(self):
+        creadas = [self.crear_solicitud() for _ in range(7)]
+        # -- Misma fecha de creación para forzar el desempate por id
+        Solicitud.objects.update(fecha_creacion=timezone.now())
+
+        vistos = []
+        pagina = paginar_keyset(Solicitud.objects.all(), 'fecha_creacion', tamano=3)
+        vistos.extend(pagina.filas)
+        while pagina.hay_siguiente:
+            pagina = paginar_keyset(
+                Solicitud.objects.all(), 'fecha_creacion',
+                despues=decodificar_cursor(pagina.cursor_siguiente), tamano=3,
+            )
+            vistos.extend(pagina.filas)
+
+        self.assertEqual([s.id for s in vistos], sorted((s.id for s in creadas), reverse=True))
+
+        # -- Volver hacia atrás desde la última página devuelve la página previa
+        anterior = paginar_keyset(
+            Solicitud.objects.all(), 'fecha_creacion',
+            antes=decodificar_cursor(pagina.cursor_anterior), tamano=3,
+        )
+        self.assertEqual([s.id for s in anterior.filas], [s.id for s in vistos[3:6]])
+
+    def test_cursor_invalido_se_ignora(self):
+        self.assertIsNone(decodificar_cursor('no-es-un-cursor'))
+        self.crear_solicitud()
+        response = self.client.get(reverse('lista_solicitudes'), {'despues': '%%%'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['solicitudes']), 1)
+
+    def test_filtros_del_servidor(self):
+        hoy = date.today()
+        esperada = self.crear_solicitud(
+            ejecutivo=self.otro_ejecutivo, estado='Aprobado', fecha_solicitud_baja=hoy,
+        )
+        self.crear_solicitud(estado='Aprobado', fecha_solicitud_baja=hoy)
+        self.crear_solicitud(ejecutivo=self.otro_ejecutivo, fecha_solicitud_baja=hoy)
+        self.crear_solicitud(
+            ejecutivo=self.otro_ejecutivo, estado='Aprobado',
+            fecha_solicitud_baja=hoy - timedelta(days=30),
+        )
+
+        response = self.client.get(reverse('lista_solicitudes'), {
+            'campo_fecha': 'baja',
+            'fecha_desde': (hoy - timedelta(days=1)).isoformat(),
+            'estado': self.estados['Aprobado'].id,
+            'ejecutivo': self.otro_ejecutivo.id,
+            'cliente': '20100',
+        })
+        self.assertEqual([s.id for s in response.context['solicitudes']], [esperada.id])
+
+        response = self.client.get(reverse('lista_solicitudes'), {'cliente': 'minera'})
+        self.assertEqual(list(response.context['solicitudes']), [])
+
+
+# -- Presupuesto de consultas: falla si una vista supera su máximo de queries
+class QueryBudgetMixin:
+
+    def assertQueryBudget(self, presupuesto, url):
+        """Hace GET a la url y verifica que no se excedan 'presupuesto' consultas SQL."""
+        with CaptureQueriesContext(connection) as contexto:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        ejecutadas = len(contexto.captured_queries)
+        if ejecutadas > presupuesto:
+            detalle = '\n'.join(q['sql'] for q in contexto.captured_queries)
+            self.fail(
+                f"{url} ejecutó {ejecutadas} consultas (presupuesto: {presupuesto}):\n{detalle}"
+            )
+        return ejecutadas
+
+
+class PresupuestoConsultasTests(QueryBudgetMixin, PortalTestCase):
+
+    # -- Incluye sesión y usuario (2) más las consultas de cada vista; permisos, grupos
+    #    y catálogos ya están resueltos en la sesión y en memoria por el request de setUp.
+    #    El detalle lee la primera página de la línea de tiempo con una consulta por fuente.
+    PRESUPUESTO_LISTA = 4
+    PRESUPUESTO_DETALLE = 7
+    PRESUPUESTO_DASHBOARD = 6
+
+    def setUp(self):
+        super().setUp()
+        self.client.get(reverse('menu'))
+        catalogos.estados()
+
+    def poblar(self, cantidad):
+        for i in range(cantidad):
+            solicitud = self.crear_solicitud(
+                ejecutivo=self.ejecutivo if i % 2 else self.otro_ejecutivo,
+                fecha_solicitud_baja=date.today(),
+            )
+            circuito = Circuito.objects.create(
+                cliente=self.cliente, nombre_circuito=f'CIR-{i}', renta_mensual=100,
+            )
+            SolicitudCircuito.objects.create(solicitud=solicitud, circuito=circuito)
+        return solicitud
+
+    def test_lista_solicitudes_no_depende_del_numero_de_filas(self):
+        self.poblar(2)
+        pocas = self.assertQueryBudget(self.PRESUPUESTO_LISTA, reverse('lista_solicitudes'))
+        self.poblar(20)
+        muchas = self.assertQueryBudget(self.PRESUPUESTO_LISTA, reverse('lista_solicitudes'))
+        self.assertEqual(pocas, muchas)
+
+    def test_detalle_no_depende_del_historial(self):
+        solicitud = self.poblar(1)
+        url = reverse('solicitud_detalle', args=[solicitud.id])
+        pocas = self.assertQueryBudget(self.PRESUPUESTO_DETALLE, url)
+
+        for i in range(15):
+            circuito = Circuito.objects.create(
+                cliente=self.cliente, nombre_circuito=f'EXTRA-{i}', renta_mensual=50,
+            )
+            SolicitudCircuito.objects.create(solicitud=solicitud, circuito=circuito)
+            Comentario.objects.create(solicitud=solicitud, usuario='tester', comentario=f'nota {i}')
+            HistorialEstado.objects.create(
+                solicitud=solicitud,
+                estado_anterior=self.estados['Registrado'],
+                estado_nuevo=self.estados['En Análisis'],
+                usuario_cambio='tester',
+            )
+        muchas = self.assertQueryBudget(self.PRESUPUESTO_DETALLE, url)
+        self.assertEqual(pocas, muchas)
+
+    def test_dashboard_dentro_del_presupuesto(self):
+        self.poblar(2)
+        pocas = self.assertQueryBudget(self.PRESUPUESTO_DASHBOARD, reverse('dashboard'))
+        self.poblar(20)
+        cache.clear()
+        muchas = self.assertQueryBudget(self.PRESUPUESTO_DASHBOARD, reverse('dashboard'))
+        self.assertEqual(pocas, muchas)
+
+
+class DashboardTests(QueryBudgetMixin, PortalTestCase):
+
+    def test_metricas_desde_las_tablas_resumen(self):
+        self.crear_solicitud()
+        self.crear_solicitud(estado='En Análisis')
+        self.crear_solicitud(estado='Aprobado')
+        self.crear_solicitud(estado='Rechazado')
+
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.context['total_solicitudes'], 4)
+        self.assertEqual(response.context['solicitudes_pendientes'], 2)
+        self.assertEqual(response.context['solicitudes_resueltas'], 2)
+        self.assertEqual(response.context['porcentaje_cierre'], 50.0)
+
+    def test_foto_en_cache_e_invalidacion_al_cambiar_estado(self):
+        solicitud = self.crear_solicitud(estado='En Análisis')
+        self.client.get(reverse('dashboard'))
+
+        # -- Con la foto en caché solo quedan la sesión y el usuario (los permisos viven en la sesión)
+        self.assertQueryBudget(2, reverse('dashboard'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('procesar_accion_solicitud', args=[solicitud.id]),
+                {'accion': 'cambiar_estado', 'nuevo_estado': self.estados['Aprobado'].id},
+            )
+
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.context['solicitudes_pendientes'], 0)
+        self.assertEqual(response.context['porcentaje_cierre'], 100.0)
+
+    def test_reasignacion_automatica_actualiza_la_foto(self):
+        solicitud = self.crear_solicitud()
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(json.loads(response.context['ejecutivos_labels']), [self.ejecutivo.nombre])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            asignar_automaticamente(solicitud, excluir=[self.ejecutivo.id])
+
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(json.loads(response.context['ejecutivos_labels']), [self.otro_ejecutivo.nombre])
+        self.assertEqual(json.loads(response.context['ejecutivos_valores']), [1])
+
+    def test_serie_mensual_completa_meses_vacios(self):
+        ahora = timezone.now()
+        self.crear_solicitud()
+        antigua = self.crear_solicitud()
+        Solicitud.objects.filter(id=antigua.id).update(fecha_creacion=ahora - timedelta(days=65))
+        call_command('reconstruir_resumenes', stdout=StringIO())
+
+        etiquetas, valores = serie_mensual(4)
+        self.assertEqual(len(etiquetas), 4)
+        self.assertEqual(etiquetas[-1], ahora.strftime('%Y-%m'))
+        self.assertEqual(sum(valores), 2)
+        self.assertEqual(valores[-1], 1)
+        self.assertIn(0, valores)
+
+
+class TablasResumenTests(PortalTestCase):
+
+    def test_contadores_siguen_creacion_transicion_y_reasignacion(self):
+        solicitud = self.crear_solicitud()
+        self.crear_solicitud(ejecutivo=self.otro_ejecutivo)
+
+        HistorialEstado.objects.create(
+            solicitud=solicitud,
+            estado_anterior=self.estados['Registrado'],
+            estado_nuevo=self.estados['En Análisis'],
+            usuario_cambio='tester',
+        )
+        Solicitud.objects.filter(id=solicitud.id).update(estado_actual=self.estados['En Análisis'])
+
+        HistorialAsignacion.objects.create(
+            solicitud=solicitud,
+            ejecutivo_anterior=self.ejecutivo,
+            ejecutivo_nuevo=self.otro_ejecutivo,
+        )
+        Solicitud.objects.filter(id=solicitud.id).update(ejecutivo=self.otro_ejecutivo)
+
+        self.assertEqual(verificar_resumenes(), [])
+        self.assertEqual(conteos_guardados()['ejecutivo'][self.otro_ejecutivo.id], 2)
+
+        solicitud.refresh_from_db()
+        solicitud.delete()
+        self.assertEqual(verificar_resumenes(), [])
+
+    def test_comando_detecta_y_corrige_desvios(self):
+        self.crear_solicitud()
+        # -- Un cambio directo (sin historial) desvía los contadores
+        Solicitud.objects.update(estado_actual=self.estados['Aprobado'])
+
+        with self.assertRaises(CommandError):
+            call_command('reconstruir_resumenes', verificar=True, stdout=StringIO())
+
+        call_command('reconstruir_resumenes', stdout=StringIO())
+        self.assertEqual(conteos_guardados(), conteos_reales())
+
+
+class BusquedaClientesTests(PortalTestCase):
+
+    def buscar(self, texto):
+        response = self.client.get(reverse('search_clientes'), {'q': texto})
+        return [c['id'] for c in response.json()['clientes']]
+
+    def test_busca_por_prefijo_de_palabra_sin_tildes(self):
+        self.assertEqual(self.buscar('telefonica'), [self.cliente.id])
+        self.assertEqual(self.buscar('per tele'), [self.cliente.id])
+        self.assertEqual(self.buscar('andina'), [self.otro_cliente.id])
+
+    def test_busca_por_prefijo_de_ruc(self):
+        self.assertEqual(self.buscar('2050'), [self.otro_cliente.id])
+        self.assertEqual(self.buscar('999'), [])
+
+    @override_settings(BUSQUEDA_CLIENTES_MEMORIA=True)
+    def test_indice_se_mantiene_sincronizado(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            nuevo = Cliente.objects.create(ruc='20600000003', razon_social='Telecable Norte')
+        self.assertEqual(set(self.buscar('tele')), {self.cliente.id, nuevo.id})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            nuevo.razon_social = 'Cable Norte'
+            nuevo.save()
+        self.assertEqual(self.buscar('tele'), [self.cliente.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cliente.delete()
+        self.assertEqual(self.buscar('tele'), [])
+
+    @override_settings(BUSQUEDA_CLIENTES_MEMORIA=True)
+    def test_misma_busqueda_con_indice_en_memoria(self):
+        self.assertEqual(self.buscar('telefonica'), [self.cliente.id])
+        self.assertEqual(self.buscar('2050'), [self.otro_cliente.id])
+
+    def test_respuesta_cacheada_por_consulta_normalizada(self):
+        self.buscar('Telefónica')
+        with CaptureQueriesContext(connection) as contexto:
+            self.assertEqual(self.buscar('TELEFONICA'), [self.cliente.id])
+        consultas_busqueda = [
+            q for q in contexto.captured_queries if 'portal_retenciones_cliente' in q['sql']
+        ]
+        self.assertEqual(consultas_busqueda, [])
+
+    @override_settings(BUSQUEDA_CLIENTES_MEMORIA=True)
+    def test_indice_en_memoria_no_cachea_respuestas(self):
+        self.assertEqual(self.buscar('telefonica'), [self.cliente.id])
+        self.assertIsNone(cache.get(clave_cache_busqueda('telefonica')))
+
+    def test_indice_en_memoria(self):
+        indice = IndiceClientes([
+            (1, 'Telefónica del Perú S.A.A.', '20100017491'),
+            (2, 'Hotel Telesforo', '20200000001'),
+            (3, 'Telecable S.A.', '20300000001'),
+        ], version=1)
+        self.assertEqual([c[0] for c in indice.buscar('tel')], [3, 1, 2])
+        self.assertEqual([c[0] for c in indice.buscar('tel peru')], [1])
+        self.assertEqual([c[0] for c in indice.buscar('2010')], [1])
+        self.assertEqual(indice.buscar('xyz'), [])
+
+
+class CircuitosPorClienteTests(PortalTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for i in range(3):
+            Circuito.objects.create(
+                cliente=self.cliente, nombre_circuito=f'CIR-{i}', tipo_servicio='DATOS', renta_mensual=100 + i,
+            )
+        self.url = reverse('get_circuitos_por_cliente', args=[self.cliente.id])
+
+    def test_cliente_inexistente_devuelve_404(self):
+        response = self.client.get(reverse('get_circuitos_por_cliente', args=[999999]))
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('error', response.json())
+
+    def test_cliente_sin_circuitos(self):
+        response = self.client.get(reverse('get_circuitos_por_cliente', args=[self.otro_cliente.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'circuitos': []})
+
+    def test_etag_y_304(self):
+        response = self.client.get(self.url)
+        self.assertEqual(len(response.json()['circuitos']), 3)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # -- Cambiar la renta de un circuito invalida el ETag
+        with self.captureOnCommitCallbacks(execute=True):
+            circuito = Circuito.objects.filter(cliente=self.cliente).first()
+            circuito.renta_mensual = 999
+            circuito.save()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('999.00', [c['renta_mensual'] for c in response.json()['circuitos']])
+
+    def test_lote_filtrado_paginado_y_con_totales(self):
+        Circuito.objects.create(
+            cliente=self.otro_cliente, nombre_circuito='MIN-1', tipo_servicio='INTERNET', renta_mensual=50,
+        )
+        Circuito.objects.create(
+            cliente=self.otro_cliente, nombre_circuito='MIN-2', tipo_servicio='INTERNET', renta_mensual=70,
+            estado='Inactivo',
+        )
+        url = reverse('get_circuitos')
+
+        datos = self.client.get(url, {'cliente_id': f'{self.cliente.id},{self.otro_cliente.id}', 'tamano': 2}).json()
+        self.assertEqual(len(datos['circuitos']), 2)
+        self.assertEqual(datos['totales']['cantidad'], 5)
+        self.assertEqual(datos['totales']['renta_mensual'], '423.00')
+        self.assertEqual(
+            [(t['tipo_servicio'], t['cantidad'], t['renta_mensual']) for t in datos['totales']['por_tipo_servicio']],
+            [('DATOS', 3, '303.00'), ('INTERNET', 2, '120.00')],
+        )
+
+        vistos = [c['id'] for c in datos['circuitos']]
+        while datos['siguiente']:
+            datos = self.client.get(url, {
+                'cliente_id': [self.cliente.id, self.otro_cliente.id], 'tamano': 2, 'despues': datos['siguiente'],
+            }).json()
+            vistos.extend(c['id'] for c in datos['circuitos'])
+        self.assertEqual(len(set(vistos)), 5)
+
+        datos = self.client.get(url, {
+            'cliente_id': self.otro_cliente.id, 'q': 'min', 'estado': 'Activo',
+        }).json()
+        self.assertEqual([c['nombre_circuito'] for c in datos['circuitos']], ['MIN-1'])
+        self.assertEqual(datos['totales']['cantidad'], 1)
+
+        self.assertEqual(self.client.get(url).status_code, 400)
+
+    def test_lote_requiere_sesion_y_permiso(self):
+        url = reverse('get_circuitos')
+        self.client.logout()
+        self.assertEqual(self.client.get(url, {'cliente_id': self.cliente.id}).status_code, 403)
+
+
+class CatalogosTests(PortalTestCase):
+
+    def test_busquedas_sin_consultas_tras_la_primera_carga(self):
+        catalogos.estados()
+        with self.assertNumQueries(0):
+            self.assertEqual(catalogos.estado_por_nombre('Aprobado'), self.estados['Aprobado'])
+            self.assertEqual(catalogos.estado_por_id(self.estados['Rechazado'].id).nombre_estado, 'Rechazado')
+            self.assertEqual(
+                catalogos.ids_estados(['Registrado', 'Inexistente']), {self.estados['Registrado'].id}
+            )
+            self.assertEqual(catalogos.nivel_inicial(), self.nivel)
+
+    def test_se_recarga_al_modificar_un_estado(self):
+        catalogos.estados()
+        with self.captureOnCommitCallbacks(execute=True):
+            EstadoAtencion.objects.create(nombre_estado='Observado')
+        self.assertIsNotNone(catalogos.estado_por_nombre('Observado'))
+
+        # -- Otro worker solo ve el cambio de versión compartida
+        catalogos._catalogos_revisado = 0
+        catalogos._catalogos = catalogos.Catalogos([], [], version=0)
+        self.assertIsNotNone(catalogos.estado_por_nombre('Observado'))
+
+    def test_lista_y_detalle_sin_join_de_estados(self):
+        solicitud = self.crear_solicitud(estado='En Análisis')
+        catalogos.estados()
+        for url in [reverse('lista_solicitudes'), reverse('solicitud_detalle', args=[solicitud.id])]:
+            with CaptureQueriesContext(connection) as consultas:
+                respuesta = self.client.get(url)
+            self.assertContains(respuesta, 'En Análisis')
+            self.assertFalse(
+                any('portal_retenciones_estadoatencion' in consulta['sql'] for consulta in consultas.captured_queries)
+            )
+
+
+class PermisosTests(PortalTestCase):
+
+    def test_permisos_y_grupos_se_resuelven_una_vez_por_sesion(self):
+        self.client.get(reverse('menu'))
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(reverse('menu'))
+        self.assertFalse(any('auth_permission' in q['sql'] or 'auth_group' in q['sql'] for q in consultas.captured_queries))
+        self.assertContains(respuesta, reverse('nueva_solicitud'))
+        self.assertNotContains(respuesta, reverse('gestion_personal'))
+        self.assertEqual(respuesta.context['rol'], 'Estándar')
+
+    def test_cambio_de_grupo_o_permiso_invalida_la_sesion(self):
+        url = reverse('rebalancear_ejecutivos')
+        self.assertNotContains(self.client.get(reverse('menu')), reverse('gestion_personal'))
+        self.assertEqual(self.client.post(url, {'ejecutivo': self.ejecutivo.id}).status_code, 403)
+
+        grupo = Group.objects.create(name='Ejecutivo Retencion')
+        with self.captureOnCommitCallbacks(execute=True):
+            grupo.permissions.add(Permission.objects.get(codename='can_manage_personnel'))
+            self.usuario.groups.add(grupo)
+
+        respuesta = self.client.get(reverse('menu'))
+        self.assertContains(respuesta, reverse('gestion_personal'))
+        self.assertEqual(respuesta.context['rol'], 'Ejecutivo Retencion')
+        self.assertEqual(self.client.post(url, {'ejecutivo': self.ejecutivo.id}).status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.usuario.groups.remove(grupo)
+        self.assertEqual(self.client.post(url, {'ejecutivo': self.ejecutivo.id}).status_code, 403)
+
+    def test_revocacion_se_mantiene_si_se_pierde_la_version(self):
+        url = reverse('lista_solicitudes')
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.usuario.user_permissions.remove(Permission.objects.get(codename='can_view_solicitud_list'))
+        # -- La clave desaparece (descarte o borrado de la caché): la nueva versión no puede
+        #    coincidir con la que guardó la sesión antes de la revocación
+        caches[ALIAS_VERSIONES].delete(CLAVE_VERSION_PERMISOS)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+
+class LineaTiempoTests(PortalTestCase):
+
+    def poblar_linea(self, solicitud):
+        # -- Fechas repetidas entre tipos y dentro de un mismo tipo para probar el desempate
+        base = timezone.now() - timedelta(days=1)
+        for i in range(5):
+            comentario = Comentario.objects.create(solicitud=solicitud, usuario='tester', comentario=f'nota {i}')
+            Comentario.objects.filter(id=comentario.id).update(fecha_comentario=base + timedelta(minutes=i // 2))
+        for i in range(3):
+            historial = HistorialEstado.objects.create(
+                solicitud=solicitud,
+                estado_anterior=self.estados['Registrado'],
+                estado_nuevo=self.estados['En Análisis'],
+                usuario_cambio='tester',
+            )
+            HistorialEstado.objects.filter(id=historial.id).update(fecha_cambio=base + timedelta(minutes=i))
+        asignacion = HistorialAsignacion.objects.create(
+            solicitud=solicitud, ejecutivo_anterior=self.ejecutivo, ejecutivo_nuevo=self.otro_ejecutivo, motivo='Licencia'
+        )
+        HistorialAsignacion.objects.filter(id=asignacion.id).update(fecha_cambio=base + timedelta(minutes=1))
+
+    def test_paginas_cubren_todos_los_eventos_en_orden(self):
+        solicitud = self.crear_solicitud()
+        self.poblar_linea(solicitud)
+        url = reverse('linea_tiempo_solicitud', args=[solicitud.id])
+
+        recorridos, cursor = [], ''
+        while True:
+            datos = self.client.get(url, {'cursor': cursor, 'tamano': 2}).json()
+            self.assertLessEqual(len(datos['eventos']), 2)
+            recorridos.extend(datos['eventos'])
+            cursor = datos['siguiente']
+            if not cursor:
+                break
+
+        self.assertEqual(len(recorridos), 9)
+        self.assertEqual(len({(e['tipo'], e['id']) for e in recorridos}), 9)
+        fechas = [e['fecha'] for e in recorridos]
+        self.assertEqual(fechas, sorted(fechas, reverse=True))
+        asignacion = next(e for e in recorridos if e['tipo'] == 'asignacion')
+        self.assertEqual(asignacion['ejecutivo_nuevo'], 'Ejecutivo Dos')
+        estado = next(e for e in recorridos if e['tipo'] == 'estado')
+        self.assertEqual(estado['estado_nuevo'], 'En Análisis')
+
+    def test_detalle_muestra_primera_pagina_y_totales(self):
+        solicitud = self.crear_solicitud()
+        self.poblar_linea(solicitud)
+        respuesta = self.client.get(reverse('solicitud_detalle', args=[solicitud.id]))
+        self.assertContains(respuesta, '5 comentarios · 3 cambios de estado · 1 reasignaciones')
+        self.assertEqual(len(respuesta.context['eventos']), 9)
+        self.assertIsNone(respuesta.context['cursor_siguiente'])
+
+    def test_cursor_invalido_y_solicitud_inexistente(self):
+        solicitud = self.crear_solicitud()
+        url = reverse('linea_tiempo_solicitud', args=[solicitud.id])
+        self.assertEqual(self.client.get(url, {'cursor': 'no-es-un-cursor'}).status_code, 400)
+        self.assertEqual(self.client.get(url).json(), {'eventos': [], 'siguiente': None})
+        self.assertEqual(self.client.get(reverse('linea_tiempo_solicitud', args=[999])).status_code, 404)
+
+
+class ExportacionTests(PortalTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.primera = self.crear_solicitud()
+        self.asociar(self.primera, '100.50', '200')
+        self.segunda = self.crear_solicitud(cliente=self.otro_cliente, estado='Aprobado')
+        self.sin_circuitos = self.crear_solicitud()
+
+    def leer_csv(self, respuesta):
+        contenido = b''.join(respuesta.streaming_content).decode('utf-8-sig')
+        return list(csv.reader(io.StringIO(contenido)))
+
+    def test_csv_en_streaming_con_los_filtros_de_la_lista(self):
+        url = reverse('exportar_solicitudes')
+        respuesta = self.client.get(url, {'formato': 'csv', 'estado': self.estados['Registrado'].id})
+        self.assertTrue(respuesta.streaming)
+        self.assertIn('attachment;', respuesta['Content-Disposition'])
+
+        filas = self.leer_csv(respuesta)
+        self.assertEqual(filas[0][0], 'ID')
+        por_id = {int(fila[0]): fila for fila in filas[1:]}
+        self.assertEqual(set(por_id), {self.primera.id, self.sin_circuitos.id})
+        self.assertEqual(por_id[self.primera.id][3:-1], [
+            '20100000001', 'Telefónica del Perú', 'Ejecutivo Uno', 'Analista Uno', 'Registrado', '2',
+        ])
+        self.assertEqual(Decimal(por_id[self.primera.id][-1]), Decimal('300.50'))
+        self.assertEqual(por_id[self.sin_circuitos.id][-2], '0')
+        self.assertEqual(Decimal(por_id[self.sin_circuitos.id][-1]), 0)
+
+        filas = self.leer_csv(self.client.get(url, {'cliente': 'Minera'}))
+        self.assertEqual([int(fila[0]) for fila in filas[1:]], [self.segunda.id])
+
+    def test_xlsx_y_comando(self):
+        respuesta = self.client.get(reverse('exportar_solicitudes'), {'formato': 'xlsx'})
+        libro = load_workbook(io.BytesIO(b''.join(respuesta.streaming_content)), read_only=True)
+        filas = list(libro.active.values)
+        self.assertEqual(len(filas), 4)
+        self.assertEqual(filas[0][-1], 'Renta mensual total')
+
+        with tempfile.TemporaryDirectory() as carpeta:
+            salida = os.path.join(carpeta, 'solicitudes.xlsx')
+            out = StringIO()
+            call_command('exportar_solicitudes', salida, '--estado', str(self.estados['Aprobado'].id), stdout=out)
+            self.assertIn('1 solicitudes exportadas', out.getvalue())
+            filas = list(load_workbook(salida, read_only=True).active.values)
+            self.assertEqual([fila[0] for fila in filas[1:]], [self.segunda.id])
+
+            salida = os.path.join(carpeta, 'solicitudes.csv')
+            call_command('exportar_solicitudes', salida, stdout=out)
+            with open(salida, encoding='utf-8-sig', newline='') as archivo:
+                self.assertEqual(len(list(csv.reader(archivo))), 4)
+
+
+class TrabajosTests(PortalTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.carpeta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.carpeta, ignore_errors=True)
+        self.llamadas = 0
+
+        def inestable(trabajo, fallos):
+            self.llamadas += 1
+            if self.llamadas <= fallos:
+                raise RuntimeError(f'falla {self.llamadas}')
+            return {'llamadas': self.llamadas}
+
+        TAREAS['prueba_inestable'] = inestable
+        self.addCleanup(TAREAS.pop, 'prueba_inestable')
+
+    def test_exportacion_encolada_procesada_y_descargada(self):
+        self.asociar(self.crear_solicitud(), '150')
+        self.crear_solicitud(estado='Aprobado')
+
+        with override_settings(TRABAJOS_DIRECTORIO=self.carpeta):
+            respuesta = self.client.post(
+                reverse('encolar_exportacion'), {'formato': 'csv', 'estado': self.estados['Registrado'].id}
+            )
+            self.assertEqual(respuesta.status_code, 202)
+            estado_url = respuesta.json()['estado_url']
+            self.assertEqual(self.client.get(estado_url).json()['estado'], Trabajo.PENDIENTE)
+
+            salida = StringIO()
+            call_command('procesar_trabajos', una_vez=True, stdout=salida)
+            self.assertIn('completado', salida.getvalue())
+
+            datos = self.client.get(estado_url).json()
+            self.assertEqual((datos['estado'], datos['progreso'], datos['resultado']['filas']), ('completado', 100, 1))
+            descarga = self.client.get(datos['descarga_url'])
+            contenido = b''.join(descarga.streaming_content).decode('utf-8-sig')
+            self.assertEqual(len(list(csv.reader(io.StringIO(contenido)))), 2)
+
+        # -- Otro usuario (sin gestionar personal) no ve el trabajo
+        otro = User.objects.create_user('otro', password='clave-segura-123')
+        self.client.force_login(otro)
+        self.assertEqual(self.client.get(estado_url).status_code, 404)
+
+    def test_reintentos_con_espera_y_fallo_final(self):
+        trabajo = encolar('prueba_inestable', {'fallos': 1}, max_intentos=2)
+        self.assertEqual(ejecutar(tomar_siguiente('w1')), Trabajo.PENDIENTE)
+        trabajo.refresh_from_db()
+        self.assertIn('falla 1', trabajo.mensaje)
+        self.assertGreater(trabajo.disponible_desde, timezone.now())
+        # -- Durante la espera nadie lo toma
+        self.assertIsNone(tomar_siguiente('w1'))
+
+        Trabajo.objects.filter(id=trabajo.id).update(disponible_desde=timezone.now())
+        self.assertEqual(ejecutar(tomar_siguiente('w1')), Trabajo.COMPLETADO)
+        trabajo.refresh_from_db()
+        self.assertEqual((trabajo.intentos, trabajo.resultado), (2, {'llamadas': 2}))
+
+        self.llamadas = 0
+        fallido = encolar('prueba_inestable', {'fallos': 5}, max_intentos=1)
+        self.assertEqual(ejecutar(tomar_siguiente('w1')), Trabajo.FALLIDO)
+        fallido.refresh_from_db()
+        self.assertEqual(fallido.estado, Trabajo.FALLIDO)
+
+        # -- Parámetros que la tarea no acepta: falla sin reintentos
+        invalido = encolar('prueba_inestable', {'otro': 1})
+        self.assertEqual(ejecutar(tomar_siguiente('w1')), Trabajo.FALLIDO)
+        invalido.refresh_from_db()
+        self.assertEqual((invalido.intentos, invalido.estado), (1, Trabajo.FALLIDO))
+
+        # -- Opciones que el comando no define: falla sin reintentos ni ejecutar el comando
+        opcion_invalida = encolar('migrar_con_pandas', {'incremental': True, 'tamano_lote': 10})
+        self.assertEqual(ejecutar(tomar_siguiente('w1')), Trabajo.FALLIDO)
+        opcion_invalida.refresh_from_db()
+        self.assertEqual((opcion_invalida.intentos, opcion_invalida.estado), (1, Trabajo.FALLIDO))
+        self.assertIn('Opciones desconocidas para migrar_con_pandas: tamano_lote', opcion_invalida.mensaje)
+
+        # -- Un tipo sin tarea registrada no se encola
+        with self.assertRaises(TrabajoInvalido):
+            encolar('no_existe')
+
+    def test_reserva_exclusiva_y_recuperacion_de_colgados(self):
+        primero = encolar('prueba_inestable', {'fallos': 0})
+        segundo = encolar('prueba_inestable', {'fallos': 0})
+        self.assertEqual(tomar_siguiente('w1').id, primero.id)
+        self.assertEqual(tomar_siguiente('w2').id, segundo.id)
+        self.assertIsNone(tomar_siguiente('w3'))
+
+        # -- w2 sigue latiendo aunque empezó hace horas; w1 murió: sin latidos su trabajo vuelve a la cola
+        hace_horas = timezone.now() - timedelta(hours=3)
+        Trabajo.objects.filter(id=segundo.id).update(fecha_inicio=hace_horas)
+        Trabajo.objects.filter(id=primero.id).update(fecha_inicio=hace_horas, fecha_latido=hace_horas)
+        self.assertEqual(recuperar_colgados(), 1)
+        self.assertEqual(tomar_siguiente('w3').id, primero.id)
+
+    @override_settings(TRABAJOS_LATIDO=0.01)
+    def test_latido_mientras_la_tarea_corre(self):
+        encolar('prueba_inestable', {'fallos': 0})
+        trabajo = tomar_siguiente('w1')
+        latidos = []
+        with latiendo(trabajo, latidos.append):
+            time.sleep(0.2)
+        cantidad = len(latidos)
+        time.sleep(0.05)
+        self.assertGreater(cantidad, 1)
+        self.assertEqual(len(latidos), cantidad)
+
+        Trabajo.objects.filter(id=trabajo.id).update(fecha_latido=timezone.now() - timedelta(hours=1))
+        renovar_latido(trabajo)
+        trabajo.refresh_from_db()
+        self.assertGreater(trabajo.fecha_latido, timezone.now() - timedelta(minutes=1))
+        # -- Recuperado por otro worker: el latido de w1 ya no lo toca
+        Trabajo.objects.filter(id=trabajo.id).update(worker='w2', fecha_latido=None)
+        renovar_latido(trabajo)
+        trabajo.refresh_from_db()
+        self.assertIsNone(trabajo.fecha_latido)
+
+    def test_limpieza_de_exportaciones_vencidas(self):
+        vieja, nueva = os.path.join(self.carpeta, 'trabajo_1.csv'), os.path.join(self.carpeta, 'trabajo_2.csv')
+        for ruta in (vieja, nueva):
+            open(ruta, 'w').close()
+        hace_un_mes = time.time() - 30 * 24 * 3600
+        os.utime(vieja, (hace_un_mes, hace_un_mes))
+
+        with override_settings(TRABAJOS_DIRECTORIO=self.carpeta):
+            self.assertEqual(limpiar_exportaciones(), 1)
+        self.assertEqual(os.listdir(self.carpeta), ['trabajo_2.csv'])
+
+    def test_rebalanceo_en_segundo_plano(self):
+        self.usuario.user_permissions.add(Permission.objects.get(codename='can_manage_personnel'))
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidar_permisos()
+        solicitud = self.crear_solicitud()
+
+        respuesta = self.client.post(
+            reverse('rebalancear_ejecutivos'),
+            {'ejecutivo': self.ejecutivo.id, 'aplicar': '1', 'segundo_plano': '1'},
+        )
+        self.assertEqual(respuesta.status_code, 202)
+        solicitud.refresh_from_db()
+        self.assertEqual(solicitud.ejecutivo, self.ejecutivo)
+
+        call_command('procesar_trabajos', una_vez=True, stdout=StringIO())
+        solicitud.refresh_from_db()
+        self.assertEqual(solicitud.ejecutivo, self.otro_ejecutivo)
+        self.assertEqual(self.client.get(respuesta.json()['estado_url']).json()['resultado']['reasignadas'], 1)
+
+
+class PendientesTests(PortalTestCase):
+
+    def vincular(self, persona):
+        with self.captureOnCommitCallbacks(execute=True):
+            persona.usuario = self.usuario
+            persona.save()
+
+    def test_aviso_del_menu_sin_consultas_y_al_dia(self):
+        self.vincular(self.ejecutivo)
+        with self.captureOnCommitCallbacks(execute=True):
+            primera = self.crear_solicitud()
+            segunda = self.crear_solicitud()
+            self.crear_solicitud(ejecutivo=self.otro_ejecutivo)
+
+        respuesta = self.client.get(reverse('menu'))
+        self.assertEqual(respuesta.context['pendientes'], 2)
+        self.assertContains(respuesta, 'Tienes 2 solicitudes pendientes')
+
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(reverse('menu'))
+        self.assertEqual(respuesta.context['pendientes'], 2)
+        self.assertFalse(any(
+            'solicitud' in q['sql'] or 'carga' in q['sql'] or 'ejecutivoretencion' in q['sql']
+            for q in consultas.captured_queries
+        ))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            cambiar_estado([primera.id], self.estados['En Análisis'].id, 'tester')
+            cambiar_estado([primera.id], self.estados['Rechazado'].id, 'tester')
+        self.assertEqual(self.client.get(reverse('menu')).context['pendientes'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            rebalancear([self.ejecutivo.id], [self.otro_ejecutivo.id])
+        segunda.refresh_from_db()
+        self.assertEqual(segunda.ejecutivo, self.otro_ejecutivo)
+        respuesta = self.client.get(reverse('menu'))
+        self.assertEqual(respuesta.context['pendientes'], 0)
+        self.assertNotContains(respuesta, 'solicitudes pendientes de gestión')
+
+    def test_contador_del_analista_y_reconstruccion(self):
+        self.vincular(self.analista)
+        with self.captureOnCommitCallbacks(execute=True):
+            solicitudes = [self.crear_solicitud(), self.crear_solicitud(estado='En Análisis')]
+            self.crear_solicitud(estado='Aprobado')
+        self.assertEqual(CargaAnalista.objects.get(analista=self.analista).solicitudes_abiertas, 2)
+        self.assertEqual(self.client.get(reverse('menu')).context['pendientes'], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            cambiar_estado([solicitudes[1].id], self.estados['Aprobado'].id, 'tester')
+            solicitudes[0].delete()
+        self.assertEqual(self.client.get(reverse('menu')).context['pendientes'], 0)
+        self.assertEqual(verificar_cargas_analista(), [])
+
+        CargaAnalista.objects.update(solicitudes_abiertas=7)
+        self.assertEqual(verificar_cargas_analista(), [(self.analista.id, 7, 0)])
+        reconstruir_cargas_analista()
+        self.assertEqual(verificar_cargas_analista(), [])
+
+    def test_usuario_sin_vinculo_no_ve_aviso(self):
+        self.crear_solicitud()
+        respuesta = self.client.get(reverse('menu'))
+        self.assertEqual(respuesta.context['pendientes'], 0)
+
+
+class AsignacionAutomaticaTests(PortalTestCase):
+
+    def test_carga_sigue_creacion_circuitos_cierre_reasignacion_y_borrado(self):
+        solicitud = self.crear_solicitud()
+        self.asociar(solicitud, '100.50', '200')
+        self.crear_solicitud(ejecutivo=self.otro_ejecutivo)
+        self.assertEqual(self.carga(self.ejecutivo), (1, Decimal('300.50')))
+
+        HistorialAsignacion.objects.create(
+            solicitud=solicitud, ejecutivo_anterior=self.ejecutivo, ejecutivo_nuevo=self.otro_ejecutivo,
+        )
+        Solicitud.objects.filter(id=solicitud.id).update(ejecutivo=self.otro_ejecutivo)
+        solicitud.refresh_from_db()
+        self.assertEqual(self.carga(self.otro_ejecutivo), (2, Decimal('300.50')))
+
+        # -- Al cerrarse deja de contar como carga
+        HistorialEstado.objects.create(
+            solicitud=solicitud,
+            estado_anterior=self.estados['Registrado'],
+            estado_nuevo=self.estados['Aprobado'],
+            usuario_cambio='tester',
+        )
+        Solicitud.objects.filter(id=solicitud.id).update(estado_actual=self.estados['Aprobado'])
+        self.assertEqual(self.carga(self.otro_ejecutivo), (1, Decimal('0')))
+        self.assertEqual(verificar_cargas(), [])
+
+        Solicitud.objects.exclude(id=solicitud.id).get().delete()
+        self.assertEqual(self.carga(self.otro_ejecutivo), (0, Decimal('0')))
+        self.assertEqual(verificar_cargas(), [])
+
+    def test_round_robin_respeta_tope_de_renta(self):
+        tercero = EjecutivoRetencion.objects.create(nombre='Ejecutivo Tres', email='ej3@test.pe')
+        EjecutivoRetencion.objects.filter(id=self.otro_ejecutivo.id).update(max_carga_renta=Decimal('500'))
+        EjecutivoRetencion.objects.create(nombre='No disponible', email='ej4@test.pe', disponible_asignacion=False)
+
+        self.assertEqual(
+            [elegir_ejecutivo() for _ in range(4)],
+            [self.ejecutivo.id, self.otro_ejecutivo.id, tercero.id, self.ejecutivo.id],
+        )
+        # -- Al segundo no le cabe: se salta su turno
+        self.assertEqual(elegir_ejecutivo(Decimal('600')), tercero.id)
+
+        # -- Si no le cabe a nadie, el de menor carga relativa a su tope
+        EjecutivoRetencion.objects.exclude(id=self.otro_ejecutivo.id).update(max_carga_renta=Decimal('100'))
+        solicitud = self.crear_solicitud()
+        self.asociar(solicitud, '90')
+        self.assertEqual(elegir_ejecutivo(Decimal('1000')), self.otro_ejecutivo.id)
+
+    def test_eleccion_no_depende_del_numero_de_solicitudes(self):
+        elegir_ejecutivo()
+        with CaptureQueriesContext(connection) as antes:
+            elegir_ejecutivo()
+        for _ in range(20):
+            self.asociar(self.crear_solicitud(), '10')
+        with CaptureQueriesContext(connection) as despues:
+            elegir_ejecutivo()
+        self.assertEqual(len(despues), len(antes))
+
+    def test_sin_ejecutivos_disponibles(self):
+        EjecutivoRetencion.objects.update(disponible_asignacion=False)
+        with self.assertRaises(SinEjecutivoDisponible):
+            asignar_automaticamente(self.crear_solicitud())
+
+    def test_accion_reasignar_requiere_gestionar_personal(self):
+        solicitud = self.crear_solicitud()
+        detalle = reverse('solicitud_detalle', args=[solicitud.id])
+        self.assertNotContains(self.client.get(detalle), 'reasignar_automatico')
+
+        respuesta = self.client.post(
+            reverse('procesar_accion_solicitud', args=[solicitud.id]), {'accion': 'reasignar_automatico'}, follow=True
+        )
+        self.assertContains(respuesta, 'No tiene permiso para reasignar')
+        solicitud.refresh_from_db()
+        self.assertEqual(solicitud.ejecutivo, self.ejecutivo)
+        self.assertFalse(HistorialAsignacion.objects.exists())
+
+    def test_accion_reasignar_automaticamente(self):
+        solicitud = self.crear_solicitud()
+        self.asociar(solicitud, '250')
+        self.usuario.user_permissions.add(Permission.objects.get(codename='can_manage_personnel'))
+
+        respuesta = self.client.post(
+            reverse('procesar_accion_solicitud', args=[solicitud.id]), {'accion': 'reasignar_automatico'}
+        )
+        self.assertEqual(respuesta.status_code, 302)
+
+        solicitud.refresh_from_db()
+        self.assertEqual(solicitud.ejecutivo, self.otro_ejecutivo)
+        self.assertTrue(solicitud.asignado_automaticamente)
+        historial = HistorialAsignacion.objects.get(solicitud=solicitud)
+        self.assertEqual(historial.ejecutivo_anterior, self.ejecutivo)
+        self.assertEqual(self.carga(self.otro_ejecutivo), (1, Decimal('250')))
+        self.assertEqual(verificar_resumenes(), [])
+        self.assertEqual(verificar_cargas(), [])
+
+
+class RebalanceoTests(PortalTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.tercero = EjecutivoRetencion.objects.create(
+            nombre='Ejecutivo Tres', email='ej3@test.pe', max_carga_renta=Decimal('300')
+        )
+        for renta in ['400', '250', '100', '50']:
+            self.asociar(self.crear_solicitud(), renta)
+        self.cerrada = self.crear_solicitud(estado='Aprobado')
+
+    def test_simulacion_no_modifica_nada(self):
+        salida = StringIO()
+        call_command('rebalancear_solicitudes', self.ejecutivo.id, '--simular', stdout=salida)
+        self.assertIn('4 solicitudes se reasignarían', salida.getvalue())
+        self.assertEqual(Solicitud.objects.filter(ejecutivo=self.ejecutivo).count(), 5)
+        self.assertFalse(HistorialAsignacion.objects.exists())
+
+    def test_reparte_pendientes_respetando_topes(self):
+        Solicitud.objects.update(asignado_automaticamente=True)
+        call_command('rebalancear_solicitudes', self.ejecutivo.id, '--no-disponibles', stdout=StringIO())
+
+        # -- Solo la cerrada se queda; al tercero le caben 250 + 50 de su tope de 300
+        self.assertEqual(list(Solicitud.objects.filter(ejecutivo=self.ejecutivo)), [self.cerrada])
+        self.assertEqual(self.carga(self.tercero), (2, Decimal('300')))
+        self.assertEqual(self.carga(self.otro_ejecutivo), (2, Decimal('500')))
+        self.assertEqual(self.carga(self.ejecutivo), (0, Decimal('0')))
+        self.assertEqual(HistorialAsignacion.objects.filter(motivo='Rebalanceo de carga').count(), 4)
+        self.assertEqual(list(Solicitud.objects.filter(asignado_automaticamente=True)), [self.cerrada])
+        self.assertFalse(EjecutivoRetencion.objects.get(id=self.ejecutivo.id).disponible_asignacion)
+        self.assertEqual(verificar_resumenes(), [])
+        self.assertEqual(verificar_cargas(), [])
+
+    def test_miles_de_solicitudes_en_lotes(self):
+        Solicitud.objects.bulk_create(
+            Solicitud(
+                cliente=self.cliente,
+                ejecutivo=self.ejecutivo,
+                analista=self.analista,
+                estado_actual=self.estados['Registrado'],
+                nivel_aprobacion=self.nivel,
+                usuario_creador=self.usuario,
+            )
+            for _ in range(1500)
+        )
+        reconstruir_resumenes()
+        reconstruir_cargas()
+
+        with CaptureQueriesContext(connection) as consultas:
+            call_command('rebalancear_solicitudes', self.ejecutivo.id, stdout=StringIO())
+        # -- UPDATE e INSERT por lotes, no una consulta por solicitud
+        self.assertLess(len(consultas), 100)
+        self.assertEqual(Solicitud.objects.filter(ejecutivo=self.ejecutivo).count(), 1)
+        self.assertEqual(verificar_resumenes(), [])
+        self.assertEqual(verificar_cargas(), [])
+
+    def test_endpoint_requiere_permiso_y_simula_por_defecto(self):
+        url = reverse('rebalancear_ejecutivos')
+        self.assertEqual(self.client.post(url, {'ejecutivo': self.ejecutivo.id}).status_code, 403)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.usuario.user_permissions.add(Permission.objects.get(codename='can_manage_personnel'))
+        datos = self.client.post(url, {'ejecutivo': self.ejecutivo.id}).json()
+        self.assertTrue(datos['simulado'])
+        self.assertEqual(datos['reasignadas'], 4)
+        self.assertEqual(Solicitud.objects.filter(ejecutivo=self.ejecutivo).count(), 5)
+
+        datos = self.client.post(url, {'ejecutivo': self.ejecutivo.id, 'aplicar': '1'}).json()
+        self.assertFalse(datos['simulado'])
+        self.assertEqual(Solicitud.objects.filter(ejecutivo=self.ejecutivo).count(), 1)
+        self.assertEqual(self.client.post(url, {'ejecutivo': 'x'}).status_code, 400)
+
+
+class NuevaSolicitudTests(PortalTestCase):
+
+    def setUp(self):
+        super().setUp()
+        Circuito.objects.bulk_create(
+            Circuito(cliente=self.cliente, nombre_circuito=f'CIR-{i}', renta_mensual=10) for i in range(500)
+        )
+        self.circuitos = list(Circuito.objects.filter(cliente=self.cliente).values_list('id', flat=True))
+        self.url = reverse('nueva_solicitud')
+
+    def enviar(self, circuitos, cliente=None):
+        return self.client.post(self.url, {
+            'cliente_id': (cliente or self.cliente).id,
+            'circuitos_seleccionados': circuitos,
+            'observaciones': 'Cliente migra a otro proveedor',
+            'fecha_solicitud_baja': '2026-12-01',
+        })
+
+    def test_crea_solicitud_con_500_circuitos_en_pocas_consultas(self):
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as consultas:
+            respuesta = self.enviar(self.circuitos)
+
+        solicitud = Solicitud.objects.get()
+        self.assertRedirects(respuesta, reverse('solicitud_detalle', args=[solicitud.id]))
+        self.assertLess(len(consultas), 40)
+
+        self.assertEqual(solicitud.circuitos.count(), 500)
+        self.assertTrue(solicitud.asignado_automaticamente)
+        self.assertEqual(solicitud.estado_actual, self.estados['Registrado'])
+        self.assertEqual(solicitud.fecha_solicitud_baja, date(2026, 12, 1))
+        historial = HistorialEstado.objects.get(solicitud=solicitud)
+        self.assertEqual(historial.estado_anterior, historial.estado_nuevo)
+        self.assertEqual(HistorialAsignacion.objects.get(solicitud=solicitud).ejecutivo_nuevo, solicitud.ejecutivo)
+        self.assertEqual(self.carga(solicitud.ejecutivo), (1, Decimal('5000')))
+        self.assertEqual(verificar_resumenes(), [])
+        self.assertEqual(verificar_cargas(), [])
+
+    def test_rechaza_circuitos_de_otro_cliente(self):
+        ajeno = Circuito.objects.create(cliente=self.otro_cliente, nombre_circuito='MIN-1', renta_mensual=5)
+        respuesta = self.enviar(self.circuitos[:3] + [ajeno.id])
+
+        self.assertContains(respuesta, 'no pertenecen al cliente')
+        self.assertFalse(Solicitud.objects.exists())
+        self.assertFalse(SolicitudCircuito.objects.exists())
+
+    def test_exige_al_menos_un_circuito(self):
+        self.assertContains(self.enviar([]), 'al menos un circuito')
+        self.assertFalse(Solicitud.objects.exists())
+
+
+class TransicionesEstadoTests(PortalTestCase):
+
+    def cambiar(self, solicitudes, estado):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('cambiar_estado_masivo'), {
+                'solicitudes': [solicitud.id for solicitud in solicitudes],
+                'nuevo_estado': self.estados[estado].id,
+            })
+
+    def test_cambio_masivo_requiere_post_y_permiso_propio(self):
+        solicitud = self.crear_solicitud()
+        self.assertEqual(self.client.get(reverse('cambiar_estado_masivo')).status_code, 405)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.usuario.user_permissions.remove(Permission.objects.get(codename='can_change_estado_masivo'))
+        self.assertEqual(self.cambiar([solicitud], 'En Análisis').status_code, 403)
+        solicitud.refresh_from_db()
+        self.assertEqual(solicitud.estado_actual, self.estados['Registrado'])
+
+    def test_detalle_rechaza_transicion_no_permitida(self):
+        solicitud = self.crear_solicitud()
+        respuesta = self.client.get(reverse('solicitud_detalle', args=[solicitud.id]))
+        self.assertEqual(
+            [estado['nombre_estado'] for estado in respuesta.context['estados_disponibles']], ['En Análisis']
+        )
+
+        self.client.post(
+            reverse('procesar_accion_solicitud', args=[solicitud.id]),
+            {'accion': 'cambiar_estado', 'nuevo_estado': self.estados['Aprobado'].id},
+        )
+        solicitud.refresh_from_db()
+        self.assertEqual(solicitud.estado_actual, self.estados['Registrado'])
+        self.assertFalse(HistorialEstado.objects.exists())
+
+    def test_cierra_200_solicitudes_en_un_clic(self):
+        solicitudes = [self.crear_solicitud(estado='En Análisis') for _ in range(200)]
+        self.asociar(solicitudes[0], '150')
+        self.assertEqual(self.carga(self.ejecutivo), (200, Decimal('150')))
+
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.cambiar(solicitudes, 'Aprobado')
+        self.assertRedirects(respuesta, reverse('lista_solicitudes'), fetch_redirect_response=False)
+        self.assertLess(len(consultas), 30)
+
+        self.assertEqual(Solicitud.objects.filter(estado_actual=self.estados['Aprobado']).count(), 200)
+        self.assertEqual(HistorialEstado.objects.filter(estado_nuevo=self.estados['Aprobado']).count(), 200)
+        self.assertEqual(self.carga(self.ejecutivo), (0, Decimal('0')))
+        self.assertEqual(verificar_resumenes(), [])
+        self.assertEqual(verificar_cargas(), [])
+
+    def test_lote_con_una_transicion_invalida_no_cambia_ninguna(self):
+        solicitudes = [self.crear_solicitud(estado='En Análisis') for _ in range(3)]
+        solicitudes.append(self.crear_solicitud(estado='Rechazado'))
+
+        self.cambiar(solicitudes, 'Aprobado')
+        self.assertEqual(Solicitud.objects.filter(estado_actual=self.estados['Aprobado']).count(), 0)
+        self.assertFalse(HistorialEstado.objects.exists())
+
+        self.cambiar(solicitudes[:3], 'Aprobado')
+        self.cambiar(solicitudes[:3], 'Baja Ejecutada')
+        self.assertEqual(Solicitud.objects.filter(estado_actual=self.estados['Baja Ejecutada']).count(), 3)
+        self.assertEqual(verificar_resumenes(), [])
+
+
+class MigracionConPandasTests(PortalTestCase):
+    """migrar_con_pandas contra un origen SQLite adjuntado como esquema RETENCION."""
+
+    def setUp(self):
+        super().setUp()
+        descriptor, self.origen = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(descriptor)
+        self.addCleanup(os.remove, self.origen)
+        with sqlite3.connect(self.origen) as conexion:
+            conexion.executescript(
+                DDL_ORIGEN + """
+                INSERT INTO CLIENTES VALUES (1, '20100000001', 'Telefónica del Perú', '2024-01-01 00:00:00', 'Activo');
+                INSERT INTO CLIENTES VALUES (2, '20600000003', 'Pesquera Sur', '2024-03-01 00:00:00', 'Activo');
+                INSERT INTO CIRCUITOS VALUES (10, 1, 'CIR-10', 'DATOS', 'Activo', 100.5, '2024-02-01 00:00:00');
+                INSERT INTO CIRCUITOS VALUES (11, 2, 'CIR-11', 'INTERNET', 'Activo', 80, '2024-03-01 00:00:00');
+                """
+            )
+
+    def ejecutar(self, *opciones, sentencias=''):
+        if sentencias:
+            with sqlite3.connect(self.origen) as conexion:
+                conexion.executescript(sentencias)
+
+        salida, errores = StringIO(), StringIO()
+        call_command('migrar_con_pandas', '--origen', self.origen, *opciones, stdout=salida, stderr=errores)
+        self.assertEqual(errores.getvalue(), '')
+        return salida.getvalue()
+
+    def test_migracion_completa_actualiza_sin_borrar_solicitudes(self):
+        solicitud = self.crear_solicitud()
+        salida = self.ejecutar(sentencias="""
+            INSERT INTO CIRCUITOS VALUES (13, 99, 'HUERFANO', 'DATOS', 'Activo', 10, '2024-03-01 00:00:00');
+        """)
+
+        self.assertIn('Circuitos sin padre (omitidos): 1', salida)
+        self.assertIn('Clientes: 1 nuevos, 0 actualizados, 1 desactivados', salida)
+        self.assertTrue(Solicitud.objects.filter(pk=solicitud.pk, cliente=self.cliente).exists())
+        self.assertEqual(Cliente.objects.get(pk=self.otro_cliente.pk).estado, 'Inactivo')
+        self.assertEqual(Circuito.objects.get(id_origen=10).cliente, self.cliente)
+        self.assertEqual(sorted(Circuito.objects.values_list('id_origen', flat=True)), [10, 11])
+        self.assertFalse(ClienteStaging.objects.exists())
+        self.assertEqual(
+            Cliente.objects.get(ruc='20600000003').fecha_registro.date(), date(2024, 3, 1)
+        )
+
+        # -- Segunda corrida: cambios en filas ya migradas y un circuito borrado en el origen
+        salida = self.ejecutar(sentencias="""
+            UPDATE CLIENTES SET razon_social = 'Telefónica S.A.A.' WHERE cliente_id = 1;
+            UPDATE CIRCUITOS SET renta_mensual = 120, cliente_id = 2 WHERE circuito_id = 10;
+            DELETE FROM CIRCUITOS WHERE circuito_id = 11;
+        """)
+        self.assertIn('Clientes: 0 nuevos, 1 actualizados, 0 desactivados', salida)
+        self.assertIn('Circuitos: 0 nuevos, 1 actualizados, 1 desactivados', salida)
+        self.assertEqual(Cliente.objects.get(pk=self.cliente.pk).razon_social, 'Telefónica S.A.A.')
+        circuito = Circuito.objects.get(id_origen=10)
+        self.assertEqual((circuito.cliente.ruc, circuito.renta_mensual), ('20600000003', Decimal('120')))
+        self.assertEqual(Circuito.objects.get(id_origen=11).estado, 'Inactivo')
+        self.assertTrue(Solicitud.objects.filter(pk=solicitud.pk).exists())
+
+        # -- Tercera corrida: el cliente del circuito 10 se borra en el origen y el circuito queda huérfano
+        salida = self.ejecutar(sentencias="DELETE FROM CLIENTES WHERE cliente_id = 2;")
+        self.assertIn('Circuitos sin padre (omitidos): 2', salida)
+        self.assertIn('Circuitos: 0 nuevos, 0 actualizados, 1 desactivados', salida)
+        self.assertEqual(Circuito.objects.get(id_origen=10).estado, 'Inactivo')
+
+    def test_extraccion_en_paralelo_lee_todas_las_particiones(self):
+        salida = self.ejecutar('--workers', '3', sentencias="""
+            INSERT INTO CLIENTES VALUES (3, '20700000004', 'Agro Norte', '2024-03-01 00:00:00', 'Activo');
+            INSERT INTO CIRCUITOS VALUES (14, 3, 'CIR-14', 'DATOS', 'Activo', 30, '2024-03-01 00:00:00');
+            INSERT INTO CIRCUITOS VALUES (15, NULL, 'SIN-CLIENTE', 'DATOS', 'Activo', 10, '2024-03-01 00:00:00');
+        """)
+
+        self.assertIn('Circuitos sin padre (omitidos): 1', salida)
+        self.assertIn('lectura circuitos[3]', salida)
+        self.assertEqual(sorted(Circuito.objects.values_list('id_origen', flat=True)), [10, 11, 14])
+
+    def test_benchmark_corre_en_una_base_temporal(self):
+        solicitud = self.crear_solicitud()
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio)
+
+        salida = StringIO()
+        call_command(
+            'benchmark_migracion', '--tamanos', '200', '--incremental', '--directorio', directorio, stdout=salida,
+        )
+
+        self.assertIn('completa: 220 filas', salida.getvalue())
+        self.assertIn('incremental', salida.getvalue())
+        self.assertTrue(Solicitud.objects.filter(pk=solicitud.pk).exists())
+        self.assertEqual(Cliente.objects.count(), 2)
+        self.assertFalse(Circuito.objects.exists())
+
+    def test_validacion_fallida_no_modifica_las_tablas(self):
+        solicitud = self.crear_solicitud()
+        with self.assertRaisesMessage(CommandError, 'los datos actuales no se modificaron'):
+            self.ejecutar(sentencias="""
+                INSERT INTO CLIENTES VALUES (3, '20600000003', 'Pesquera Sur Duplicada', '2024-03-01 00:00:00', 'Activo');
+            """)
+
+        self.assertTrue(Solicitud.objects.filter(pk=solicitud.pk).exists())
+        self.assertEqual(Cliente.objects.count(), 2)
+        self.assertFalse(Circuito.objects.exists())
+
+    def test_sincroniza_delta_y_desactiva_ausentes_sin_borrar_solicitudes(self):
+        solicitud = self.crear_solicitud()
+        self.ejecutar('--incremental')
+
+        self.assertTrue(Solicitud.objects.filter(pk=solicitud.pk).exists())
+        self.assertEqual(Cliente.objects.count(), 3)
+        self.assertEqual(Cliente.objects.get(ruc='20600000003').circuito_set.get().id_origen, 11)
+        self.assertEqual(Circuito.objects.get(id_origen=10).cliente, self.cliente)
+        self.assertEqual(
+            MarcaSincronizacion.objects.get(tabla='CIRCUITOS').ultima_fecha.year, 2024
+        )
+
+        # -- Segunda corrida: un circuito nuevo y un cliente borrado en el origen (su circuito queda huérfano)
+        salida = self.ejecutar('--incremental', sentencias="""
+            INSERT INTO CIRCUITOS VALUES (12, 1, 'CIR-12', 'DATOS', 'Activo', 50, '2024-04-01 00:00:00');
+            DELETE FROM CLIENTES WHERE cliente_id = 2;
+        """)
+        self.assertIn('Circuitos: 1 nuevos, 0 actualizados, 1 desactivados', salida)
+        self.assertEqual(Circuito.objects.get(id_origen=12).cliente, self.cliente)
+        self.assertEqual(Circuito.objects.get(id_origen=11).estado, 'Inactivo')
+        self.assertEqual(Cliente.objects.get(ruc='20600000003').estado, 'Inactivo')
+        # -- Los clientes locales que nunca vinieron del origen también se consideran ausentes
+        self.assertEqual(Cliente.objects.get(pk=self.otro_cliente.pk).estado, 'Inactivo')
+        self.assertTrue(Solicitud.objects.filter(pk=solicitud.pk).exists())
+        self.assertFalse(ClaveOrigenStaging.objects.exists())
@@ -0,0 +1,311 @@
+# En: portal_retenciones/trabajos.py
+
+import inspect
+import os
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command, get_commands, load_command_class
+from django.db import DatabaseError, connection
+from django.db.models import F
+from django.utils import timezone
+
+from portal_retenciones.asignacion import rebalancear
+from portal_retenciones.exportacion import (
+    FORMATOS,
+    TAMANO_LOTE_EXPORTACION,
+    escribir_xlsx,
+    filas_exportacion,
+    lineas_csv,
+    solicitudes_exportacion,
+)
+from portal_retenciones.filtros import leer_filtros
+from portal_retenciones.models import Trabajo
+
+# -- Tareas que puede ejecutar el worker: {tipo: función(trabajo, **parametros) -> resultado JSON}
+TAREAS = {}
+
+# -- Último tramo de la traza que se guarda en 'mensaje' cuando una tarea falla
+LARGO_ERROR = 4000
+
+
+class TrabajoInvalido(Exception):
+    """El trabajo no se puede ejecutar (tipo o parámetros inválidos): no se reintenta."""
+
+
+def tarea(tipo):
+    """Registra la función como tarea del tipo indicado."""
+    def registrar(funcion):
+        TAREAS[tipo] = funcion
+        return funcion
+    return registrar
+
+
+def encolar(tipo, parametros=None, usuario=None, max_intentos=3):
+    """Crea un trabajo pendiente; lo ejecutará el primer worker libre."""
+    if tipo not in TAREAS:
+        raise TrabajoInvalido(f'Tipo de trabajo desconocido: {tipo}')
+    return Trabajo.objects.create(
+        tipo=tipo,
+        parametros=parametros or {},
+        creado_por=usuario if usuario is not None and usuario.is_authenticated else None,
+        max_intentos=max_intentos,
+    )
+
+
+def reportar_progreso(trabajo, progreso, mensaje=''):
+    """Actualiza el avance (0-100) visible en el endpoint de estado, sin tocar el resto de la fila."""
+    trabajo.progreso = max(0, min(int(progreso), 100))
+    trabajo.mensaje = mensaje
+    Trabajo.objects.filter(id=trabajo.id).update(
+        progreso=trabajo.progreso, mensaje=mensaje, fecha_latido=timezone.now()
+    )
+
+
+# -----------------------------------------------------------------
+# --- WORKER ---
+# -----------------------------------------------------------------
+
+def tomar_siguiente(worker):
+    """
+    Reserva el trabajo pendiente más antiguo ya disponible y lo devuelve (o None).
+    La reserva es un UPDATE condicionado al estado: si otro worker lo tomó primero
+    no se actualiza ninguna fila y se prueba con el siguiente (sin SKIP LOCKED,
+    que SQLite no tiene).
+    """
+    while True:
+        ahora = timezone.now()
+        trabajo_id = Trabajo.objects.filter(
+            estado=Trabajo.PENDIENTE, disponible_desde__lte=ahora
+        ).order_by('disponible_desde', 'id').values_list('id', flat=True).first()
+        if trabajo_id is None:
+            return None
+        tomado = Trabajo.objects.filter(id=trabajo_id, estado=Trabajo.PENDIENTE).update(
+            estado=Trabajo.EN_CURSO,
+            worker=worker,
+            fecha_inicio=ahora,
+            fecha_latido=ahora,
+            fecha_fin=None,
+            progreso=0,
+            intentos=F('intentos') + 1,
+        )
+        if tomado:
+            return Trabajo.objects.get(id=trabajo_id)
+
+
+def _espera_reintento(intentos):
+    # -- Espera creciente: base, 2 x base, 4 x base...
+    return timedelta(seconds=getattr(settings, 'TRABAJOS_ESPERA_REINTENTO', 60) * 2 ** (intentos - 1))
+
+
+def renovar_latido(trabajo):
+    """Marca que el worker sigue con el trabajo (si todavía es suyo)."""
+    Trabajo.objects.filter(id=trabajo.id, estado=Trabajo.EN_CURSO, worker=trabajo.worker).update(
+        fecha_latido=timezone.now()
+    )
+
+
+@contextmanager
+def latiendo(trabajo, latido=renovar_latido):
+    """
+    Mientras dura el bloque, un hilo llama a latido(trabajo) cada TRABAJOS_LATIDO
+    segundos: una tarea larga (ej. migrar_con_pandas) no se confunde con un worker muerto.
+    """
+    intervalo = getattr(settings, 'TRABAJOS_LATIDO', 60)
+    terminado = threading.Event()
+
+    def latir():
+        try:
+            while not terminado.wait(intervalo):
+                try:
+                    latido(trabajo)
+                except DatabaseError:
+                    # -- Base ocupada (SQLite con una escritura larga en curso): se reintenta en el próximo latido
+                    pass
+        finally:
+            connection.close()
+
+    hilo = threading.Thread(target=latir, name=f'latido-trabajo-{trabajo.id}', daemon=True)
+    hilo.start()
+    try:
+        yield
+    finally:
+        terminado.set()
+        hilo.join()
+
+
+def _finalizar(trabajo, **cambios):
+    # -- Solo si el trabajo sigue siendo de este worker (no fue recuperado por colgado)
+    Trabajo.objects.filter(id=trabajo.id, estado=Trabajo.EN_CURSO, worker=trabajo.worker).update(
+        fecha_fin=timezone.now(), **cambios
+    )
+
+
+def ejecutar(trabajo):
+    """
+    Ejecuta un trabajo ya reservado. Si la tarea falla y quedan intentos, el
+    trabajo vuelve a pendiente con una espera creciente; si no, queda fallido
+    con la traza del error en 'mensaje'. Devuelve el estado final.
+    """
+    try:
+        funcion = TAREAS.get(trabajo.tipo)
+        if funcion is None:
+            raise TrabajoInvalido(f'Tipo de trabajo desconocido: {trabajo.tipo}')
+        try:
+            inspect.signature(funcion).bind(trabajo, **trabajo.parametros)
+        except TypeError as e:
+            raise TrabajoInvalido(f'Parámetros inválidos para {trabajo.tipo}: {e}')
+        with latiendo(trabajo):
+            resultado = funcion(trabajo, **trabajo.parametros)
+    except Exception as e:
+        error = traceback.format_exc()[-LARGO_ERROR:]
+        if isinstance(e, TrabajoInvalido) or trabajo.intentos >= trabajo.max_intentos:
+            _finalizar(trabajo, estado=Trabajo.FALLIDO, mensaje=error)
+            return Trabajo.FALLIDO
+        _finalizar(
+            trabajo,
+            estado=Trabajo.PENDIENTE,
+            mensaje=error,
+            disponible_desde=timezone.now() + _espera_reintento(trabajo.intentos),
+        )
+        return Trabajo.PENDIENTE
+
+    _finalizar(trabajo, estado=Trabajo.COMPLETADO, progreso=100, resultado=resultado)
+    return Trabajo.COMPLETADO
+
+
+def recuperar_colgados():
+    """
+    Devuelve a la cola (o marca fallidos si ya no quedan intentos) los trabajos
+    en curso sin latido hace más de TRABAJOS_TIMEOUT segundos: su worker murió o se reinició.
+    """
+    limite = timezone.now() - timedelta(seconds=getattr(settings, 'TRABAJOS_TIMEOUT', 30 * 60))
+    colgados = Trabajo.objects.filter(estado=Trabajo.EN_CURSO, fecha_latido__lt=limite)
+    mensaje = 'El worker no terminó el trabajo a tiempo.'
+    fallidos = colgados.filter(intentos__gte=F('max_intentos')).update(
+        estado=Trabajo.FALLIDO, mensaje=mensaje, fecha_fin=timezone.now()
+    )
+    reencolados = colgados.update(estado=Trabajo.PENDIENTE, mensaje=mensaje, disponible_desde=timezone.now())
+    return reencolados + fallidos
+
+
+def resumen(trabajo):
+    """Representación JSON del trabajo para el endpoint de estado."""
+    return {
+        'id': trabajo.id,
+        'tipo': trabajo.tipo,
+        'estado': trabajo.estado,
+        'progreso': trabajo.progreso,
+        'mensaje': trabajo.mensaje,
+        'intentos': trabajo.intentos,
+        'max_intentos': trabajo.max_intentos,
+        'resultado': trabajo.resultado,
+        'fecha_creacion': trabajo.fecha_creacion,
+        'fecha_inicio': trabajo.fecha_inicio,
+        'fecha_fin': trabajo.fecha_fin,
+    }
+
+
+# -----------------------------------------------------------------
+# --- TAREAS ---
+# -----------------------------------------------------------------
+
+def _directorio_exportaciones():
+    return getattr(settings, 'TRABAJOS_DIRECTORIO', settings.BASE_DIR / 'exportaciones')
+
+
+def ruta_exportacion(trabajo_id, formato):
+    directorio = _directorio_exportaciones()
+    os.makedirs(directorio, exist_ok=True)
+    return os.path.join(directorio, f'trabajo_{trabajo_id}.{formato}')
+
+
+def limpiar_exportaciones():
+    """
+    Borra los archivos exportados con más de TRABAJOS_RETENCION_DIAS días (su descarga
+    pasa a responder 410). Devuelve la cantidad borrada.
+    """
+    limite = time.time() - getattr(settings, 'TRABAJOS_RETENCION_DIAS', 7) * 24 * 3600
+    borrados = 0
+    try:
+        entradas = os.scandir(_directorio_exportaciones())
+    except FileNotFoundError:
+        return 0
+    with entradas:
+        for entrada in entradas:
+            if entrada.name.startswith('trabajo_') and entrada.is_file() and entrada.stat().st_mtime < limite:
+                try:
+                    os.remove(entrada.path)
+                    borrados += 1
+                except FileNotFoundError:
+                    pass
+    return borrados
+
+
+@tarea('exportar_solicitudes')
+def exportar_solicitudes(trabajo, filtros=None, formato='csv'):
+    """Exporta a un archivo (descargable desde la API) con los filtros de la lista."""
+    if formato not in FORMATOS:
+        raise TrabajoInvalido(f'Formato no soportado: {formato}')
+    filtros = leer_filtros(filtros or {})
+    total = solicitudes_exportacion(filtros).count()
+
+    def con_progreso(filas):
+        for numero, fila in enumerate(filas, 1):
+            if numero % TAMANO_LOTE_EXPORTACION == 0:
+                reportar_progreso(trabajo, 99 * numero // max(total, 1), f'{numero} de {total} filas')
+            yield fila
+
+    ruta = ruta_exportacion(trabajo.id, formato)
+    if formato == 'csv':
+        with open(ruta, 'w', encoding='utf-8', newline='') as archivo:
+            archivo.writelines(lineas_csv(con_progreso(filas_exportacion(filtros))))
+    else:
+        escribir_xlsx(con_progreso(filas_exportacion(filtros)), ruta)
+    return {'archivo': os.path.basename(ruta), 'formato': formato, 'filas': total}
+
+
+@tarea('rebalancear')
+def rebalancear_en_segundo_plano(trabajo, origenes, destinos=None, motivo='Rebalanceo de carga'):
+    plan = rebalancear(origenes, destinos, motivo=motivo)
+    return {'reasignadas': len(plan['movimientos']), 'sin_destino': plan['sin_destino']}
+
+
+def _validar_opciones(nombre, opciones):
+    # -- Las mismas opciones que acepta call_command: las del parser (por dest o por
+    #    nombre de la opción) y las ocultas del comando
+    comando = load_command_class(get_commands()[nombre], nombre)
+    parser = comando.create_parser('', nombre)
+    validas = set(comando.stealth_options)
+    for accion in parser._actions:
+        validas.add(accion.dest)
+        validas.update(o.lstrip('-').replace('-', '_') for o in accion.option_strings)
+    desconocidas = sorted(set(opciones) - validas)
+    if desconocidas:
+        raise TrabajoInvalido(f'Opciones desconocidas para {nombre}: {", ".join(desconocidas)}')
+
+
+def _comando(nombre, trabajo, **opciones):
+    # -- Opciones inválidas fallan ya, sin reintentos (la firma **opciones acepta cualquiera)
+    _validar_opciones(nombre, opciones)
+    # -- La salida del comando queda como resultado (las últimas líneas)
+    salida = StringIO()
+    reportar_progreso(trabajo, 0, f'Ejecutando {nombre}')
+    call_command(nombre, stdout=salida, **opciones)
+    return {'salida': salida.getvalue()[-LARGO_ERROR:]}
+
+
+@tarea('migrar_con_pandas')
+def migrar_con_pandas(trabajo, **opciones):
+    """Sincronización con SQL Server (ej. la incremental nocturna, encolada por cron)."""
+    return _comando('migrar_con_pandas', trabajo, **opciones)
+
+
+@tarea('reconstruir_resumenes')
+def reconstruir_resumenes(trabajo):
+    return _comando('reconstruir_resumenes', trabajo)
@@ -0,0 +1,37 @@
+# En: portal_retenciones/versiones.py
+
+import uuid
+
+from django.core.cache import caches
+from django.db import transaction
+
+# -- Alias de caché solo para las versiones compartidas entre workers (sin expiración):
+#    las entradas de vida corta del alias 'default' no pueden desalojarlas
+ALIAS_VERSIONES = 'versiones'
+
+
+def _nueva():
+    # -- Nunca se repite: si la clave se pierde (borrado, descarte), la versión que la
+    #    reemplaza no coincide con ninguna guardada en sesiones o índices anteriores
+    return uuid.uuid4().hex
+
+
+def version(clave):
+    """Versión compartida actual de 'clave' (la crea si no existe)."""
+    almacen = caches[ALIAS_VERSIONES]
+    actual = almacen.get(clave)
+    if actual is None:
+        # -- add() no pisa la versión que otro worker haya creado entre medio
+        almacen.add(clave, _nueva(), None)
+        actual = almacen.get(clave)
+    return actual
+
+
+def renovar(clave):
+    """Reemplaza de inmediato la versión de 'clave' por una nueva."""
+    caches[ALIAS_VERSIONES].set(clave, _nueva(), None)
+
+
+def renovar_al_confirmar(clave):
+    """Renueva la versión tras el commit: otro worker no debe recargar datos aún no confirmados."""
+    transaction.on_commit(lambda: renovar(clave))
@@ -1,44 +1,238 @@
-from django.http import JsonResponse
-from ..models import Cliente, Circuito
+from django.conf import settings
+from django.core.cache import cache
+from django.contrib.auth.decorators import login_required
+from django.http import FileResponse, JsonResponse
+from django.utils.cache import patch_cache_control
+from django.urls import reverse
+from django.views.decorators.http import condition, require_GET, require_POST
+from ..asignacion import rebalancear
+from ..busqueda import buscar_clientes, clave_cache_busqueda
+from ..circuitos import (
+    circuitos_de_cliente,
+    estado_circuitos,
+    filtrar_circuitos,
+    leer_filtros_circuitos,
+    pagina_circuitos,
+    totales_circuitos,
+)
+from ..decorators import permission_required
+from ..linea_tiempo import (
+    TAMANO_MAXIMO_LINEA,
+    TAMANO_PAGINA_LINEA,
+    decodificar_cursor_evento,
+    pagina_linea_tiempo,
+)
+from ..exportacion import FORMATOS
+from ..models import Solicitud, Trabajo
+from ..permisos import permisos_de
+from ..trabajos import encolar, resumen, ruta_exportacion
+
+# -- Resultados del índice de búsqueda (en memoria, FTS5 o prefijo de RUC), como mucho 10
+def _clientes_encontrados(query):
+    return [
+        {'id': cliente_id, 'nombre': razon_social, 'ruc': ruc}
+        for cliente_id, razon_social, ruc in buscar_clientes(query)
+    ]
+
 
 # -- API: Búsqueda de clientes (autocomplete)
 def search_clientes(request):
     # -- Busca por parámetro 'q' en la URL
     query = request.GET.get('q', None)
     clientes_filtrados = []
-    
-    if query:
-        # -- Filtra por razón social (icontains) y limita a 10
-        clientes = Cliente.objects.filter(razon_social__icontains=query)[:10] 
-        
-        for cliente in clientes:
-            clientes_filtrados.append({
-                'id': cliente.id,
-                'nombre': cliente.razon_social,
-                'ruc': cliente.ruc
-            })
-            
+
+    if query and getattr(settings, 'BUSQUEDA_CLIENTES_MEMORIA', False):
+        # -- El índice en memoria responde sin consultas: cachear la respuesta en disco
+        #    costaría más que buscar de nuevo
+        clientes_filtrados = _clientes_encontrados(query)
+    elif query:
+        # -- Respuesta reciente para la misma consulta normalizada ("Tél" == "tel")
+        clave = clave_cache_busqueda(query)
+        clientes_filtrados = cache.get(clave)
+
+        if clientes_filtrados is None:
+            clientes_filtrados = _clientes_encontrados(query)
+            cache.set(clave, clientes_filtrados, getattr(settings, 'BUSQUEDA_CLIENTES_CACHE_TTL', 60))
+
     return JsonResponse({'clientes': clientes_filtrados})
 
 
+# -- Resumen de circuitos del cliente, calculado una sola vez por request
+#    (lo usan tanto el ETag/Last-Modified como la vista)
+def _estado_circuitos(request, cliente_id):
+    if not hasattr(request, '_estado_circuitos'):
+        request._estado_circuitos = estado_circuitos(cliente_id)
+    return request._estado_circuitos
+
+
+def _etag_circuitos(request, cliente_id):
+    estado = _estado_circuitos(request, cliente_id)
+    return estado['etag'] if estado else None
+
+
+def _ultima_modificacion_circuitos(request, cliente_id):
+    estado = _estado_circuitos(request, cliente_id)
+    return estado['ultima_modificacion'] if estado else None
+
+
 # -- API: Obtener circuitos de un cliente específico
+#    Responde 304 Not Modified si el navegador ya tiene la versión actual (ETag / Last-Modified)
+@condition(etag_func=_etag_circuitos, last_modified_func=_ultima_modificacion_circuitos)
 def get_circuitos_por_cliente(request, cliente_id):
-    circuitos_data = []
+    estado = _estado_circuitos(request, cliente_id)
+    if estado is None:
+        return JsonResponse({'error': f'El cliente {cliente_id} no existe.'}, status=404)
+
+    # -- Lista serializada con values() y cacheada en el servidor por ETag
+    circuitos_data = circuitos_de_cliente(cliente_id, estado['etag'])
+
+    response = JsonResponse({'circuitos': circuitos_data})
+    # -- El navegador puede guardar la respuesta, pero debe revalidarla en cada uso
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+
+# -- API: Circuitos de uno o varios clientes, filtrados y paginados en el servidor,
+#    con los totales (cantidad y renta por tipo de servicio) calculados en la base de datos.
+#    Solo para quien registra solicitudes (lo usa el formulario de nueva solicitud)
+@permission_required('portal_retenciones.can_create_solicitud')
+def get_circuitos(request):
+    filtros = leer_filtros_circuitos(request.GET)
+    if not filtros['clientes']:
+        return JsonResponse({'error': 'Debe indicar al menos un cliente_id.'}, status=400)
+
+    circuitos = filtrar_circuitos(filtros)
+    filas, siguiente = pagina_circuitos(circuitos, filtros['despues'], filtros['tamano'])
+
+    return JsonResponse({
+        'circuitos': filas,
+        'siguiente': siguiente,
+        'totales': totales_circuitos(circuitos),
+    })
+
+
+def _leer_ids(valores):
+    # -- Acepta parámetros repetidos (?ejecutivo=1&ejecutivo=2) o una lista "1,2"
+    return sorted({int(parte) for valor in valores for parte in valor.split(',') if parte.strip()})
+
+
+# -- API: Rebalanceo masivo de solicitudes pendientes entre ejecutivos (personal autorizado).
+#    Por defecto solo devuelve el reparto propuesto; con aplicar=1 lo ejecuta en una transacción.
+@require_POST
+@permission_required('portal_retenciones.can_manage_personnel')
+def rebalancear_ejecutivos(request):
     try:
-        # -- Busca todos los circuitos asociados al cliente_id
-        circuitos = Circuito.objects.filter(cliente_id=cliente_id)
-        
-        # -- Convierte los objetos a un formato JSON simple
-        for circuito in circuitos:
-            circuitos_data.append({
-                'id': circuito.id,
-                'nombre_circuito': circuito.nombre_circuito,
-                'tipo_servicio': circuito.tipo_servicio,
-                'renta_mensual': circuito.renta_mensual
-            })
-        
-        return JsonResponse({'circuitos': circuitos_data})
-
-    except Exception as e:
-        # -- Manejo de errores
-        return JsonResponse({'error': str(e)}, status=404)
\ No newline at end of file
+        origenes = _leer_ids(request.POST.getlist('ejecutivo'))
+        destinos = _leer_ids(request.POST.getlist('destino')) or None
+    except ValueError:
+        return JsonResponse({'error': 'Los ids de ejecutivo deben ser números.'}, status=400)
+    if not origenes:
+        return JsonResponse({'error': 'Debe indicar al menos un ejecutivo.'}, status=400)
+
+    simular = request.POST.get('aplicar') != '1'
+    motivo = request.POST.get('motivo') or f'Rebalanceo solicitado por {request.user.username}'
+    if not simular and request.POST.get('segundo_plano') == '1':
+        # -- Rebalanceos grandes: los ejecuta el worker y se consulta el avance en la API de trabajos
+        trabajo = encolar(
+            'rebalancear', {'origenes': origenes, 'destinos': destinos, 'motivo': motivo}, request.user
+        )
+        return _trabajo_encolado(trabajo)
+
+    plan = rebalancear(
+        origenes,
+        destinos,
+        motivo=motivo,
+        simular=simular,
+    )
+    return JsonResponse({
+        'simulado': simular,
+        'reasignadas': len(plan['movimientos']),
+        'sin_destino': plan['sin_destino'],
+        'por_destino': [{'ejecutivo_id': k, **v} for k, v in plan['por_destino'].items()],
+    })
+
+
+# -- API: Línea de tiempo de una solicitud (comentarios, cambios de estado y reasignaciones),
+#    paginada con un cursor opaco: ?cursor=<siguiente de la respuesta anterior>&tamano=20
+@login_required
+def linea_tiempo_solicitud(request, solicitud_id):
+    if not Solicitud.objects.filter(id=solicitud_id).exists():
+        return JsonResponse({'error': f'La solicitud {solicitud_id} no existe.'}, status=404)
+
+    cursor = None
+    if request.GET.get('cursor'):
+        cursor = decodificar_cursor_evento(request.GET['cursor'])
+        if cursor is None:
+            return JsonResponse({'error': 'El cursor no es válido.'}, status=400)
+    try:
+        tamano = int(request.GET.get('tamano') or TAMANO_PAGINA_LINEA)
+    except ValueError:
+        tamano = TAMANO_PAGINA_LINEA
+
+    eventos, siguiente = pagina_linea_tiempo(solicitud_id, cursor, max(1, min(tamano, TAMANO_MAXIMO_LINEA)))
+    return JsonResponse({'eventos': eventos, 'siguiente': siguiente})
+
+
+# -----------------------------------------------------------------
+# --- TRABAJOS EN SEGUNDO PLANO ---
+# -----------------------------------------------------------------
+
+def _trabajo_encolado(trabajo):
+    # -- 202 Accepted: el cliente consulta 'estado_url' hasta que el trabajo termine
+    return JsonResponse(
+        {'id': trabajo.id, 'estado': trabajo.estado, 'estado_url': reverse('estado_trabajo', args=[trabajo.id])},
+        status=202,
+    )
+
+
+def _trabajo_visible(request, trabajo_id):
+    """El trabajo si el usuario lo creó o gestiona personal; None si no existe o no puede verlo."""
+    trabajo = Trabajo.objects.filter(id=trabajo_id).first()
+    if trabajo is None:
+        return None
+    if trabajo.creado_por_id == request.user.id or permisos_de(request).tiene('portal_retenciones.can_manage_personnel'):
+        return trabajo
+    return None
+
+
+# -- API: Encola la exportación de solicitudes (mismos filtros de la lista) para descargarla al terminar
+@require_POST
+@permission_required('portal_retenciones.can_view_solicitud_list')
+def encolar_exportacion(request):
+    formato = request.POST.get('formato') or 'csv'
+    if formato not in FORMATOS:
+        return JsonResponse({'error': f'Formato no soportado: {formato}'}, status=400)
+    filtros = {clave: valor for clave, valor in request.POST.items() if clave not in ('formato', 'csrfmiddlewaretoken')}
+    trabajo = encolar('exportar_solicitudes', {'filtros': filtros, 'formato': formato}, request.user)
+    return _trabajo_encolado(trabajo)
+
+
+# -- API: Estado y avance de un trabajo en segundo plano
+@require_GET
+@login_required
+def estado_trabajo(request, trabajo_id):
+    trabajo = _trabajo_visible(request, trabajo_id)
+    if trabajo is None:
+        return JsonResponse({'error': f'El trabajo {trabajo_id} no existe.'}, status=404)
+    datos = resumen(trabajo)
+    if trabajo.estado == Trabajo.COMPLETADO and trabajo.tipo == 'exportar_solicitudes':
+        datos['descarga_url'] = reverse('descargar_trabajo', args=[trabajo.id])
+    return JsonResponse(datos)
+
+
+# -- API: Archivo generado por un trabajo de exportación ya completado
+@require_GET
+@login_required
+def descargar_trabajo(request, trabajo_id):
+    trabajo = _trabajo_visible(request, trabajo_id)
+    if trabajo is None or trabajo.estado != Trabajo.COMPLETADO or trabajo.tipo != 'exportar_solicitudes':
+        return JsonResponse({'error': f'El trabajo {trabajo_id} no tiene un archivo disponible.'}, status=404)
+    formato = trabajo.resultado['formato']
+    try:
+        archivo = open(ruta_exportacion(trabajo.id, formato), 'rb')
+    except FileNotFoundError:
+        return JsonResponse({'error': 'El archivo ya no está disponible.'}, status=410)
+    nombre = f"solicitudes_{trabajo.fecha_creacion:%Y%m%d}_{trabajo.id}.{formato}"
+    return FileResponse(archivo, as_attachment=True, filename=nombre)
+
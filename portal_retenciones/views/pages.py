@@ -1,34 +1,135 @@
 # En: portal_retenciones/views/pages.py
 
+import tempfile
+
+from django.http import FileResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.views.decorators.http import require_POST
+from portal_retenciones import catalogos
 from portal_retenciones.decorators import permission_required
+from portal_retenciones.filtros import leer_filtros, filtrar_solicitudes, querystring_filtros
+from portal_retenciones.paginacion import paginar_keyset, decodificar_cursor
+from portal_retenciones.permisos import permisos_de
+from portal_retenciones.metricas import obtener_metricas_dashboard
+from portal_retenciones.asignacion import SinEjecutivoDisponible, asignar_automaticamente
+from portal_retenciones.solicitudes import SolicitudInvalida, crear_solicitud, leer_solicitud, nombre_usuario
+from portal_retenciones.estados import TransicionInvalida, cambiar_estado, estados_siguientes
+from portal_retenciones.exportacion import FORMATOS, escribir_xlsx, filas_exportacion, lineas_csv
+from portal_retenciones.linea_tiempo import con_totales_linea_tiempo, pagina_linea_tiempo
 from django.utils import timezone
 
 # Importamos los modelos necesarios
 from portal_retenciones.models import (
-    Cliente, 
     Solicitud, 
     EjecutivoRetencion, 
     AnalistaRetencion,
     Comentario,
-    HistorialEstado,
-    EstadoAtencion,
 )
 
 # --- VISTAS DE PÁGINA EXISTENTES ---
 
 @permission_required('portal_retenciones.can_create_solicitud')
 def nueva_solicitud_view(request):
-    """Muestra el formulario para crear una nueva solicitud."""
+    """Muestra el formulario para crear una nueva solicitud y procesa su envío."""
+    if request.method == 'POST':
+        try:
+            solicitud = crear_solicitud(leer_solicitud(request.POST), request.user)
+        except (SolicitudInvalida, SinEjecutivoDisponible) as e:
+            return render(request, 'nueva_solicitud.html', {'error_formulario': str(e)})
+
+        messages.success(request, f'✅ Solicitud #{solicitud.id} registrada.')
+        return redirect('solicitud_detalle', solicitud_id=solicitud.id)
+
     return render(request, 'nueva_solicitud.html', {})
 
 @permission_required('portal_retenciones.can_view_solicitud_list')
 def lista_solicitudes_view(request):
-    """Muestra la lista de todas las solicitudes."""
-    solicitudes = Solicitud.objects.all().order_by('-fecha_creacion')
-    return render(request, 'lista_solicitudes.html', {'solicitudes': solicitudes})
+    """Muestra la lista de solicitudes filtrada en el servidor y paginada por keyset."""
+    filtros = leer_filtros(request.GET)
+
+    # -- Una sola consulta por página: las relaciones que pinta la tabla vienen en el mismo JOIN
+    #    (el estado sale del catálogo en memoria, sin JOIN)
+    solicitudes = Solicitud.objects.select_related(
+        'cliente', 'usuario_creador', 'ejecutivo'
+    ).only(
+        'id', 'fecha_creacion', 'fecha_solicitud_baja',
+        'cliente__razon_social',
+        'estado_actual',
+        'usuario_creador__first_name', 'usuario_creador__last_name',
+        'ejecutivo__nombre',
+    )
+    solicitudes = filtrar_solicitudes(solicitudes, filtros)
+
+    pagina = paginar_keyset(
+        solicitudes,
+        'fecha_creacion',
+        despues=decodificar_cursor(request.GET.get('despues')),
+        antes=decodificar_cursor(request.GET.get('antes')),
+    )
+
+    catalogos.adjuntar_estados(pagina.filas, 'estado_actual')
+
+    context = {
+        'solicitudes': pagina.filas,
+        'pagina': pagina,
+        'filtros': filtros,
+        'querystring': querystring_filtros(request.GET),
+        'estados': catalogos.estados(),
+        'ejecutivos': EjecutivoRetencion.objects.filter(activo=True).only('id', 'nombre').order_by('nombre'),
+    }
+    return render(request, 'lista_solicitudes.html', context)
+
+@permission_required('portal_retenciones.can_view_solicitud_list')
+def exportar_solicitudes_view(request):
+    """
+    Descarga todas las solicitudes que cumplen los filtros de la lista, en CSV
+    (streaming, fila por fila) o Excel (libro write_only en un archivo temporal).
+    """
+    filtros = leer_filtros(request.GET)
+    formato = request.GET.get('formato') if request.GET.get('formato') in FORMATOS else 'csv'
+    nombre = f"solicitudes_{timezone.localdate():%Y%m%d}.{formato}"
+
+    if formato == 'csv':
+        response = StreamingHttpResponse(
+            lineas_csv(filas_exportacion(filtros)), content_type='text/csv; charset=utf-8'
+        )
+        response['Content-Disposition'] = f'attachment; filename="{nombre}"'
+        return response
+
+    # -- Un .xlsx es un zip: se arma en disco (no en memoria) y se envía por bloques
+    archivo = tempfile.TemporaryFile()
+    escribir_xlsx(filas_exportacion(filtros), archivo)
+    archivo.seek(0)
+    return FileResponse(archivo, as_attachment=True, filename=nombre)
+
+@require_POST
+@permission_required('portal_retenciones.can_change_estado_masivo')
+def cambiar_estado_masivo_view(request):
+    """Pasa todas las solicitudes marcadas en la lista a un mismo estado (todas o ninguna)."""
+    destino = reverse('lista_solicitudes')
+    if request.POST.get('querystring'):
+        destino = f"{destino}?{request.POST['querystring']}"
+
+    try:
+        solicitud_ids = [int(valor) for valor in request.POST.getlist('solicitudes')]
+        nuevo_estado_id = int(request.POST.get('nuevo_estado') or 0)
+    except ValueError:
+        messages.error(request, '❌ Selección no válida.')
+        return redirect(destino)
+
+    if not solicitud_ids or not nuevo_estado_id:
+        messages.warning(request, '⚠️ Debe marcar al menos una solicitud y elegir el nuevo estado.')
+        return redirect(destino)
+
+    try:
+        cantidad = cambiar_estado(solicitud_ids, nuevo_estado_id, nombre_usuario(request.user))
+        messages.success(request, f'✅ {cantidad} solicitudes cambiadas de estado.')
+    except TransicionInvalida as e:
+        messages.error(request, f'❌ {e}')
+    return redirect(destino)
 
 @permission_required('portal_retenciones.can_view_personal')
 def personal_view(request):
@@ -40,25 +141,34 @@ def personal_view(request):
 @login_required
 def solicitud_detalle_view(request, solicitud_id):
     """Muestra el detalle y la trazabilidad de una solicitud específica."""
-    solicitud = get_object_or_404(Solicitud, id=solicitud_id)
+    # -- Los totales de la línea de tiempo se cuentan en la misma consulta (subconsultas COUNT)
+    solicitud = get_object_or_404(
+        con_totales_linea_tiempo(Solicitud.objects.select_related(
+            'cliente', 'ejecutivo', 'analista', 'usuario_creador'
+        )),
+        id=solicitud_id
+    )
+    catalogos.adjuntar_estados([solicitud], 'estado_actual')
     
-    # Obtener los circuitos asociados a la solicitud
-    circuitos_asociados = solicitud.circuitos.all()
+    # Obtener los circuitos asociados a la solicitud (solo las columnas que se muestran)
+    circuitos_asociados = list(
+        solicitud.circuitos.only('id', 'nombre_circuito', 'tipo_servicio', 'renta_mensual')
+    )
     
-    # Obtener comentarios ordenados por fecha (más reciente primero)
-    comentarios = Comentario.objects.filter(solicitud=solicitud).order_by('-fecha_comentario')
+    # Primera página de la línea de tiempo (comentarios, estados y reasignaciones);
+    # el resto se pide a la API con el cursor al pulsar "Ver más"
+    eventos, cursor_siguiente = pagina_linea_tiempo(solicitud.id)
     
-    # Obtener historial de estados ordenados por fecha (más reciente primero)
-    historial_estado = HistorialEstado.objects.filter(solicitud=solicitud).order_by('-fecha_cambio')
-    
-    # Obtener todos los estados disponibles para el selector
-    estados_disponibles = EstadoAtencion.objects.all()
+    # Solo los estados a los que la solicitud puede pasar según la tabla de transiciones
+    estados_disponibles = [
+        {'id': estado_id, 'nombre_estado': nombre} for estado_id, nombre in estados_siguientes(solicitud.estado_actual_id)
+    ]
     
     context = {
         'solicitud': solicitud,
         'circuitos_asociados': circuitos_asociados,
-        'comentarios': comentarios,
-        'historial_estado': historial_estado,
+        'eventos': eventos,
+        'cursor_siguiente': cursor_siguiente,
         'estados_disponibles': estados_disponibles,
     }
     
@@ -93,35 +203,38 @@ def procesar_accion_solicitud(request, solicitud_id):
     
     # --- ACCIÓN: Cambiar Estado ---
     elif accion == 'cambiar_estado':
-        nuevo_estado_id = request.POST.get('nuevo_estado')
-        
-        if nuevo_estado_id:
-            try:
-                nuevo_estado = EstadoAtencion.objects.get(id=nuevo_estado_id)
-                estado_anterior = solicitud.estado_actual
-                
-                # Solo registrar si el estado cambió
-                if nuevo_estado.id != estado_anterior.id:
-                    # Crear registro en el historial
-                    HistorialEstado.objects.create(
-                        solicitud=solicitud,
-                        estado_anterior=estado_anterior,
-                        estado_nuevo=nuevo_estado,
-                        usuario_cambio=f"{request.user.first_name} {request.user.last_name}" or request.user.username
-                    )
-                    
-                    # Actualizar el estado actual de la solicitud
-                    solicitud.estado_actual = nuevo_estado
-                    solicitud.save()
-                    
-                    messages.success(request, f'✅ Estado cambiado a: {nuevo_estado.nombre_estado}')
-                else:
-                    messages.info(request, 'ℹ️ El estado seleccionado es el mismo que el actual.')
-                    
-            except EstadoAtencion.DoesNotExist:
-                messages.error(request, '❌ Estado no válido.')
-        else:
+        try:
+            nuevo_estado_id = int(request.POST.get('nuevo_estado') or 0)
+        except ValueError:
+            nuevo_estado_id = 0
+
+        if not nuevo_estado_id:
             messages.warning(request, '⚠️ Debe seleccionar un estado.')
+        elif nuevo_estado_id == solicitud.estado_actual_id:
+            messages.info(request, 'ℹ️ El estado seleccionado es el mismo que el actual.')
+        else:
+            try:
+                # -- Valida la transición, registra el historial y ajusta contadores en una transacción
+                cambiar_estado([solicitud.id], nuevo_estado_id, nombre_usuario(request.user))
+                messages.success(request, '✅ Estado cambiado exitosamente.')
+            except TransicionInvalida as e:
+                messages.error(request, f'❌ {e}')
+
+    # --- ACCIÓN: Reasignar Automáticamente ---
+    elif accion == 'reasignar_automatico':
+        # -- Mover solicitudes entre ejecutivos es gestión de personal (igual que el rebalanceo)
+        if not permisos_de(request).tiene('portal_retenciones.can_manage_personnel'):
+            messages.error(request, '❌ No tiene permiso para reasignar solicitudes.')
+            return redirect('solicitud_detalle', solicitud_id=solicitud_id)
+        try:
+            asignar_automaticamente(
+                solicitud,
+                motivo=f'Reasignación automática solicitada por {request.user.username}',
+                excluir=[solicitud.ejecutivo_id],
+            )
+            messages.success(request, '✅ Solicitud reasignada automáticamente.')
+        except SinEjecutivoDisponible:
+            messages.warning(request, '⚠️ No hay otro ejecutivo disponible para reasignar.')
     
     # Redirigir de vuelta a la página de detalle
     return redirect('solicitud_detalle', solicitud_id=solicitud_id)
@@ -142,88 +255,30 @@ def perfil_view(request):
 @login_required
 @permission_required('portal_retenciones.can_view_menu')
 def dashboard_view(request):
-    """Calcula y muestra las métricas clave del portal con gráficos interactivos."""
+    """Muestra las métricas clave del portal (servidas desde la foto en caché)."""
     
-    from django.db.models import Count, Sum
-    from datetime import datetime, timedelta
     import json
     
-    # === MÉTRICAS PRINCIPALES ===
-    
-    # 1. Conteo de Clientes
-    total_clientes = Cliente.objects.count()
-
-    # 2. Conteo de Solicitudes Totales
-    total_solicitudes = Solicitud.objects.count()
-
-    # 3. Solicitudes Pendientes
-    solicitudes_pendientes = Solicitud.objects.filter(
-        estado_actual__nombre_estado__in=['Registrado', 'En Análisis']
-    ).count()
-
-    # 4. Solicitudes Resueltas
-    solicitudes_resueltas = total_solicitudes - solicitudes_pendientes
-    
-    # 5. Porcentaje de Cierre (Aprobadas + Rechazadas + Baja Ejecutada / Total)
-    solicitudes_cerradas = Solicitud.objects.filter(
-        estado_actual__nombre_estado__in=['Aprobado', 'Rechazado', 'Baja Ejecutada']
-    ).count()
-    
-    porcentaje_cierre = round((solicitudes_cerradas / total_solicitudes * 100), 1) if total_solicitudes > 0 else 0
-
-    # === DATOS PARA GRÁFICO 1: Distribución por Estado ===
-    estados_data = Solicitud.objects.values(
-        'estado_actual__nombre_estado'
-    ).annotate(
-        cantidad=Count('id')
-    ).order_by('-cantidad')
-    
-    # Preparar datos para Chart.js
-    estados_labels = [item['estado_actual__nombre_estado'] for item in estados_data]
-    estados_valores = [item['cantidad'] for item in estados_data]
-    
-    # === DATOS PARA GRÁFICO 2: Solicitudes por Mes (últimos 6 meses) ===
-    fecha_inicio = timezone.now() - timedelta(days=180)
-    
-    solicitudes_por_mes = Solicitud.objects.filter(
-        fecha_creacion__gte=fecha_inicio
-    ).extra(
-        select={'mes': "strftime('%%Y-%%m', fecha_creacion)"}
-    ).values('mes').annotate(
-        cantidad=Count('id')
-    ).order_by('mes')
-    
-    # Convertir a listas para Chart.js
-    meses_labels = [item['mes'] for item in solicitudes_por_mes]
-    meses_valores = [item['cantidad'] for item in solicitudes_por_mes]
-    
-    # === DATOS PARA GRÁFICO 3: Top 5 Ejecutivos con más solicitudes ===
-    top_ejecutivos = Solicitud.objects.values(
-        'ejecutivo__nombre'
-    ).annotate(
-        cantidad=Count('id')
-    ).order_by('-cantidad')[:5]
-    
-    ejecutivos_labels = [item['ejecutivo__nombre'] for item in top_ejecutivos]
-    ejecutivos_valores = [item['cantidad'] for item in top_ejecutivos]
+    metricas = obtener_metricas_dashboard()
 
     context = {
         # Métricas principales
-        'total_clientes': total_clientes,
-        'total_solicitudes': total_solicitudes,
-        'solicitudes_pendientes': solicitudes_pendientes,
-        'solicitudes_resueltas': solicitudes_resueltas,
-        'porcentaje_cierre': porcentaje_cierre,
+        'total_clientes': metricas['total_clientes'],
+        'total_solicitudes': metricas['total_solicitudes'],
+        'solicitudes_pendientes': metricas['solicitudes_pendientes'],
+        'solicitudes_resueltas': metricas['solicitudes_resueltas'],
+        'porcentaje_cierre': metricas['porcentaje_cierre'],
         
         # Datos para gráficos (convertidos a JSON para JavaScript)
-        'estados_labels': json.dumps(estados_labels),
-        'estados_valores': json.dumps(estados_valores),
+        'estados_labels': json.dumps(metricas['estados_labels']),
+        'estados_valores': json.dumps(metricas['estados_valores']),
         
-        'meses_labels': json.dumps(meses_labels),
-        'meses_valores': json.dumps(meses_valores),
+        'meses': metricas['meses'],
+        'meses_labels': json.dumps(metricas['meses_labels']),
+        'meses_valores': json.dumps(metricas['meses_valores']),
         
-        'ejecutivos_labels': json.dumps(ejecutivos_labels),
-        'ejecutivos_valores': json.dumps(ejecutivos_valores),
+        'ejecutivos_labels': json.dumps(metricas['ejecutivos_labels']),
+        'ejecutivos_valores': json.dumps(metricas['ejecutivos_valores']),
     }
 
-    return render(request, 'dashboard.html', context)
\ No newline at end of file
+    return render(request, 'dashboard.html', context)